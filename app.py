@@ -1,26 +1,29 @@
+"""
+Original single-route prototype, kept for reference
+
+Not a supported entry point: the application is app2.py (gunicorn -c
+gunicorn.conf.py, or python app2.py for development), which serves this
+route as well. Connections come from the pool in db.py, configured by the
+same DB_* variables, so importing this module does not touch the database.
+"""
 from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 import psycopg2
-from psycopg2 import sql
 import os
 
+from db import get_db, init_app as init_db
+
 app = Flask(__name__)
 CORS(app)
+init_db(app)
 
-# PostgreSQL connection setup
-conn = psycopg2.connect(
-    host="localhost",
-    database="store_inventory",
-    user="postgres",
-    password="ghost2020"
-)
-cur = conn.cursor()
 @app.route('/')
 def home():
     return render_template('dashboard_ui.html')  # Adjust as per your main HTML file
 
 @app.route('/add_product', methods=['POST'])
 def add_product():
+    conn = get_db()
     try:
         data = request.get_json()
         print("Received Data", data)
@@ -38,7 +41,8 @@ def add_product():
             INSERT INTO Product (Name, Description, Price, StockQuantity, ExpiryDate, ReOrderLevel, CategoryID, SupplierID)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
-        cur.execute(insert_query, (name, description, price, stock_quantity, expiry_date, reorder_level, category_id, supplier_id))
+        with conn.cursor() as cur:
+            cur.execute(insert_query, (name, description, price, stock_quantity, expiry_date, reorder_level, category_id, supplier_id))
         conn.commit()
         return jsonify({'message': 'Product added successfully'})
     except psycopg2.errors.UniqueViolation as e:
@@ -51,4 +55,5 @@ def add_product():
         return jsonify({'error': f'Failed to add product: {str(e)}'}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server only; run production with: gunicorn -c gunicorn.conf.py
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
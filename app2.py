@@ -1,506 +1,509 @@
-from flask import Flask, render_template, request, jsonify
-from flask_cors import CORS
-import psycopg2
-from psycopg2 import sql
-import os
-
-app = Flask(__name__)
-CORS(app)
-
-# PostgreSQL connection setup
-conn = psycopg2.connect(
-    host="localhost",
-    database="store_inventory",
-    user="postgres",
-    password="ghost2020"
-)
-cur = conn.cursor()
-
-def handle_db_insert(table_name, data, field_mappings):
-    """
-    Generic function to handle database inserts
-    
-    Args:
-        table_name (str): Name of the database table
-        data (dict): The data received from the request
-        field_mappings (dict): A dictionary mapping form fields to database fields with their types
-    """
-    try:
-        # Process the data according to the field mappings
-        processed_data = {}
-        
-        for form_field, db_info in field_mappings.items():
-            db_field = db_info.get('db_field', form_field)  # Use form field name as DB field if not specified
-            
-            # Check if it's a required field
-            if db_info.get('required', False) and (form_field not in data or data[form_field] == ''):
-                return jsonify({'error': f'{form_field} is required'}), 400
-            
-            # Get the value, use default if not present
-            value = data.get(form_field, db_info.get('default'))
-            
-            # Convert the value based on its type
-            if value is not None:
-                try:
-                    if db_info['type'] == 'int':
-                        value = int(value)
-                    elif db_info['type'] == 'float':
-                        value = float(value)
-                    # Add more type conversions as needed
-                except (ValueError, TypeError):
-                    return jsonify({'error': f'Invalid value for {form_field}'}), 400
-            
-            processed_data[db_field] = value
-        
-        # Build the SQL query dynamically
-        columns = list(processed_data.keys())
-        placeholders = ["%s"] * len(columns)
-        
-        query = f"""
-            INSERT INTO {table_name} ({', '.join(columns)})
-            VALUES ({', '.join(placeholders)})
-        """
-        
-        values = [processed_data[col] for col in columns]
-        cur.execute(query, values)
-        conn.commit()
-        
-        return jsonify({'message': f'{table_name} added successfully'})
-    
-    except psycopg2.errors.UniqueViolation as e:
-        print(f"Unique violation error in {table_name}:", e)
-        conn.rollback()
-        return jsonify({'error': f'A record with this ID already exists in {table_name}'}), 409
-    except Exception as e:
-        print(f"Error adding to {table_name}:", e)
-        conn.rollback()
-        return jsonify({'error': f'Failed to add to {table_name}: {str(e)}'}), 500
-
-@app.route('/')
-def home():
-    return render_template('dashboard_ui.html')  # Adjust as per your main HTML file
-
-@app.route('/add_product', methods=['POST'])
-def add_product():
-    data = request.get_json()
-    print("Received Product Data", data)
-    
-    # Define how form fields map to database fields with their types
-    field_mappings = {
-        'productName': {'db_field': 'Name', 'type': 'str', 'required': True},
-        'description': {'db_field': 'Description', 'type': 'str', 'default': ''},
-        'price': {'db_field': 'Price', 'type': 'float', 'required': True},
-        'quantity': {'db_field': 'StockQuantity', 'type': 'int', 'required': True},
-        'expiryDate': {'db_field': 'ExpiryDate', 'type': 'str', 'default': None},
-        'reorder': {'db_field': 'ReOrderLevel', 'type': 'int', 'default': 0},
-        'CategoryID': {'db_field': 'CategoryID', 'type': 'int', 'default': None},
-        'SupplierID': {'db_field': 'SupplierID', 'type': 'int', 'default': None}
-    }
-    
-    return handle_db_insert('Product', data, field_mappings)
-
-# Example of another form handler
-@app.route('/add_vendor', methods=['POST'])
-def add_vendor():
-    data = request.get_json()
-    print("Received Vendor Data", data)
-    
-    # Define how form fields map to database fields
-    field_mappings = {
-        'vendorName': {'db_field': 'Name', 'type': 'str', 'required': True},
-        'vendorEmail': {'db_field': 'Email', 'type': 'str', 'default': ''},
-        'vendorNumber': {'db_field': 'contactnumber', 'type': 'int', 'default': ''},
-        'vendorAddress': {'db_field': 'Address', 'type': 'str', 'default': ''}
-    }
-    
-    return handle_db_insert('Vendor', data, field_mappings)
-
-# Example of a category form handler
-@app.route('/add_category', methods=['POST'])
-def add_category():
-    data = request.get_json()
-    print("Received Category Data", data)
-    
-    field_mappings = {
-        'categoryName': {'db_field': 'Name', 'type': 'str', 'required': True},
-        'description': {'db_field': 'Description', 'type': 'str', 'default': ''}
-    }
-    
-    return handle_db_insert('Category', data, field_mappings)
-
-# Generic DB fetch function
-def handle_db_fetch(table_name, columns):
-    try:
-        cur.execute(sql.SQL("SELECT {} FROM {}").format(
-            sql.SQL(', ').join(map(sql.Identifier, columns)),
-            sql.Identifier(table_name)
-        ))
-        rows = cur.fetchall()
-        results = [dict(zip(columns, row)) for row in rows]
-        return results
-    except Exception as e:
-        print("❌ DB fetch error:", e)
-        return []
-
-# Example: Get all products
-@app.route('/get_products', methods=['GET'])
-def get_products():
-    columns = ["productid", "name", "description", "price", "stockquantity", "expirydate", "reorderlevel", "categoryid", "supplierid"]
-    products = handle_db_fetch("product", columns)
-    return jsonify(products)
-
-@app.route('/get_instock_products')
-def get_instock_products():
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM Product WHERE StockQuantity > 0")
-        columns = [desc[0] for desc in cur.description]
-        rows = cur.fetchall()
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/get_products_by_category')
-def get_products_by_category():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT * FROM product ORDER BY categoryid
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-@app.route('/get_all_sales')
-def get_all_sales():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT * FROM salesinvoice ORDER BY customerid
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500    
-    
-@app.route('/get_all_sales_today')
-def get_all_sales_today():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT * FROM salesinvoice WHERE invoicedate = '2025-04-16'
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500     
-
-
-@app.route('/product_highest_sales_week')
-def product_highest_sales_week():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT product.productid, product.name, sum(linetotal) FROM product 
-            JOIN salesdetail ON salesdetail.productid = product.productid 
-            GROUP BY product.productid 
-            ORDER BY sum(linetotal) DESC;
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500  
-    
-@app.route('/product_highest_sales_5')
-def product_highest_sales_5():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT product.productid as id, product.name, product.categoryid as category, supplierid as sid, sum(quantity) FROM product 
-            JOIN salesdetail ON product.productid = salesdetail.productid 
-            GROUP BY product.productid 
-            ORDER BY sum(quantity) DESC 
-            LIMIT 5;
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500    
-
-@app.route('/sales_return')
-def sales_return():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT * FROM returns ORDER BY returnid
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500    
-
-@app.route('/list_employees')
-def list_employees():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT * FROM employee ORDER BY employeeid
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500  
-
-@app.route('/best_employees')
-def best_employees():
-    try:
-        cur = conn.cursor()
-        query = """
-            select employee.employeeid, employee.name, count(invoiceid) as sales_made, sum(totalamount) from salesinvoice
-            join employee on employee.employeeid = salesinvoice.employeeid 
-            group by employee.employeeid 
-            order by sum(totalamount) desc;
-        """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500 
-    
-@app.route('/best_employee_today')
-def best_employee_today():
-    try:
-        cur = conn.cursor()
-        query = """
-            select employeeid, count(invoiceid) from salesinvoice 
-            where invoicedate = '2024-10-31' 
-            group by employeeid order by count(invoiceid) desc;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500     
-
-
-@app.route('/list_customers')
-def list_customers():
-    try:
-        cur = conn.cursor()
-        query = """
-            select * from customer order by customerid
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500     
-    
-@app.route('/list_customers_expenditure')
-def list_customers_expenditure():
-    try:
-        cur = conn.cursor()
-        query = """
-            select customer.customerid, customer.name, count(invoiceid) as totalpurchases, sum(totalamount) as totalspent from customer 
-            join salesinvoice on customer.customerid = salesinvoice.customerid  
-            group by customer.customerid 
-            order by sum(totalamount) desc;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500      
-
-@app.route('/list_customers_expenditure_6')
-def list_customers_expenditure_6():
-    try:
-        cur = conn.cursor()
-        query = """
-        select customer.customerid, customer.name, count(invoiceid) as totalpurchases, sum(totalamount) as totalspent from customer 
-        join salesinvoice on customer.customerid = salesinvoice.customerid 
-        where invoicedate between '2024-09-01' and '2025-02-28' 
-        group by customer.customerid 
-        order by sum(totalamount) desc limit 5;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500  
-    
-@app.route('/inventory_spend_month')
-def inventory_spend_month():
-    try:
-        cur = conn.cursor()
-        query = """
-            select sum(totalamount) from purchaseorder 
-            where orderdate between '2025-01-01' and '2025-01-31';
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500  
-
-@app.route('/revenue_last_month')
-def revenue_last_month():
-    try:
-        cur = conn.cursor()
-        query = """
-            select sum(totalamount) as totalrevenue from salesinvoice 
-            where invoicedate between '2024-05-01' and '2024-05-31';
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500     
-    
-@app.route('/highest_purchase')
-def highest_purchase():
-    try:
-        cur = conn.cursor()
-        query = """
-            select * from purchaseorder 
-            order by totalamount desc;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500      
-
-@app.route('/transactionlog')
-def transactionlog():
-    try:
-        cur = conn.cursor()
-        query = """
-            select * from transactionlog 
-            order by logid;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500         
-
-@app.route('/feedback')
-def feedback():
-    try:
-        cur = conn.cursor()
-        query = """
-            select * from feedback 
-            order by feedbackid;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500 
-    
-@app.route('/complaints')
-def complaints():
-    try:
-        cur = conn.cursor()
-        query = """
-            select * from complaints 
-            order by complaintid;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500 
-    
-@app.route('/list_vendors')
-def list_vendors():
-    try:
-        cur = conn.cursor()
-        query = """
-            select * from supplier
-            order by supplierid;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500    
-
-@app.route('/list_unique_vendors')
-def list_unique_vendors():
-    try:
-        cur = conn.cursor()
-        query = """
-            SELECT s.SupplierID, s.Name, 
-            COUNT(DISTINCT p.ProductID) AS UniqueProductsSold
-            FROM Supplier s
-            JOIN Product p ON s.SupplierID = p.SupplierID
-            WHERE p.ProductID IN (
-                SELECT DISTINCT p.productid
-                FROM SalesInvoice si
-                WHERE si.InvoiceDate >= CURRENT_DATE - INTERVAL '1 year'
-            )
-            GROUP BY s.SupplierID, s.Name
-            ORDER BY UniqueProductsSold DESC
-            LIMIT 3;
-            """
-        cur.execute(query)
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        return jsonify(results)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500       
-        
-if __name__ == '__main__':
-    app.run(debug=True)
-
-
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+from flask_cors import CORS
+import psycopg2
+from psycopg2.extras import execute_values
+import csv
+import io
+import os
+from datetime import date, timedelta
+
+from assets import init_app as init_assets, ui_page
+from cache import invalidate as invalidate_cache, response_cache
+from catalog import COLUMNS as CATALOG_COLUMNS, catalog
+from checkout import CheckoutError, checkout_queue, parse_basket
+from db import REPLICA_HOSTS, PoolTimeout, get_db, get_pool, get_read_db, get_router, init_app as init_db, mark_write
+from forms import CATEGORY_FIELDS, INVALID_JSON_ERROR, FieldError, PRODUCT_FIELDS, VENDOR_FIELDS, process_fields
+from instrumentation import instrumentation
+from jobs import (JobError, job_queue, parse_job, public_state, read_ndjson, read_result, read_state, result_chunks,
+                  result_path)
+from pagination import PageArgsError, page_response, parse_page_args
+from registry import register_reports
+from reports import ReportArgsError, parse_granularity, parse_int, parse_metrics, parse_range, range_report
+from serialization import ROW_FORMATS, RowFormatError, parse_row_format
+from stock_alerts import SSE_RETRY_AFTER, SubscriberLimitError, stock_alerts
+
+# /static/ and the UI pages are served from the asset build (assets.py)
+app = Flask(__name__, static_folder=None)
+CORS(app)
+init_assets(app)
+
+# PostgreSQL connections are pooled; each request checks one out via get_db(),
+# and report queries use get_read_db(), which prefers a read replica when configured
+init_db(app)
+
+# Per-route timings for /metrics and the slow query log
+instrumentation.init_app(app)
+
+# Read-only report routes are declared in registry.py
+register_reports(app)
+
+# Seconds /readyz waits for a pooled connection before reporting not ready
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT', 2))
+
+# Longest ?q= accepted by /products
+CATALOG_MAX_QUERY = 100
+
+# Bulk submissions: rows per INSERT statement and rows accepted per request
+BULK_PAGE_SIZE = int(os.environ.get('BULK_PAGE_SIZE', 1000))
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', 100000))
+
+def handle_db_insert(table_name, data, field_mappings):
+    """
+    Generic function to handle database inserts
+    
+    Args:
+        table_name (str): Name of the database table
+        data (dict): The data received from the request
+        field_mappings (dict): A dictionary mapping form fields to database fields with their types
+    """
+    conn = get_db()
+    try:
+        # Process the data according to the field mappings
+        try:
+            processed_data = process_fields(data, field_mappings)
+        except FieldError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Build the SQL query dynamically
+        columns = list(processed_data.keys())
+        placeholders = ["%s"] * len(columns)
+        
+        query = f"""
+            INSERT INTO {table_name} ({', '.join(columns)})
+            VALUES ({', '.join(placeholders)})
+        """
+        
+        values = [processed_data[col] for col in columns]
+        with instrumentation.phase('db_execute'), conn.cursor() as cur:
+            cur.execute(query, values)
+        conn.commit()
+        mark_write()
+        invalidate_cache(table_name)
+        
+        return jsonify({'message': f'{table_name} added successfully'})
+    
+    except psycopg2.errors.UniqueViolation as e:
+        print(f"Unique violation error in {table_name}:", e)
+        conn.rollback()
+        return jsonify({'error': f'A record with this ID already exists in {table_name}'}), 409
+    except Exception as e:
+        print(f"Error adding to {table_name}:", e)
+        conn.rollback()
+        return jsonify({'error': f'Failed to add to {table_name}: {str(e)}'}), 500
+
+def handle_db_bulk_insert(table_name, rows, field_mappings):
+    """
+    Generic function to handle multi-row inserts
+
+    Every row is validated with the same field mappings as a single insert.
+    Valid rows are written with execute_values in one transaction; invalid
+    rows are skipped and reported by position. If the database rejects the
+    batch (a duplicate key, a missing foreign key, a NOT NULL column) the
+    rows are inserted again one by one, so the ones it rejects are reported
+    the same way and the rest are still added.
+
+    Args:
+        table_name (str): Name of the database table
+        rows (list): Row dicts received from the request
+        field_mappings (dict): A dictionary mapping form fields to database fields with their types
+    """
+    if len(rows) > BULK_MAX_ROWS:
+        return jsonify({'error': f'At most {BULK_MAX_ROWS} rows can be added per request'}), 413
+
+    valid_rows = []
+    errors = []
+    for index, data in enumerate(rows):
+        if not isinstance(data, dict):
+            errors.append({'row': index, 'error': 'Row must be an object'})
+            continue
+        if None in data:
+            # csv.DictReader files cells past the header under None; JSON keys are always strings
+            errors.append({'row': index, 'error': 'Row has more cells than the header'})
+            continue
+        try:
+            valid_rows.append((index, process_fields(data, field_mappings)))
+        except FieldError as e:
+            errors.append({'row': index, 'error': str(e)})
+
+    if not valid_rows:
+        return jsonify({'error': f'No valid rows to add to {table_name}', 'inserted': 0, 'errors': errors}), 400
+
+    conn = get_db()
+    columns = list(valid_rows[0][1].keys())
+    values = [(index, [row[col] for col in columns]) for index, row in valid_rows]
+    duplicates = 0
+    try:
+        query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES %s"
+        with instrumentation.phase('db_execute'), conn.cursor() as cur:
+            execute_values(cur, query, [row for _, row in values], page_size=BULK_PAGE_SIZE)
+        inserted = len(values)
+    except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+        print(f"Bulk insert into {table_name} failed, retrying row by row:", e)
+        conn.rollback()
+        try:
+            inserted, row_errors, duplicates = insert_rows_one_by_one(conn, table_name, columns, values)
+        except Exception as e:
+            print(f"Error adding to {table_name}:", e)
+            conn.rollback()
+            return jsonify({'error': f'Failed to add to {table_name}: {str(e)}', 'inserted': 0, 'errors': errors}), 500
+        errors = sorted(errors + row_errors, key=lambda error: error['row'])
+    except Exception as e:
+        print(f"Error adding to {table_name}:", e)
+        conn.rollback()
+        return jsonify({'error': f'Failed to add to {table_name}: {str(e)}', 'inserted': 0, 'errors': errors}), 500
+
+    if not inserted:
+        conn.rollback()
+        # 409 as for a single record when every row the database refused was a duplicate
+        status = 409 if duplicates == len(errors) else 400
+        return jsonify({'error': f'No valid rows to add to {table_name}', 'inserted': 0, 'errors': errors}), status
+    conn.commit()
+    mark_write()
+    invalidate_cache(table_name)
+    return jsonify({
+        'message': f'{inserted} rows added to {table_name}',
+        'inserted': inserted,
+        'errors': errors
+    })
+
+def insert_rows_one_by_one(conn, table_name, columns, values):
+    """
+    Insert rows singly, each under a savepoint, after the batch was refused
+
+    Args:
+        conn: Connection whose transaction the rows are added to, left uncommitted
+        table_name (str): Name of the database table
+        columns (list): Database columns
+        values (list): (request row index, column values) pairs
+
+    Returns:
+        tuple: (rows inserted, errors for the rows the database refused, how many of those were duplicates)
+    """
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    inserted = duplicates = 0
+    errors = []
+    with instrumentation.phase('db_execute'), conn.cursor() as cur:
+        for index, row in values:
+            cur.execute('SAVEPOINT bulk_row')
+            try:
+                cur.execute(query, row)
+            except psycopg2.errors.UniqueViolation as e:
+                cur.execute('ROLLBACK TO SAVEPOINT bulk_row')
+                errors.append({'row': index,
+                               'error': f'A record with this ID already exists in {table_name}: {e.diag.message_detail}'})
+                duplicates += 1
+                continue
+            except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                cur.execute('ROLLBACK TO SAVEPOINT bulk_row')
+                detail = f': {e.diag.message_detail}' if e.diag.message_detail else ''
+                errors.append({'row': index, 'error': f'{e.diag.message_primary}{detail}'})
+                continue
+            cur.execute('RELEASE SAVEPOINT bulk_row')
+            inserted += 1
+    return inserted, errors, duplicates
+
+def read_submitted_rows():
+    """
+    Rows of a bulk submission, or None for a single-record request
+
+    Accepts a JSON array body, a text/csv body, or a multipart upload with a
+    CSV 'file' field. CSV headers use the same names as the form fields.
+    Empty cells, and those missing from a row shorter than the header, are
+    left out so the field's default or required check applies; cells past
+    the header end up under the key None and the row is rejected.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise FieldError('CSV upload must be UTF-8 text')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        data = request.get_json(silent=True)
+        return data if isinstance(data, list) else None
+
+    try:
+        return [{k: v for k, v in row.items() if v not in (None, '')} for row in csv.DictReader(io.StringIO(text))]
+    except csv.Error as e:
+        raise FieldError(f'Invalid CSV: {e}')
+
+def handle_db_submit(table_name, field_mappings):
+    """Insert one record or, for array/CSV submissions, many."""
+    try:
+        rows = read_submitted_rows()
+    except FieldError as e:
+        return jsonify({'error': str(e)}), 400
+    if rows is not None:
+        print(f"Received {len(rows)} {table_name} rows")
+        return handle_db_bulk_insert(table_name, rows, field_mappings)
+
+    data = request.get_json(silent=True)
+    if data is None:
+        return jsonify({'error': INVALID_JSON_ERROR}), 400
+    print(f"Received {table_name} Data", data)
+    return handle_db_insert(table_name, data, field_mappings)
+
+@app.route('/')
+def home():
+    return ui_page('dashboard_ui')
+
+@app.route('/add_product', methods=['POST'])
+def add_product():
+    return handle_db_submit('Product', PRODUCT_FIELDS)
+
+# Example of another form handler
+@app.route('/add_vendor', methods=['POST'])
+def add_vendor():
+    return handle_db_submit('Vendor', VENDOR_FIELDS)
+
+# Example of a category form handler
+@app.route('/add_category', methods=['POST'])
+def add_category():
+    return handle_db_submit('Category', CATEGORY_FIELDS)
+
+@app.route('/checkout', methods=['POST'])
+def checkout():
+    """
+    Record a sale: the invoice, its salesdetail lines and the stock they take, all or nothing
+
+    Body: customerID, employeeid, paymentMode, optional discountamount and
+    taxamount, and items: [{productid, quantity}, ...]. Lines are priced at
+    the current product price; totalamount is their sum less the discount
+    plus tax. Answers 409 when a product does not have enough stock.
+    """
+    try:
+        basket = parse_basket(request.get_json(silent=True))
+        with instrumentation.phase('db_execute'):
+            invoice = checkout_queue.submit(basket)
+    except CheckoutError as e:
+        return jsonify(e.payload()), e.status
+    mark_write()
+    for table_name in ('salesinvoice', 'salesdetail', 'product'):
+        invalidate_cache(table_name)
+    return jsonify(dict(invoice, message='Sale recorded'))
+
+@app.route('/reports/range')
+def reports_range():
+    """
+    Bucketed revenue, spend and per-employee sales for a date range
+
+    Query args: from, to (YYYY-MM-DD, default the last 30 days),
+    granularity (day/week/month), metrics (comma separated, default all).
+    Ranges of more than RANGE_MAX_BUCKETS periods get a 400.
+    """
+    try:
+        today = date.today()
+        start, end = parse_range(request.args, today - timedelta(days=29), today)
+        granularity = parse_granularity(request.args)
+        metrics = parse_metrics(request.args)
+        report = range_report(get_read_db(), start, end, granularity, metrics)
+        with instrumentation.phase('serialize'):
+            return jsonify(report)
+    except ReportArgsError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Route timings, connection pool and response cache counters in Prometheus text format."""
+    lines = instrumentation.render_prometheus()
+    for name, value in get_pool().metrics().items():
+        lines.append(f'db_pool_{name} {value}')
+    for name, value in response_cache.stats.items():
+        lines.append(f'response_cache_{name}_total {value}')
+    if response_cache.listener is not None:
+        for name, value in response_cache.listener.stats.items():
+            lines.append(f'response_cache_listener_{name}_total {value}')
+    for name, value in stock_alerts.metrics().items():
+        lines.append(f'stock_alerts_{name} {value}')
+    for name, value in catalog.metrics().items():
+        lines.append(f'catalog_{name} {value}')
+    for name, value in checkout_queue.metrics().items():
+        lines.append(f'checkout_{name} {value}')
+    for name, value in job_queue.metrics().items():
+        lines.append(f'jobs_{name}_total {value}')
+    if REPLICA_HOSTS:
+        router = get_router().metrics()
+        for name in ('primary_reads', 'lag_fallbacks', 'down_fallbacks'):
+            lines.append(f'db_read_{name}_total {router[name]}')
+        for host, replica in router['replicas'].items():
+            lag = replica['lag_seconds']
+            lines.append(f'db_replica_lag_seconds{{replica="{host}"}} {lag if lag is not None else "NaN"}')
+            lines.append(f'db_replica_reads_total{{replica="{host}"}} {replica["reads"]}')
+            lines.append(f'db_replica_up{{replica="{host}"}} {int(replica["up"])}')
+            for name, value in replica['pool'].items():
+                lines.append(f'db_replica_pool_{name}{{replica="{host}"}} {value}')
+    return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/slow_queries')
+def slow_queries():
+    """Most recent queries over SLOW_QUERY_MS, with their EXPLAIN (ANALYZE, BUFFERS) plans."""
+    return jsonify(list(instrumentation.slow_queries))
+
+@app.route('/stock/low')
+def low_stock():
+    """Products below their reorder level, served from the in-memory index."""
+    if not stock_alerts.wait_ready():
+        return jsonify({"error": "Stock alert listener is not connected"}), 503
+    return jsonify(stock_alerts.low_stock())
+
+@app.route('/stock/events')
+def stock_events():
+    """
+    Server-Sent Events stream of low-stock changes
+
+    Sends a 'snapshot' event with every low-stock product, then a 'stock'
+    event each time a product crosses or moves below its reorder level.
+    Each stream holds a server thread, so past SSE_MAX_SUBSCRIBERS open
+    streams in this process the request gets a 503 with Retry-After.
+    """
+    stock_alerts.wait_ready()
+    try:
+        subscriber = stock_alerts.subscribe()
+    except SubscriberLimitError as e:
+        return jsonify({"error": str(e)}), 503, {'Retry-After': str(SSE_RETRY_AFTER)}
+    response = Response(stock_alerts.event_stream(subscriber), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Frees the slot even if the client is gone before the stream is first read
+    response.call_on_close(lambda: stock_alerts.unsubscribe(subscriber))
+    return response
+
+@app.route('/products')
+def products():
+    """
+    Products from the in-memory catalogue, in productid order
+
+    Query args:
+        category: Only this categoryid
+        supplier: Only this supplierid
+        q: Name search; three or more characters match anywhere in the name,
+           fewer match the start of a word
+        in_stock: 1 for products with stock, 0 for those without
+        limit, after, format: As for the report routes; stream is not supported
+    """
+    try:
+        limit, after, stream = parse_page_args(1)
+        if stream:
+            raise PageArgsError('/products cannot be streamed; page it with limit instead')
+        if after is not None and not isinstance(after[0], int):
+            raise PageArgsError('Invalid after cursor')
+        row_format = parse_row_format(request.args, request.headers.get('Accept'))
+        category = parse_int(request.args, 'category', None, 0, 2 ** 31 - 1)
+        supplier = parse_int(request.args, 'supplier', None, 0, 2 ** 31 - 1)
+        query = request.args.get('q', '').strip()
+        if len(query) > CATALOG_MAX_QUERY:
+            raise ReportArgsError(f'q must be at most {CATALOG_MAX_QUERY} characters')
+        in_stock = request.args.get('in_stock')
+        if in_stock is not None:
+            if in_stock not in ('0', '1'):
+                raise ReportArgsError('in_stock must be 0 or 1')
+            in_stock = in_stock == '1'
+    except (PageArgsError, ReportArgsError, RowFormatError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not catalog.wait_ready():
+        return jsonify({"error": "Product catalogue is not loaded"}), 503
+    rows = catalog.search(category, supplier, query, in_stock, after[0] if after else None, limit)
+    with instrumentation.phase('serialize'):
+        return page_response(rows, list(CATALOG_COLUMNS), ['productid'], limit, row_format)
+
+@app.route('/products/<int:productid>')
+def product_detail(productid):
+    """One product from the in-memory catalogue."""
+    if not catalog.wait_ready():
+        return jsonify({"error": "Product catalogue is not loaded"}), 503
+    row = catalog.get(productid)
+    if row is None:
+        return jsonify({"error": "Product not found"}), 404
+    return jsonify(dict(zip(CATALOG_COLUMNS, row)))
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Run a report in the background
+
+    Body: {"report": report name, "params": {...its query args}}. Answers
+    202 with the new job, or 200 with an identical job that is already
+    running or finished recently. Poll GET /jobs/<id>, then fetch
+    /jobs/<id>/result.
+    """
+    try:
+        report, params, query, query_params = parse_job(request.get_json(silent=True))
+        state, existing = job_queue.submit(report, params, query, query_params)
+    except JobError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        print("❌ Job submission error:", e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify(public_state(state)), 200 if existing else 202, {'Location': f"/jobs/{state['id']}"}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    state = read_state(job_id)
+    if state is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(public_state(state))
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """
+    Rows of a finished job
+
+    ?format=records|rows|columns (or the Accept header) as for the report
+    routes; ?format=ndjson sends the stored file as is: a line of column
+    names, then one array per row, gzip-encoded when the client accepts it.
+    """
+    state = read_state(job_id)
+    if state is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    if state['status'] != 'done':
+        state = public_state(state)
+        return jsonify({"error": f"Job is {state['status']}", "status": state['status'],
+                        "detail": state['error']}), 409
+    try:
+        if request.args.get('format') == 'ndjson':
+            if 'gzip' in request.accept_encodings:
+                response = send_file(result_path(job_id), mimetype='application/x-ndjson', conditional=True)
+                response.headers['Content-Encoding'] = 'gzip'
+                response.headers['Vary'] = 'Accept-Encoding'
+                return response
+            return Response(stream_with_context(read_ndjson(job_id)), mimetype='application/x-ndjson')
+        row_format = parse_row_format(request.args, request.headers.get('Accept'))
+        columns, rows = read_result(job_id)
+    except RowFormatError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return Response(stream_with_context(result_chunks(columns, rows, row_format)), mimetype=ROW_FORMATS[row_format])
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is serving requests. Does not touch the database."""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: a pooled database connection can be checked out and answers within READY_TIMEOUT."""
+    pool = get_pool()
+    try:
+        conn = pool.get(timeout=READY_TIMEOUT)
+    except (PoolTimeout, psycopg2.Error) as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+    except psycopg2.Error as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    finally:
+        pool.put(conn)
+    return jsonify({"status": "ready"})
+
+if __name__ == '__main__':
+    # Development server only; run production with: gunicorn -c gunicorn.conf.py
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
+
+
@@ -0,0 +1,213 @@
+"""
+Async serving mode for the app2.py routes
+
+Serves the same routes and JSON shapes as the Flask app from an ASGI
+server, with an asyncpg pool instead of blocking psycopg2 connections, so a
+slow report only parks a coroutine and one process can hold hundreds of
+concurrent dashboard requests.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+Read routes are generated from the registry in registry.py. Pagination,
+streaming, the response cache, read-replica routing, the low-stock
+event stream, the in-memory /products catalogue and the fingerprinted
+static assets remain Flask-only; these routes return the same full JSON
+arrays the UI requests by default.
+"""
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+
+import asyncpg
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, Response
+from starlette.routing import Route
+from werkzeug.http import http_date
+
+from assets import REVALIDATE, page_path
+from db import DB_CONFIG, POOL_MAX_SIZE, POOL_MIN_SIZE
+from forms import CATEGORY_FIELDS, INVALID_JSON_ERROR, FieldError, PRODUCT_FIELDS, VENDOR_FIELDS, process_fields
+from registry import REPORTS, to_numbered
+from reports import ReportArgsError
+from serialization import ROW_FORMATS, RowFormatError, dumps, parse_row_format, rows_payload
+
+ASYNC_POOL_MAX_SIZE = int(os.environ.get('ASYNC_DB_POOL_MAX', max(POOL_MAX_SIZE, 20)))
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT', 2))
+
+
+def _json_default(o):
+    # Same conversions as Flask's default JSON provider, so payloads match byte for byte
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (Decimal, UUID)):
+        return str(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def json_response(data, status_code=200):
+    body = json.dumps(data, default=_json_default, sort_keys=True, separators=(',', ':')) + '\n'
+    return Response(body, status_code=status_code, media_type='application/json')
+
+
+async def fetch_rows(request, query, *args):
+    async with request.app.state.pool.acquire() as conn:
+        records = await conn.fetch(query, *args)
+    return [dict(record) for record in records]
+
+
+async def fetch_tuples(request, query, *args):
+    """(column names, row tuples) for the compact formats."""
+    async with request.app.state.pool.acquire() as conn:
+        statement = await conn.prepare(query)
+        records = await statement.fetch(*args)
+        columns = [attribute.name for attribute in statement.get_attributes()]
+    return columns, [tuple(record) for record in records]
+
+
+def report_route(report):
+    """Async endpoint for a registry report, without pagination or streaming."""
+    async def endpoint(request):
+        try:
+            query, args = report.base_query(request.query_params)
+            row_format = parse_row_format(request.query_params, request.headers.get('accept'))
+        except (ReportArgsError, RowFormatError) as e:
+            return json_response({"error": str(e)}, 400)
+        try:
+            # asyncpg prepares and caches the statement per connection
+            if row_format != 'records':
+                columns, rows = await fetch_tuples(request, to_numbered(query), *args)
+                return Response(dumps(rows_payload(columns, rows, row_format)), media_type=ROW_FORMATS[row_format])
+            return json_response(await fetch_rows(request, to_numbered(query), *args))
+        except Exception as e:
+            print(f"❌ DB fetch error in {report.path}:", e)
+            return json_response({"error": str(e)}, 500)
+
+    return endpoint
+
+
+def insert_route(table_name, field_mappings):
+    """POST route inserting one record or, for a JSON array, many in one transaction, reporting bad rows."""
+    async def endpoint(request):
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if data is None:
+            # Flask's get_json(silent=True) cannot tell a JSON null from a bad body either
+            return json_response({'error': INVALID_JSON_ERROR}, 400)
+        rows = data if isinstance(data, list) else [data]
+
+        valid_rows = []
+        errors = []
+        for index, row in enumerate(rows):
+            try:
+                if not isinstance(row, dict):
+                    raise FieldError('Row must be an object')
+                valid_rows.append((index, process_fields(row, field_mappings)))
+            except FieldError as e:
+                if not isinstance(data, list):
+                    return json_response({'error': str(e)}, 400)
+                errors.append({'row': index, 'error': str(e)})
+        if not valid_rows:
+            return json_response({'error': f'No valid rows to add to {table_name}', 'inserted': 0, 'errors': errors}, 400)
+
+        columns = list(valid_rows[0][1].keys())
+        placeholders = ', '.join(f'${i}' for i in range(1, len(columns) + 1))
+        query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        values = [(index, [row[col] for col in columns]) for index, row in valid_rows]
+        inserted = len(values)
+        duplicates = 0
+        try:
+            async with request.app.state.pool.acquire() as conn:
+                try:
+                    async with conn.transaction():
+                        await conn.executemany(query, [row for _, row in values])
+                except (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError) as e:
+                    if not isinstance(data, list):
+                        raise
+                    # As in app2.py: find the rows the database refuses, one savepoint each
+                    print(f"Bulk insert into {table_name} failed, retrying row by row:", e)
+                    inserted = 0
+                    async with conn.transaction():
+                        for index, row in values:
+                            try:
+                                async with conn.transaction():
+                                    await conn.execute(query, *row)
+                                inserted += 1
+                            except asyncpg.UniqueViolationError as e:
+                                duplicates += 1
+                                errors.append({'row': index, 'error': f'A record with this ID already exists in '
+                                                                      f'{table_name}: {e.detail}'})
+                            except (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError) as e:
+                                message = f'{e.message}: {e.detail}' if e.detail else e.message
+                                errors.append({'row': index, 'error': message})
+        except asyncpg.UniqueViolationError as e:
+            print(f"Unique violation error in {table_name}:", e)
+            return json_response({'error': f'A record with this ID already exists in {table_name}'}, 409)
+        except Exception as e:
+            print(f"Error adding to {table_name}:", e)
+            return json_response({'error': f'Failed to add to {table_name}: {str(e)}'}, 500)
+
+        if isinstance(data, list):
+            errors.sort(key=lambda error: error['row'])
+            if not inserted:
+                return json_response({'error': f'No valid rows to add to {table_name}', 'inserted': 0,
+                                      'errors': errors}, 409 if duplicates == len(errors) else 400)
+            return json_response({'message': f'{inserted} rows added to {table_name}',
+                                  'inserted': inserted, 'errors': errors})
+        return json_response({'message': f'{table_name} added successfully'})
+
+    return endpoint
+
+
+async def home(request):
+    return FileResponse(page_path('dashboard_ui.html'), headers={'Cache-Control': REVALIDATE})
+
+
+async def healthz(request):
+    return json_response({"status": "ok"})
+
+
+async def readyz(request):
+    try:
+        async with request.app.state.pool.acquire(timeout=READY_TIMEOUT) as conn:
+            await conn.fetchval('SELECT 1', timeout=READY_TIMEOUT)
+    except Exception as e:
+        return json_response({"status": "unavailable", "error": str(e)}, 503)
+    return json_response({"status": "ready"})
+
+
+routes = [
+    Route('/', home),
+    Route('/healthz', healthz),
+    Route('/readyz', readyz),
+    Route('/add_product', insert_route('Product', PRODUCT_FIELDS), methods=['POST']),
+    Route('/add_vendor', insert_route('Vendor', VENDOR_FIELDS), methods=['POST']),
+    Route('/add_category', insert_route('Category', CATEGORY_FIELDS), methods=['POST']),
+] + [Route(report.path, report_route(report)) for report in REPORTS]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.pool = await asyncpg.create_pool(
+        min_size=POOL_MIN_SIZE,
+        max_size=ASYNC_POOL_MAX_SIZE,
+        **DB_CONFIG
+    )
+    try:
+        yield
+    finally:
+        await app.state.pool.close()
+
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
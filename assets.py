@@ -0,0 +1,371 @@
+"""
+Static asset pipeline for the HTML UI
+
+Build step, run on deploy after the pages or assets change:
+
+    python assets.py                      build into build/
+    python assets.py --output /srv/ui     somewhere else (also set ASSET_BUILD_DIR for the app)
+
+Every *.html page is copied to build/pages with its /static/ references
+rewritten to content-hashed names (style.3f2a9c1e04b7.css) written to
+build/static. Stylesheets have their url() references rewritten the same
+way, and background images also get WebP and AVIF variants, resized to
+each of ASSET_IMAGE_WIDTHS no wider than the original, offered through
+image-set() with the original as fallback. Text files get .gz and .br
+siblings compressed at the highest level, kept when they are smaller.
+build/manifest.json maps the original names to the hashed ones.
+
+init_app() serves the build from Flask: hashed files with a one-year
+immutable Cache-Control, pages with no-cache so every visit revalidates
+them by ETag, both precompressed when the browser accepts it. Until a
+build exists, the source files are served as they are with no-cache.
+
+Pillow is needed for the image variants and the brotli module for .br
+files; the build skips either, with a note, when it is not installed.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import threading
+from io import BytesIO
+
+from flask import abort, request, send_file
+
+ASSET_SOURCE_DIR = os.environ.get('ASSET_SOURCE_DIR', os.path.dirname(os.path.abspath(__file__)))
+ASSET_BUILD_DIR = os.environ.get('ASSET_BUILD_DIR', os.path.join(ASSET_SOURCE_DIR, 'build'))
+ASSET_IMAGE_WIDTHS = tuple(int(width) for width in os.environ.get('ASSET_IMAGE_WIDTHS', '960,1920').split(','))
+MANIFEST = 'manifest.json'
+STATIC_PREFIX = '/static/'
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+TEXT_EXTENSIONS = {'.css', '.js', '.html', '.svg', '.json', '.txt'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+# Served from the source directory before the first build
+SOURCE_EXTENSIONS = TEXT_EXTENSIONS - {'.json', '.txt'} | IMAGE_EXTENSIONS | {'.webp', '.avif', '.gif', '.ico'}
+# Pillow format name, MIME type and encoder options per variant, best first
+IMAGE_VARIANTS = [
+    ('avif', 'image/avif', {'quality': 55}),
+    ('webp', 'image/webp', {'quality': 80, 'method': 6}),
+]
+# Precompressed siblings, preferred in this order when the browser accepts both
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+_CSS_URL = re.compile(r'url\(\s*("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[^)]*?)\s*\)')
+_CSS_RULE = re.compile(r'([^{}]+)\{([^{}]*)\}')
+_CSS_ESCAPE = re.compile(r'\\(.)')
+_HTML_STATIC = re.compile(r'''((?:href|src)\s*=\s*["'])/static/([^"'?#]+)''')
+
+
+def public_name(name, digest):
+    """Hashed file name: 'background_image (1).jpg' -> 'background_image-1.<digest>.jpg'."""
+    stem, extension = os.path.splitext(os.path.basename(name))
+    stem = re.sub(r'[^A-Za-z0-9_]+', '-', stem).strip('-') or 'asset'
+    return f'{stem}.{digest}{extension.lower()}'
+
+
+class AssetBuilder:
+    """
+    One build of the pages and the assets they reference
+
+    Args:
+        source_dir (str): Directory holding the pages and assets
+        build_dir (str): Output directory, replaced by the build
+    """
+
+    def __init__(self, source_dir=ASSET_SOURCE_DIR, build_dir=ASSET_BUILD_DIR, image_widths=ASSET_IMAGE_WIDTHS):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.image_widths = image_widths
+        self.static_dir = os.path.join(build_dir, 'static')
+        self.pages_dir = os.path.join(build_dir, 'pages')
+        self.assets = {}  # source name -> public name
+        self.pages = {}  # page name -> {'etag': ...}
+        self._image_sets = {}
+        self.stats = {'source_bytes': 0, 'built_bytes': 0}
+        self._brotli = self._pillow = None
+        try:
+            import brotli  # optional dependency
+            self._brotli = brotli
+        except ImportError:
+            print("Note: brotli is not installed, skipping .br files")
+        try:
+            from PIL import Image  # optional dependency
+            self._pillow = Image
+        except ImportError:
+            print("Note: Pillow is not installed, skipping WebP/AVIF image variants")
+
+    def _write(self, directory, name, data):
+        """Write a file and its compressed siblings."""
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.stats['built_bytes'] += len(data)
+        if os.path.splitext(name)[1] not in TEXT_EXTENSIONS:
+            return
+        compressed = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if self._brotli is not None:
+            compressed['.br'] = self._brotli.compress(data, quality=11)
+        for suffix, body in compressed.items():
+            if len(body) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(body)
+
+    def _emit(self, name, data):
+        public = public_name(name, hashlib.sha256(data).hexdigest()[:12])
+        self._write(self.static_dir, public, data)
+        return public
+
+    def _source(self, name):
+        path = os.path.normpath(os.path.join(self.source_dir, name))
+        if os.path.commonpath([path, self.source_dir]) != self.source_dir or not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.stats['source_bytes'] += len(data)
+        return data
+
+    def asset(self, name):
+        """Public name of a source asset, building it on first use; None if it does not exist."""
+        name = os.path.normpath(name).replace(os.sep, '/')
+        if name not in self.assets:
+            data = self._source(name)
+            if data is None:
+                print(f"❌ Missing asset: {name}")
+                self.assets[name] = None
+            else:
+                if name.endswith('.css'):
+                    data = self.rewrite_css(data.decode('utf-8'), os.path.dirname(name)).encode('utf-8')
+                self.assets[name] = self._emit(name, data)
+        return self.assets[name]
+
+    def image_set(self, name):
+        """
+        Fingerprinted image and its variants
+
+        Returns:
+            tuple: (public name of the original, {width: [(public name, MIME type), ...]})
+        """
+        if name in self._image_sets:
+            return self._image_sets[name]
+        original = self.asset(name)
+        variants = {}
+        self._image_sets[name] = original, variants
+        if original is None or self._pillow is None:
+            return original, variants
+        image = self._pillow.open(os.path.join(self.source_dir, name))
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        widths = sorted({min(width, image.width) for width in self.image_widths})
+        stem, _ = os.path.splitext(name)
+        for width in widths:
+            resized = image
+            if width < image.width:
+                resized = image.resize((width, round(image.height * width / image.width)), self._pillow.LANCZOS)
+            for image_format, mime_type, options in IMAGE_VARIANTS:
+                buffer = BytesIO()
+                try:
+                    resized.save(buffer, image_format.upper(), **options)
+                except (KeyError, OSError, ValueError) as e:
+                    print(f"Note: cannot encode {image_format}, skipping:", e)
+                    continue
+                variants.setdefault(width, []).append((self._emit(f'{stem}-{width}.{image_format}', buffer.getvalue()),
+                                                       mime_type))
+        return original, variants
+
+    def rewrite_css(self, css, base):
+        """Point url() references at hashed files and add image-set() variants for background images."""
+        def url_target(raw):
+            value = raw[1:-1] if raw[:1] in '"\'' else raw
+            value = _CSS_ESCAPE.sub(r'\1', value)
+            if re.match(r'^(?:[a-z]+:|//|#)', value, re.I):
+                return None
+            if value.startswith(STATIC_PREFIX):
+                return value[len(STATIC_PREFIX):]
+            return os.path.join(base, value) if not value.startswith('/') else value.lstrip('/')
+
+        def rewrite_url(match):
+            target = url_target(match.group(1))
+            public = self.asset(target) if target else None
+            return f'url("{STATIC_PREFIX}{public}")' if public else match.group(0)
+
+        media_rules = []
+
+        def rewrite_rule(match):
+            selector, body = match.group(1), match.group(2)
+
+            def rewrite_declaration(declaration):
+                prop, _, value = declaration.partition(':')
+                urls = _CSS_URL.findall(value)
+                target = url_target(urls[0]) if len(urls) == 1 else None
+                if prop.strip().lower() not in ('background', 'background-image') or not target or \
+                        os.path.splitext(target)[1].lower() not in IMAGE_EXTENSIONS:
+                    return _CSS_URL.sub(rewrite_url, declaration)
+                original, variants = self.image_set(target)
+                if original is None:
+                    return declaration
+                fallback = _CSS_URL.sub(rewrite_url, declaration)
+                if not variants:
+                    return fallback
+                # Browsers without image-set() keep the first declaration
+                mime_type = mimetypes.guess_type(original)[0]
+                indent = re.match(r'\s*', declaration).group(0)
+
+                def image_set(width):
+                    options = [f'url("{STATIC_PREFIX}{public}") type("{mime}")' for public, mime in variants[width]]
+                    options.append(f'url("{STATIC_PREFIX}{original}") type("{mime_type}")')
+                    return _CSS_URL.sub(lambda _: f'image-set({", ".join(options)})', value.strip(), count=1)
+
+                widths = sorted(variants)
+                for smaller, larger in zip(widths, widths[1:]):
+                    media_rules.append(f'@media (max-width: {smaller}px) {{\n  {selector.strip()} {{ '
+                                       f'{prop.strip()}: {image_set(smaller)}; }}\n}}\n')
+                return f'{fallback};{indent}{prop.strip()}: {image_set(widths[-1])}'
+
+            declarations = body.split(';')
+            return selector + '{' + ';'.join(rewrite_declaration(d) if '(' in d else d for d in declarations) + '}'
+
+        css = _CSS_RULE.sub(rewrite_rule, css)
+        # Narrow-screen overrides go last so they win over the rules they refine
+        return css + ('\n' + ''.join(reversed(media_rules)) if media_rules else '')
+
+    def page(self, name):
+        """Copy one HTML page with its /static/ references pointing at hashed files."""
+        html = self._source(name).decode('utf-8')
+
+        def rewrite(match):
+            public = self.asset(match.group(2))
+            return f'{match.group(1)}{STATIC_PREFIX}{public}' if public else match.group(0)
+
+        data = _HTML_STATIC.sub(rewrite, html).encode('utf-8')
+        self._write(self.pages_dir, name, data)
+        self.pages[name] = {'etag': hashlib.sha256(data).hexdigest()[:16]}
+
+    def build(self):
+        """Build every page in the source directory and write the manifest; returns the manifest."""
+        shutil.rmtree(self.build_dir, ignore_errors=True)
+        os.makedirs(self.static_dir)
+        os.makedirs(self.pages_dir)
+        for name in sorted(os.listdir(self.source_dir)):
+            if name.endswith('.html'):
+                self.page(name)
+        manifest = {'assets': {name: public for name, public in sorted(self.assets.items()) if public},
+                    'pages': self.pages}
+        # Written last: the app only switches to a build that is complete
+        with open(os.path.join(self.build_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+# Serving
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def load_manifest():
+    """The build manifest, read once per process; None before the first build."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            try:
+                with open(os.path.join(ASSET_BUILD_DIR, MANIFEST)) as f:
+                    _manifest = json.load(f)
+            except FileNotFoundError:
+                return None
+    return _manifest
+
+
+def send_precompressed(path, cache_control, etag=None):
+    """A built file, as its .br or .gz sibling when the browser accepts that encoding."""
+    mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if name in request.accept_encodings and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, name
+            break
+    response = send_file(path, mimetype=mime_type, conditional=True,
+                         etag=f'{etag}-{encoding}' if etag and encoding else etag or True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if os.path.splitext(path)[1] in TEXT_EXTENSIONS or encoding:
+        response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def send_source(name):
+    """A source file as it is, before the first build."""
+    if os.path.splitext(name)[1].lower() not in SOURCE_EXTENSIONS:
+        abort(404)
+    path = os.path.normpath(os.path.join(ASSET_SOURCE_DIR, name))
+    if os.path.commonpath([path, ASSET_SOURCE_DIR]) != ASSET_SOURCE_DIR or not os.path.isfile(path):
+        abort(404)
+    response = send_file(path, conditional=True)
+    response.headers['Cache-Control'] = REVALIDATE
+    return response
+
+
+def send_page(name):
+    """A built UI page, or None when there is no build or no such page."""
+    manifest = load_manifest()
+    if manifest is None or name not in manifest['pages']:
+        return None
+    return send_precompressed(os.path.join(ASSET_BUILD_DIR, 'pages', name), REVALIDATE,
+                              manifest['pages'][name]['etag'])
+
+
+def page_path(name):
+    """Path of a UI page: its build once there is one, the source file before."""
+    manifest = load_manifest()
+    if manifest is not None and name in manifest['pages']:
+        return os.path.join(ASSET_BUILD_DIR, 'pages', name)
+    return os.path.join(ASSET_SOURCE_DIR, name)
+
+
+def static_file(filename):
+    manifest = load_manifest()
+    if manifest is not None:
+        if filename in manifest['assets'].values():
+            return send_precompressed(os.path.join(ASSET_BUILD_DIR, 'static', filename), IMMUTABLE)
+        # An old page asking for an original name: serve the current build of it, revalidated
+        public = manifest['assets'].get(filename)
+        if public:
+            return send_precompressed(os.path.join(ASSET_BUILD_DIR, 'static', public), REVALIDATE)
+    return send_source(filename)
+
+
+def ui_page(page):
+    response = send_page(f'{page}.html')
+    return response if response is not None else send_source(f'{page}.html')
+
+
+def init_app(app):
+    """Serve /static/ and the *.html UI pages from the asset build."""
+    app.add_url_rule('/static/<path:filename>', 'static', static_file)
+    app.add_url_rule('/<page>.html', 'ui_page', ui_page)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=ASSET_SOURCE_DIR)
+    parser.add_argument('--output', default=ASSET_BUILD_DIR)
+    args = parser.parse_args(argv)
+
+    builder = AssetBuilder(os.path.abspath(args.source), os.path.abspath(args.output))
+    manifest = builder.build()
+    print(f"Built {len(manifest['pages'])} pages and {len(manifest['assets'])} assets into {args.output}")
+    for name, public in manifest['assets'].items():
+        print(f"  {name} -> {public}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,149 @@
+"""
+Compare throughput and latency of the Flask app against the ASGI app
+
+Starts app2.py on a threaded Werkzeug server and asgi_app.py on uvicorn,
+drives the same GET routes against each with a fixed number of concurrent
+keep-alive clients, and prints requests/second and p50/p99 latency.
+
+Both servers use the database settings from the DB_* environment variables.
+
+Usage:
+    python benchmarks/compare_flask_asgi.py --concurrency 32 --duration 10
+    python benchmarks/compare_flask_asgi.py --routes /best_employees /get_products
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ROUTES = [
+    '/get_products',
+    '/list_vendors',
+    '/best_employees',
+    '/list_customers_expenditure',
+    '/product_highest_sales_5',
+    '/revenue_last_month',
+    '/highest_purchase',
+]
+
+SERVERS = {
+    'flask': [sys.executable, '-c',
+              'import logging, sys; from werkzeug.serving import run_simple; import app2; '
+              'logging.getLogger("werkzeug").setLevel(logging.WARNING); '
+              'run_simple("127.0.0.1", int(sys.argv[1]), app2.app, threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', '127.0.0.1',
+             '--log-level', 'warning', '--port'],
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/metrics')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def run_load(port, route, concurrency, duration):
+    """
+    Hammer one route, or cycle through several
+
+    Args:
+        route: A GET path, or a list of (method, path, JSON body or None) requests
+            that every client works through in turn
+
+    Returns:
+        tuple: (completed requests, errors, sorted latencies in ms)
+    """
+    targets = [('GET', route, None)] if isinstance(route, str) else route
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local = []
+        local_errors = 0
+        sent = offset
+        while time.monotonic() < stop_at:
+            method, path, body = targets[sent % len(targets)]
+            sent += 1
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                continue
+            local.append((time.perf_counter() - started) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return len(latencies), errors[0], latencies
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', nargs='+', default=DEFAULT_ROUTES)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per route per server')
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--port', type=int, default=5100)
+    args = parser.parse_args(argv)
+
+    results = []
+    for offset, name in enumerate(args.servers):
+        port = args.port + offset
+        process = subprocess.Popen(SERVERS[name] + [str(port)], cwd=ROOT)
+        try:
+            wait_until_up(port)
+            for route in args.routes:
+                # Short warm-up so pools and caches are filled before measuring
+                run_load(port, route, args.concurrency, min(1.0, args.duration))
+                count, errors, latencies = run_load(port, route, args.concurrency, args.duration)
+                results.append((name, route, count / args.duration, percentile(latencies, 0.50),
+                                percentile(latencies, 0.99), errors))
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f"{'server':<7} {'route':<32} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, route, rps, p50, p99, errors in results:
+        print(f'{name:<7} {route:<32} {rps:>9.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,305 @@
+"""
+Load test every route of the app against a seeded PostgreSQL
+
+Seeds a synthetic store_inventory database at the requested scale (see
+seed.py), applies migrations/, starts the Flask or ASGI server on it and
+drives each route in turn with concurrent keep-alive clients, followed by
+a mixed phase that cycles through all of them at once. Throughput,
+p50/p95/p99 latency, errors and the server's peak RSS are printed and
+written to a JSON file; --compare flags routes that got slower than a
+previous run and exits non-zero.
+
+The database comes from the DB_* environment variables, or with
+--local-postgres a throwaway cluster is created with initdb/pg_ctl (from
+PATH or --pg-bin; initdb refuses to run as root) and removed afterwards.
+--replicas adds that many streaming replicas to it and points the app's
+report queries at them.
+
+Usage:
+    python benchmarks/load_test.py --scale 2 --concurrency 16 --duration 10
+    python benchmarks/load_test.py --local-postgres --pg-bin /usr/lib/postgresql/16/bin
+    python benchmarks/load_test.py --skip-seed --compare benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import psycopg2
+
+from compare_flask_asgi import ROOT, SERVERS, percentile, run_load, wait_until_up
+from local_pg import local_replication
+from seed import DEFAULT_DATABASE, create_database, seed
+
+sys.path.insert(0, ROOT)
+from db import DB_CONFIG  # noqa: E402
+from registry import REPORTS  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# Product every /checkout request buys one of
+CHECKOUT_PRODUCT = 1
+
+# Routes outside the registry, as (method, path, JSON body or None)
+EXTRA_TARGETS = [
+    ('GET', '/', None),
+    ('GET', '/inventory_ui.html', None),
+    ('GET', '/static/style.css', None),
+    ('GET', '/healthz', None),
+    ('GET', '/readyz', None),
+    ('GET', '/metrics', None),
+    ('GET', '/slow_queries', None),
+    ('GET', '/reports/range?granularity=month', None),
+    ('GET', '/reports/range?granularity=day&metrics=revenue', None),
+    ('GET', '/reports/batch?reports=best_employees,revenue_last_month,highest_purchase', None),
+    ('POST', '/reports/batch', json.dumps({'reports': ['get_all_sales_today', 'product_highest_sales_5',
+                                                       {'name': 'best_employees', 'params': {'days': 7}}]})),
+    ('GET', '/get_products?limit=100', None),
+    ('GET', '/products?limit=100', None),
+    ('GET', '/products?q=duct&in_stock=1', None),
+    ('GET', '/products/1', None),
+    ('GET', '/stock/low', None),
+    ('GET', '/transactionlog?stream=ndjson', None),
+    ('POST', '/jobs', json.dumps({'report': 'best_employees', 'params': {'days': 30}})),
+    ('POST', '/add_category', json.dumps({'categoryName': 'Load test', 'description': 'x'})),
+    ('POST', '/add_vendor', json.dumps({'vendorName': 'Load test', 'vendorEmail': 'load@example.com',
+                                        'vendorNumber': 5550100})),
+    ('POST', '/add_product', json.dumps({'productName': 'Load test', 'price': 9.99, 'quantity': 5,
+                                         'CategoryID': 1, 'SupplierID': 1})),
+    ('POST', '/checkout', json.dumps({'customerID': 1, 'employeeid': 1, 'paymentMode': 'Cash',
+                                      'items': [{'productid': CHECKOUT_PRODUCT, 'quantity': 1}]})),
+]
+
+# Flask endpoints left out on purpose: an event stream never completes, and
+# job ids only exist once a job has been submitted
+UNTARGETED_ENDPOINTS = {'stock_events', 'job_status', 'job_result'}
+
+
+def all_targets():
+    return [('GET', report.path, None) for report in REPORTS] + EXTRA_TARGETS
+
+
+def untargeted_routes(targets):
+    """Routes of the Flask app that none of targets requests, other than UNTARGETED_ENDPOINTS."""
+    from app2 import app
+    adapter = app.url_map.bind('localhost')
+    hit = set()
+    for method, path, _ in targets:
+        endpoint, _ = adapter.match(path.split('?')[0], method=method)
+        hit.add(endpoint)
+    return sorted(rule.rule for rule in app.url_map.iter_rules()
+                  if rule.endpoint not in hit | UNTARGETED_ENDPOINTS)
+
+
+def stock_checkout_product(dsn, database):
+    # Enough stock that the /checkout target never runs out and answers 409
+    conn = psycopg2.connect(**dict(dsn, database=database))
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("UPDATE product SET stockquantity = 1000000000 WHERE productid = %s", (CHECKOUT_PRODUCT,))
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _no_cluster():
+    yield {}, []
+
+
+def rss_bytes(pid):
+    """Resident set size of a process, from /proc; None where that is unavailable."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Polls a process's RSS in the background and keeps the peak."""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = rss_bytes(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def prepare_database(dsn, database, scale):
+    create_database(dsn, database)
+    started = time.perf_counter()
+    conn = psycopg2.connect(**dict(dsn, database=database))
+    try:
+        counts = seed(conn, scale)
+    finally:
+        conn.close()
+    print(f'Seeded {database} at scale {scale} ({counts["salesinvoice"]} invoices) '
+          f'in {time.perf_counter() - started:.1f}s')
+
+
+def measure(port, pid, name, targets, concurrency, duration, warmup):
+    if warmup:
+        run_load(port, targets, concurrency, warmup)
+    with RssSampler(pid) as sampler:
+        count, errors, latencies = run_load(port, targets, concurrency, duration)
+    return {
+        'route': name,
+        'requests': count,
+        'errors': errors,
+        'rps': count / duration,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'peak_rss_mb': sampler.peak / 2 ** 20 if sampler.peak is not None else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Routes whose throughput fell, or p99 rose, by more than threshold percent."""
+    previous = {row['route']: row for row in baseline['routes']}
+    regressions = []
+    for row in results['routes']:
+        before = previous.get(row['route'])
+        if before is None:
+            continue
+        rps_change = (row['rps'] - before['rps']) / before['rps'] * 100 if before['rps'] else 0.0
+        p99_change = (row['p99_ms'] - before['p99_ms']) / before['p99_ms'] * 100 if before['p99_ms'] else 0.0
+        row['rps_change_pct'] = rps_change
+        row['p99_change_pct'] = p99_change
+        if rps_change < -threshold or p99_change > threshold:
+            regressions.append(row['route'])
+    return regressions
+
+
+def print_table(results):
+    print(f"{'route':<48} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'rss MB':>7}"
+          f" {'Δ req/s':>8} {'Δ p99':>8}")
+    for row in results['routes']:
+        rss = f"{row['peak_rss_mb']:.0f}" if row['peak_rss_mb'] is not None else '-'
+        rps_change = f"{row['rps_change_pct']:+.0f}%" if 'rps_change_pct' in row else ''
+        p99_change = f"{row['p99_change_pct']:+.0f}%" if 'p99_change_pct' in row else ''
+        print(f"{row['route'][:48]:<48} {row['rps']:>9.1f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['errors']:>7} {rss:>7} {rps_change:>8} {p99_change:>8}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help='Data volume multiplier, see seed.py')
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='Database to (re)create and test against')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse the database from a previous run')
+    parser.add_argument('--local-postgres', action='store_true', help='Run against a temporary local cluster')
+    parser.add_argument('--pg-bin', help='Directory holding initdb and pg_ctl')
+    parser.add_argument('--replicas', type=int, default=0, help='Streaming replicas for --local-postgres')
+    parser.add_argument('--server', choices=list(SERVERS), default='flask')
+    parser.add_argument('--routes', nargs='+', help='GET paths to test instead of every route')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per route')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Unmeasured seconds before each route')
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<server>-<time>.json)')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+    args = parser.parse_args(argv)
+
+    targets = [('GET', path, None) for path in args.routes] if args.routes else all_targets()
+    if not args.routes:
+        missing = untargeted_routes(targets)
+        if missing:
+            print(f'⚠️ No load test target for: {", ".join(missing)}')
+
+    cluster = local_replication(args.pg_bin, args.replicas) if args.local_postgres else _no_cluster()
+    with cluster as (overrides, replica_hosts):
+        dsn = dict(DB_CONFIG, **overrides)
+        if not args.skip_seed:
+            prepare_database(dsn, args.database, args.scale)
+
+        env = dict(os.environ, DB_HOST=dsn['host'], DB_USER=dsn['user'], DB_PASSWORD=dsn['password'],
+                   DB_NAME=args.database)
+        if replica_hosts:
+            env['DB_REPLICA_HOSTS'] = ','.join(replica_hosts)
+        if not args.skip_seed:
+            subprocess.run([sys.executable, 'migrate.py'], cwd=ROOT, env=env, check=True)
+        stock_checkout_product(dsn, args.database)
+
+        # The app prints every submitted form; keep stderr for errors only
+        process = subprocess.Popen(SERVERS[args.server] + [str(args.port)], cwd=ROOT, env=env,
+                                   stdout=subprocess.DEVNULL)
+        try:
+            wait_until_up(args.port)
+            rows = []
+            for method, path, body in targets:
+                name = path if method == 'GET' else f'{method} {path}'
+                rows.append(measure(args.port, process.pid, name, [(method, path, body)], args.concurrency,
+                                    args.duration, args.warmup))
+            if len(targets) > 1:
+                rows.append(measure(args.port, process.pid, 'mixed (all routes)', targets, args.concurrency,
+                                    args.duration, args.warmup))
+        finally:
+            process.terminate()
+            process.wait()
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'server': args.server,
+        'scale': args.scale,
+        'replicas': len(replica_hosts) if args.local_postgres else None,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'routes': rows,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.server}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_table(results)
+    print(f'Results written to {output}')
+    if regressions:
+        print(f'{len(regressions)} route(s) regressed by more than {args.threshold:g}%: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,114 @@
+"""
+Throwaway local PostgreSQL clusters for benchmarks and replica testing
+
+Clusters are created with initdb (trust authentication, Unix socket
+only) in temporary directories and removed when the context exits.
+Replicas are cloned from the primary with pg_basebackup and follow it by
+streaming replication. initdb refuses to run as root.
+
+Usage:
+    python benchmarks/local_pg.py --replicas 2 --pg-bin /usr/lib/postgresql/16/bin
+
+prints the DB_* settings to export for app2.py and keeps the clusters
+running until interrupted.
+"""
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+
+def pg_binary(pg_bin, name):
+    return os.path.join(pg_bin, name) if pg_bin else shutil.which(name) or name
+
+
+def start_cluster(base_dir, pg_bin=None):
+    """Start the cluster in base_dir/data, with its socket and log in base_dir."""
+    subprocess.run([pg_binary(pg_bin, 'pg_ctl'), '-D', os.path.join(base_dir, 'data'),
+                    '-l', os.path.join(base_dir, 'server.log'), '-w',
+                    '-o', f"-c listen_addresses='' -k {base_dir}", 'start'],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def stop_cluster(base_dir, pg_bin=None):
+    subprocess.run([pg_binary(pg_bin, 'pg_ctl'), '-D', os.path.join(base_dir, 'data'), '-m', 'fast', '-w', 'stop'],
+                   stdout=subprocess.DEVNULL)
+
+
+@contextmanager
+def _cluster(prepare, pg_bin):
+    # Sockets and logs live outside the data directory so replicas do not copy them
+    base_dir = tempfile.mkdtemp(prefix='loadtest-pg-')
+    try:
+        prepare(os.path.join(base_dir, 'data'))
+        start_cluster(base_dir, pg_bin)
+        try:
+            yield base_dir
+        finally:
+            stop_cluster(base_dir, pg_bin)
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+@contextmanager
+def local_postgres(pg_bin=None):
+    """Temporary primary; yields the DB_CONFIG overrides that reach it."""
+    def prepare(data_dir):
+        subprocess.run([pg_binary(pg_bin, 'initdb'), '-D', data_dir, '-U', 'postgres', '-A', 'trust'],
+                       check=True, stdout=subprocess.DEVNULL)
+
+    with _cluster(prepare, pg_bin) as base_dir:
+        yield {'host': base_dir, 'user': 'postgres', 'password': ''}
+
+
+@contextmanager
+def local_replica(primary_host, pg_bin=None):
+    """Streaming replica of a local_postgres() primary; yields its socket directory."""
+    def prepare(data_dir):
+        subprocess.run([pg_binary(pg_bin, 'pg_basebackup'), '-D', data_dir, '-h', primary_host, '-U', 'postgres',
+                        '-X', 'stream', '-R'], check=True)
+
+    with _cluster(prepare, pg_bin) as base_dir:
+        yield base_dir
+
+
+@contextmanager
+def local_replication(pg_bin=None, replicas=1):
+    """
+    A primary with streaming replicas
+
+    Yields:
+        tuple: (DB_CONFIG overrides for the primary, list of replica hosts for DB_REPLICA_HOSTS)
+    """
+    with ExitStack() as stack:
+        primary = stack.enter_context(local_postgres(pg_bin))
+        hosts = [stack.enter_context(local_replica(primary['host'], pg_bin)) for _ in range(replicas)]
+        yield primary, hosts
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replicas', type=int, default=1)
+    parser.add_argument('--pg-bin', help='Directory holding initdb, pg_ctl and pg_basebackup')
+    args = parser.parse_args(argv)
+
+    with local_replication(args.pg_bin, args.replicas) as (primary, hosts):
+        print(f"export DB_HOST={primary['host']} DB_USER=postgres DB_PASSWORD=")
+        if hosts:
+            print(f"export DB_REPLICA_HOSTS={','.join(hosts)}")
+        print('Clusters are running; press Ctrl-C to stop and remove them.', flush=True)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            while True:
+                signal.pause()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,115 @@
+-- Synthetic store_inventory schema for the load tests.
+-- Column names follow what app2.py reads and writes; migrations/ are
+-- applied on top of it by benchmarks/load_test.py.
+CREATE TABLE category (
+    categoryid  serial PRIMARY KEY,
+    name        text NOT NULL,
+    description text
+);
+
+CREATE TABLE supplier (
+    supplierid    serial PRIMARY KEY,
+    name          text NOT NULL,
+    contactnumber bigint,
+    email         text,
+    address       text
+);
+
+CREATE TABLE vendor (
+    vendorid      serial PRIMARY KEY,
+    name          text NOT NULL,
+    email         text,
+    contactnumber bigint,
+    address       text
+);
+
+CREATE TABLE product (
+    productid     serial PRIMARY KEY,
+    name          text NOT NULL,
+    description   text,
+    price         numeric(10, 2),
+    stockquantity int,
+    expirydate    date,
+    reorderlevel  int,
+    categoryid    int REFERENCES category,
+    supplierid    int REFERENCES supplier
+);
+
+CREATE TABLE customer (
+    customerid     serial PRIMARY KEY,
+    name           text NOT NULL,
+    email          text,
+    contactnumber  bigint,
+    address        text,
+    membership     text,
+    loyalitypoints int
+);
+
+CREATE TABLE employee (
+    employeeid    serial PRIMARY KEY,
+    name          text NOT NULL,
+    email         text,
+    contactnumber bigint,
+    salary        numeric(10, 2)
+);
+
+CREATE TABLE salesinvoice (
+    invoiceid       serial PRIMARY KEY,
+    customerid      int REFERENCES customer,
+    employeeid      int REFERENCES employee,
+    invoicedate     date,
+    totalamount     numeric(12, 2),
+    discountapplied numeric(10, 2),
+    taxamount       numeric(10, 2),
+    paymentmode     text
+);
+
+CREATE TABLE salesdetail (
+    salesdetailid serial PRIMARY KEY,
+    invoiceid     int REFERENCES salesinvoice,
+    productid     int REFERENCES product,
+    quantity      int,
+    unitprice     numeric(10, 2),
+    linetotal     numeric(12, 2)
+);
+
+CREATE TABLE purchaseorder (
+    orderid     serial PRIMARY KEY,
+    supplierid  int REFERENCES supplier,
+    orderdate   date,
+    status      text,
+    totalamount numeric(12, 2)
+);
+
+CREATE TABLE transactionlog (
+    logid      serial PRIMARY KEY,
+    employeeid int REFERENCES employee,
+    actiontype text,
+    timestamp  timestamp
+);
+
+CREATE TABLE returns (
+    returnid     serial PRIMARY KEY,
+    invoiceid    int REFERENCES salesinvoice,
+    customerid   int REFERENCES customer,
+    productid    int REFERENCES product,
+    refundamount numeric(10, 2),
+    reason       text,
+    returndate   date,
+    status       text
+);
+
+CREATE TABLE feedback (
+    feedbackid     serial PRIMARY KEY,
+    customerid     int REFERENCES customer,
+    rating         int,
+    comments       text,
+    responsestatus text
+);
+
+CREATE TABLE complaints (
+    complaintid      serial PRIMARY KEY,
+    customerid       int REFERENCES customer,
+    issuedescription text,
+    resolutionstatus text
+);
@@ -0,0 +1,173 @@
+"""
+Create and fill a synthetic store_inventory database
+
+Row counts grow linearly with --scale; scale 1 is a small store with 20k
+invoices over two years. Values are pseudo-random but seeded, so two runs
+at the same scale produce the same data. Product popularity is skewed so
+the top-N reports have something to rank.
+
+Usage:
+    python benchmarks/seed.py --scale 5 --database store_inventory_bench
+
+The database is dropped and recreated, so never point it at real data.
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2 import sql
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# Rows per table at scale 1
+BASE_ROWS = {
+    'category': 20,
+    'supplier': 50,
+    'product': 2000,
+    'customer': 5000,
+    'employee': 25,
+    'salesinvoice': 20000,
+    'purchaseorder': 2000,
+    'transactionlog': 20000,
+    'returns': 500,
+    'feedback': 1000,
+    'complaints': 500,
+}
+LINES_PER_INVOICE = 3
+HISTORY_DAYS = 730
+DEFAULT_DATABASE = 'store_inventory_bench'
+
+# Each statement fills one table from generate_series; %(table)s is its row count
+SEED_STATEMENTS = [
+    """INSERT INTO category (name, description)
+       SELECT 'Category ' || g, 'Synthetic category ' || g FROM generate_series(1, %(category)s) g""",
+    """INSERT INTO supplier (name, contactnumber, email, address)
+       SELECT 'Supplier ' || g, 5550000000 + g, 'supplier' || g || '@example.com', g || ' Market Street'
+       FROM generate_series(1, %(supplier)s) g""",
+    """INSERT INTO product (name, description, price, stockquantity, expirydate, reorderlevel, categoryid, supplierid)
+       SELECT 'Product ' || g, 'Synthetic product ' || g, round((1 + random() * 99)::numeric, 2),
+              floor(random() * 200)::int,
+              CASE WHEN random() < 0.3 THEN current_date + floor(random() * 365)::int END,
+              10 + floor(random() * 20)::int,
+              1 + floor(random() * %(category)s)::int, 1 + floor(random() * %(supplier)s)::int
+       FROM generate_series(1, %(product)s) g""",
+    """INSERT INTO customer (name, email, contactnumber, address, membership, loyalitypoints)
+       SELECT 'Customer ' || g, 'customer' || g || '@example.com', 5551000000 + g, g || ' High Street',
+              (ARRAY['none', 'silver', 'gold'])[1 + floor(random() * 3)::int], floor(random() * 1000)::int
+       FROM generate_series(1, %(customer)s) g""",
+    """INSERT INTO employee (name, email, contactnumber, salary)
+       SELECT 'Employee ' || g, 'employee' || g || '@example.com', 5552000000 + g,
+              round((2000 + random() * 3000)::numeric, 2)
+       FROM generate_series(1, %(employee)s) g""",
+    """INSERT INTO salesinvoice (customerid, employeeid, invoicedate, totalamount, discountapplied, taxamount,
+                                 paymentmode)
+       SELECT 1 + floor(random() * %(customer)s)::int, 1 + floor(random() * %(employee)s)::int,
+              current_date - floor(random() * %(history_days)s)::int, round((5 + random() * 495)::numeric, 2),
+              0, round((random() * 40)::numeric, 2), (ARRAY['cash', 'card', 'online'])[1 + floor(random() * 3)::int]
+       FROM generate_series(1, %(salesinvoice)s) g""",
+    # random()^2 favours low product ids, giving a long-tail sales distribution
+    """INSERT INTO salesdetail (invoiceid, productid, quantity, unitprice, linetotal)
+       SELECT invoiceid, productid, quantity, price, price * quantity
+       FROM (
+           SELECT 1 + (g - 1) / %(lines_per_invoice)s AS invoiceid,
+                  1 + floor(power(random(), 2) * %(product)s)::int AS productid,
+                  1 + floor(random() * 5)::int AS quantity,
+                  round((1 + random() * 99)::numeric, 2) AS price
+           FROM generate_series(1, %(salesdetail)s) g
+       ) lines""",
+    """INSERT INTO purchaseorder (supplierid, orderdate, status, totalamount)
+       SELECT 1 + floor(random() * %(supplier)s)::int, current_date - floor(random() * %(history_days)s)::int,
+              (ARRAY['pending', 'received', 'cancelled'])[1 + floor(random() * 3)::int],
+              round((50 + random() * 4950)::numeric, 2)
+       FROM generate_series(1, %(purchaseorder)s) g""",
+    """INSERT INTO transactionlog (employeeid, actiontype, timestamp)
+       SELECT 1 + floor(random() * %(employee)s)::int, (ARRAY['sale', 'return', 'restock'])[1 + floor(random() * 3)::int],
+              now() - random() * (%(history_days)s * interval '1 day')
+       FROM generate_series(1, %(transactionlog)s) g""",
+    """INSERT INTO returns (invoiceid, customerid, productid, refundamount, reason, returndate, status)
+       SELECT 1 + floor(random() * %(salesinvoice)s)::int, 1 + floor(random() * %(customer)s)::int,
+              1 + floor(random() * %(product)s)::int, round((1 + random() * 99)::numeric, 2), 'Damaged',
+              current_date - floor(random() * %(history_days)s)::int, 'processed'
+       FROM generate_series(1, %(returns)s) g""",
+    """INSERT INTO feedback (customerid, rating, comments, responsestatus)
+       SELECT 1 + floor(random() * %(customer)s)::int, 1 + floor(random() * 5)::int, 'Synthetic feedback ' || g,
+              'open'
+       FROM generate_series(1, %(feedback)s) g""",
+    """INSERT INTO complaints (customerid, issuedescription, resolutionstatus)
+       SELECT 1 + floor(random() * %(customer)s)::int, 'Synthetic complaint ' || g, 'open'
+       FROM generate_series(1, %(complaints)s) g""",
+]
+
+
+def row_counts(scale):
+    counts = {table: max(1, int(rows * scale)) for table, rows in BASE_ROWS.items()}
+    counts['salesdetail'] = counts['salesinvoice'] * LINES_PER_INVOICE
+    return counts
+
+
+def create_database(dsn, name):
+    """Drop and recreate database name, connecting through dsn's maintenance database."""
+    conn = psycopg2.connect(**dict(dsn, database='postgres'))
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL('DROP DATABASE IF EXISTS {}').format(sql.Identifier(name)))
+            cur.execute(sql.SQL('CREATE DATABASE {}').format(sql.Identifier(name)))
+    finally:
+        conn.close()
+
+
+def seed(conn, scale, seed_value=0.42, history_days=HISTORY_DAYS):
+    """
+    Create the schema and fill it
+
+    Args:
+        conn: psycopg2 connection to an empty database
+        scale (float): Multiplier for BASE_ROWS
+        seed_value (float): Seed for random(), between -1 and 1
+        history_days (int): Days of sales history to spread dates over
+
+    Returns:
+        dict: Rows inserted per table
+    """
+    counts = row_counts(scale)
+    params = dict(counts, lines_per_invoice=LINES_PER_INVOICE, history_days=history_days)
+    with open(SCHEMA_FILE) as f:
+        schema = f.read()
+    with conn.cursor() as cur:
+        cur.execute(schema)
+        cur.execute('SELECT setseed(%s)', (seed_value,))
+        for statement in SEED_STATEMENTS:
+            cur.execute(statement, params)
+        cur.execute('ANALYZE')
+    conn.commit()
+    return counts
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='Database to (re)create')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from db import DB_CONFIG
+
+    dsn = dict(DB_CONFIG, database=args.database)
+    create_database(dsn, args.database)
+    started = time.perf_counter()
+    conn = psycopg2.connect(**dsn)
+    try:
+        counts = seed(conn, args.scale)
+    finally:
+        conn.close()
+    print(f'Seeded {args.database} at scale {args.scale} in {time.perf_counter() - started:.1f}s')
+    for table, rows in counts.items():
+        print(f'  {table:<15} {rows:>10}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
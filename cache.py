@@ -0,0 +1,278 @@
+"""
+Response cache for read-mostly routes
+
+Responses are cached per URL and the generation of the tables they read;
+a write bumps the table's generation. With the memory backend each worker
+process has its own cache, so every process also LISTENs on the
+cache_invalidate channel (migrations/011_cache_invalidate_notify.sql) and
+bumps the tables written anywhere, by any process. The listener starts
+with the first cached request and, after losing its connection, empties
+the cache because invalidations may have been missed meanwhile.
+"""
+import hashlib
+import json
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import psycopg2
+from flask import Response, request
+
+from db import DB_CONFIG
+
+# 'memory' (per-process LRU) or 'redis' (shared by every worker)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 512))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_PREFIX = 'respcache:'
+# Response headers stored along with the body (pagination cursors)
+CACHED_HEADERS = ('X-Next-Cursor', 'Link')
+INVALIDATE_CHANNEL = 'cache_invalidate'
+# Follow invalidations from other processes; only needed for the memory backend
+CACHE_LISTEN = os.environ.get('CACHE_LISTEN', '1') == '1'
+CACHE_IDLE_CHECK = 15
+LISTEN_RECONNECT_MAX = 30
+
+
+class MemoryBackend:
+    """
+    In-process LRU cache with per-entry TTL
+
+    Table generations live in a plain dict, so other processes only see an
+    invalidation through InvalidationListener.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generations(self, tables):
+        with self._lock:
+            return [self._generations.get(table, 0) for table in tables]
+
+    def bump(self, table):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Cache entries and table generations stored in a Redis-compatible server."""
+
+    def __init__(self, url=CACHE_REDIS_URL):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.hgetall(CACHE_PREFIX + key)
+        if not value:
+            return None
+        return {
+            'body': value[b'body'],
+            'status': int(value[b'status']),
+            'content_type': value[b'content_type'].decode(),
+            'etag': value[b'etag'].decode(),
+            'headers': value[b'headers'].decode(),
+        }
+
+    def set(self, key, value, ttl):
+        pipe = self.client.pipeline()
+        pipe.hset(CACHE_PREFIX + key, mapping=value)
+        pipe.expire(CACHE_PREFIX + key, int(ttl))
+        pipe.execute()
+
+    def generations(self, tables):
+        if not tables:
+            return []
+        values = self.client.mget([f'{CACHE_PREFIX}gen:{table}' for table in tables])
+        return [int(value) if value else 0 for value in values]
+
+    def bump(self, table):
+        self.client.incr(f'{CACHE_PREFIX}gen:{table}')
+
+    def clear(self):
+        for key in self.client.scan_iter(CACHE_PREFIX + '*'):
+            self.client.delete(key)
+
+
+class InvalidationListener:
+    """LISTEN loop bumping the generation of every table written by any process."""
+
+    def __init__(self, backend, dsn=None):
+        self.backend = backend
+        self.dsn = dsn or DB_CONFIG
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'notifications': 0, 'reconnects': 0}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='cache-invalidate', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        conn = psycopg2.connect(**self.dsn)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN {INVALIDATE_CHANNEL}')
+            # Writes made while nobody listened are unknown; start over
+            self.backend.clear()
+            while True:
+                if select.select([conn], [], [], CACHE_IDLE_CHECK) == ([], [], []):
+                    with conn.cursor() as cur:
+                        cur.execute('SELECT 1')
+                    continue
+                conn.poll()
+                tables = {notify.payload for notify in conn.notifies}
+                conn.notifies.clear()
+                for table in tables:
+                    self.backend.bump(table.lower())
+                self.stats['notifications'] += len(tables)
+        finally:
+            conn.close()
+
+    def _run(self):
+        delay = 1
+        while True:
+            started = time.monotonic()
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError) as e:
+                print("❌ Cache invalidation listener error:", e)
+            self.stats['reconnects'] += 1
+            delay = 1 if time.monotonic() - started > LISTEN_RECONNECT_MAX else min(delay * 2, LISTEN_RECONNECT_MAX)
+            time.sleep(delay)
+
+
+class ResponseCache:
+    """
+    Caches GET responses keyed by URL and the generation of the tables they read
+
+    Writing to a table bumps its generation, which changes the key of every
+    response that depends on it, so stale entries are never served and
+    simply age out.
+    """
+
+    def __init__(self, backend, listener=None):
+        self.backend = backend
+        self.listener = listener
+        self._stats_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def invalidate(self, table_name):
+        """Drop cached responses that read table_name."""
+        self.backend.bump(table_name.lower())
+        self._count('invalidations')
+
+    def cached(self, tables, ttl):
+        """
+        Route decorator
+
+        Args:
+            tables (list): Tables the route reads; a write to any of them invalidates it
+            ttl (int): Seconds an entry may be served for
+        """
+        tables = [table.lower() for table in tables]
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Streamed responses are never buffered into the cache
+                if request.method != 'GET' or 'stream' in request.args:
+                    return view(*args, **kwargs)
+                if self.listener is not None:
+                    self.listener.start()
+
+                generations = self.backend.generations(tables)
+                # Accept is part of the key because it can pick the response format
+                key = '{}?{}|{}|{}'.format(
+                    request.path,
+                    '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True))),
+                    request.headers.get('Accept', ''),
+                    ','.join(map(str, generations))
+                )
+
+                entry = self.backend.get(key)
+                if entry is None:
+                    self._count('misses')
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response):
+                        return response
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        'body': body,
+                        'status': response.status_code,
+                        'content_type': response.content_type,
+                        'etag': hashlib.sha1(body).hexdigest(),
+                        'headers': json.dumps([(name, response.headers[name])
+                                               for name in CACHED_HEADERS if name in response.headers]),
+                    }
+                    self.backend.set(key, entry, ttl)
+                else:
+                    self._count('hits')
+                    response = Response(entry['body'], status=entry['status'], content_type=entry['content_type'],
+                                        headers=json.loads(entry['headers']))
+
+                response.set_etag(entry['etag'])
+                # Let browsers keep the body but revalidate it with If-None-Match
+                response.headers['Cache-Control'] = 'no-cache'
+                response.vary.add('Accept')
+                response = response.make_conditional(request)
+                if response.status_code == 304:
+                    self._count('not_modified')
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+def make_cache():
+    if CACHE_BACKEND == 'redis':
+        return ResponseCache(RedisBackend())
+    if CACHE_BACKEND == 'memory':
+        backend = MemoryBackend()
+        return ResponseCache(backend, InvalidationListener(backend) if CACHE_LISTEN else None)
+    raise ValueError(f'Unknown CACHE_BACKEND: {CACHE_BACKEND}')
+
+
+response_cache = make_cache()
+cached = response_cache.cached
+invalidate = response_cache.invalidate
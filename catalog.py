@@ -0,0 +1,300 @@
+"""
+In-memory product catalogue
+
+Keeps every product in the process as a compact __slots__ record, indexed
+by productid, categoryid and supplierid and by name trigrams, so catalogue
+lookups, search and category browsing are answered without a query.
+
+The index is kept current from the product_changed NOTIFY channel
+(migrations/005_product_change_notify.sql): a background thread LISTENs
+with its own connection and re-reads only the products that changed. It
+is loaded on first use, so it lives in whichever process serves the
+requests, and it lags a committed write by the time it takes the
+notification to arrive (a few milliseconds).
+
+Name search follows pg_trgm: a query of three or more characters matches
+names containing it; a shorter one matches names with a word starting
+with it. Matching ignores case.
+"""
+import os
+import re
+import select
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from operator import attrgetter
+
+import psycopg2
+
+from db import DB_CONFIG
+
+CHANGE_CHANNEL = 'product_changed'
+# Changed products re-read one by one up to this many per batch; more reloads the whole table
+CATALOG_RELOAD_BATCH = int(os.environ.get('CATALOG_RELOAD_BATCH', 5000))
+CATALOG_IDLE_CHECK = 15
+LISTEN_RECONNECT_MAX = 30
+
+COLUMNS = ('productid', 'name', 'description', 'price', 'stockquantity', 'expirydate',
+           'reorderlevel', 'categoryid', 'supplierid')
+PRODUCT_QUERY = f"SELECT {', '.join(COLUMNS)} FROM product"
+
+_WORD = re.compile(r'\w+')
+_product_row = attrgetter(*COLUMNS)
+
+
+def normalize(text):
+    """Lower-cased text with runs of whitespace collapsed, as names are indexed."""
+    return ' '.join(text.lower().split())
+
+
+def trigrams(text):
+    """Trigrams of normalized text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def name_grams(key):
+    """
+    Index terms of a normalized name
+
+    Its trigrams, plus each word's first one and two characters padded
+    like pg_trgm ('  a', ' ab') for short queries.
+    """
+    grams = trigrams(key)
+    for word in _WORD.findall(key):
+        grams.add('  ' + word[0])
+        if len(word) > 1:
+            grams.add(' ' + word[:2])
+    return grams
+
+
+class Product:
+    """One catalogue entry; key is the normalized name that search matches against."""
+
+    __slots__ = COLUMNS + ('key',)
+
+    def __init__(self, row):
+        for column, value in zip(COLUMNS, row):
+            setattr(self, column, value)
+        self.key = normalize(self.name or '')
+
+    def row(self):
+        return _product_row(self)
+
+
+def _add_sorted(index, value, productid):
+    insort(index.setdefault(value, []), productid)
+
+
+def _remove_sorted(index, value, productid):
+    ids = index.get(value)
+    if ids is None:
+        return
+    position = bisect_left(ids, productid)
+    if position < len(ids) and ids[position] == productid:
+        del ids[position]
+    if not ids:
+        del index[value]
+
+
+class Catalog:
+    """
+    Product index, its LISTEN loop and queries
+
+    Every id list in the index is kept sorted, so results come out in
+    productid order and a keyset page starts with a binary search.
+    """
+
+    def __init__(self, dsn=None):
+        self.dsn = dsn or DB_CONFIG
+        self._lock = threading.Lock()
+        self._products = {}  # productid -> Product
+        self._ids = []  # every productid, sorted
+        self._by_category = {}  # categoryid -> sorted productids
+        self._by_supplier = {}  # supplierid -> sorted productids
+        self._grams = {}  # name gram -> set of productids
+        self._thread = None
+        self._ready = threading.Event()
+        self.stats = {'notifications': 0, 'refreshed': 0, 'reloads': 0, 'reconnects': 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='catalog', daemon=True)
+                self._thread.start()
+
+    def wait_ready(self, timeout=5):
+        """Start the listener if needed and wait for the first full load."""
+        self.start()
+        return self._ready.wait(timeout)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, products=len(self._products), categories=len(self._by_category),
+                        suppliers=len(self._by_supplier), name_grams=len(self._grams))
+
+    # Index maintenance; called with the lock held
+
+    def _insert(self, product):
+        productid = product.productid
+        self._products[productid] = product
+        insort(self._ids, productid)
+        _add_sorted(self._by_category, product.categoryid, productid)
+        _add_sorted(self._by_supplier, product.supplierid, productid)
+        for gram in name_grams(product.key):
+            self._grams.setdefault(gram, set()).add(productid)
+
+    def _delete(self, productid):
+        product = self._products.pop(productid, None)
+        if product is None:
+            return
+        del self._ids[bisect_left(self._ids, productid)]
+        _remove_sorted(self._by_category, product.categoryid, productid)
+        _remove_sorted(self._by_supplier, product.supplierid, productid)
+        for gram in name_grams(product.key):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(productid)
+                if not ids:
+                    del self._grams[gram]
+
+    def _load(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(PRODUCT_QUERY + ' ORDER BY productid')
+            products = [Product(row) for row in cur.fetchall()]
+        with self._lock:
+            self._products, self._ids = {}, []
+            self._by_category, self._by_supplier, self._grams = {}, {}, {}
+            for product in products:
+                self._insert(product)
+            self.stats['reloads'] += 1
+        self._ready.set()
+
+    def _refresh(self, conn, productids):
+        """Re-read the given products; ids no longer in the table are dropped."""
+        with conn.cursor() as cur:
+            cur.execute(PRODUCT_QUERY + ' WHERE productid = ANY(%s)', (list(productids),))
+            products = [Product(row) for row in cur.fetchall()]
+        with self._lock:
+            for productid in productids:
+                self._delete(productid)
+            for product in products:
+                self._insert(product)
+            self.stats['refreshed'] += len(productids)
+
+    def _apply(self, conn, payloads):
+        productids = set()
+        for payload in payloads:
+            if payload == '*':
+                productids = None
+                break
+            try:
+                productids.add(int(payload))
+            except ValueError:
+                print("❌ Malformed product notification:", payload)
+        with self._lock:
+            self.stats['notifications'] += len(payloads)
+        if productids is None or len(productids) > CATALOG_RELOAD_BATCH:
+            self._load(conn)
+        elif productids:
+            self._refresh(conn, productids)
+
+    def _listen(self):
+        conn = psycopg2.connect(**self.dsn)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN {CHANGE_CHANNEL}')
+            # Load after LISTEN, so no change can fall between the two
+            self._load(conn)
+            while True:
+                if select.select([conn], [], [], CATALOG_IDLE_CHECK) == ([], [], []):
+                    with conn.cursor() as cur:
+                        cur.execute('SELECT 1')
+                    continue
+                conn.poll()
+                # Everything that arrived together is re-read with one query
+                payloads = [notify.payload for notify in conn.notifies]
+                conn.notifies.clear()
+                self._apply(conn, payloads)
+        finally:
+            conn.close()
+
+    def _run(self):
+        delay = 1
+        while True:
+            started = time.monotonic()
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError) as e:
+                print("❌ Catalogue listener error:", e)
+            with self._lock:
+                self.stats['reconnects'] += 1
+            delay = 1 if time.monotonic() - started > LISTEN_RECONNECT_MAX else min(delay * 2, LISTEN_RECONNECT_MAX)
+            time.sleep(delay)
+
+    # Queries
+
+    def get(self, productid):
+        """Row tuple of one product in COLUMNS order, or None."""
+        with self._lock:
+            product = self._products.get(productid)
+            return product.row() if product is not None else None
+
+    def _name_matches(self, query):
+        """Ids that may match a normalized name query; exact for queries under three characters."""
+        if len(query) < 3:
+            return self._grams.get(('  ' if len(query) == 1 else ' ') + query, set())
+        postings = sorted((self._grams.get(gram, set()) for gram in trigrams(query)), key=len)
+        return set.intersection(*postings) if postings else set()
+
+    def search(self, category=None, supplier=None, query=None, in_stock=None, after=None, limit=None):
+        """
+        Products matching every given filter, in productid order
+
+        Args:
+            category (int): categoryid
+            supplier (int): supplierid
+            query (str): Name search, see the module docstring
+            in_stock (bool): True for stockquantity > 0, False for the rest
+            after (int): Only products with a larger productid
+            limit (int): Maximum rows to return
+
+        Returns:
+            list: Row tuples in COLUMNS order
+        """
+        query = normalize(query) if query else None
+        with self._lock:
+            # Scan the smallest index that applies and check the other filters per product
+            candidates = [self._ids]
+            if category is not None:
+                candidates.append(self._by_category.get(category, []))
+            if supplier is not None:
+                candidates.append(self._by_supplier.get(supplier, []))
+            names = None
+            if query:
+                names = self._name_matches(query)
+                candidates.append(names)
+            ids = min(candidates, key=len)
+            if isinstance(ids, set):
+                ids = sorted(ids)
+            start = bisect_right(ids, after) if after is not None else 0
+
+            rows = []
+            for position in range(start, len(ids)):
+                productid = ids[position]
+                product = self._products[productid]
+                if category is not None and product.categoryid != category:
+                    continue
+                if supplier is not None and product.supplierid != supplier:
+                    continue
+                if names is not None and (productid not in names or len(query) >= 3 and query not in product.key):
+                    continue
+                if in_stock is not None and ((product.stockquantity or 0) > 0) != in_stock:
+                    continue
+                rows.append(product.row())
+                if limit is not None and len(rows) == limit:
+                    break
+            return rows
+
+
+catalog = Catalog()
@@ -0,0 +1,324 @@
+"""
+Checkout: an invoice, its lines and the stock they take, in one transaction
+
+A basket is validated in the request thread and handed to a single
+committer thread per process. The committer takes every basket that is
+waiting (up to CHECKOUT_BATCH_MAX) and writes them together: one
+transaction, one round trip per statement for the whole batch and one
+commit, so under load concurrent tills share each WAL flush instead of
+paying for one each. When the tills are idle a batch is a single basket
+and nothing waits.
+
+Inside the transaction every product in the batch is locked with SELECT
+... FOR UPDATE in productid order, and rows that fire rollup triggers are
+inserted in a fixed order, so concurrent batches queue behind each other
+instead of deadlocking; a deadlock PostgreSQL still detects (from the
+rollup rows across workers) is retried. Stock is checked under those
+locks, so a basket is either written in full or rejected without
+touching the database. If a batch fails for another reason, its baskets
+are retried one per transaction so only the faulty one is rejected.
+"""
+import os
+import queue
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db import get_pool
+from forms import CHECKOUT_FIELDS, CHECKOUT_LINE_FIELDS, FieldError, process_fields
+
+# Baskets written per transaction
+CHECKOUT_BATCH_MAX = int(os.environ.get('CHECKOUT_BATCH_MAX', 64))
+# Seconds the committer waits for more baskets once one arrives; 0 takes only those already queued
+CHECKOUT_BATCH_WAIT = float(os.environ.get('CHECKOUT_BATCH_WAIT', 0))
+# Seconds a request waits for its basket to be picked up before giving up
+CHECKOUT_TIMEOUT = float(os.environ.get('CHECKOUT_TIMEOUT', 30))
+CHECKOUT_MAX_LINES = 500
+CHECKOUT_RETRIES = 3
+
+
+class CheckoutError(Exception):
+    """A basket that was not written, with the HTTP status and JSON body to answer with."""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+    def payload(self):
+        return dict(self.details, error=str(self))
+
+
+def parse_basket(data):
+    """
+    Validate a submitted basket
+
+    Args:
+        data (dict): CHECKOUT_FIELDS plus 'items', a list of {productid, quantity}
+
+    Returns:
+        dict: Invoice columns plus 'lines', quantities keyed by productid in productid order
+    """
+    if not isinstance(data, dict):
+        raise CheckoutError('Basket must be a JSON object')
+    try:
+        basket = process_fields(data, CHECKOUT_FIELDS)
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            raise FieldError('items must be a non-empty list')
+        if len(items) > CHECKOUT_MAX_LINES:
+            raise FieldError(f'At most {CHECKOUT_MAX_LINES} items can be checked out at once')
+        lines = {}
+        for item in items:
+            if not isinstance(item, dict):
+                raise FieldError('Each item must be an object')
+            line = process_fields(item, CHECKOUT_LINE_FIELDS)
+            if line['quantity'] < 1:
+                raise FieldError('quantity must be at least 1')
+            # The same product twice is one line
+            lines[line['productid']] = lines.get(line['productid'], 0) + line['quantity']
+    except FieldError as e:
+        raise CheckoutError(str(e))
+    if basket['discountapplied'] < 0 or basket['taxamount'] < 0:
+        raise CheckoutError('discountamount and taxamount cannot be negative')
+    basket['lines'] = dict(sorted(lines.items()))
+    return basket
+
+
+class _Pending:
+    """A basket waiting for the committer, and its outcome."""
+
+    def __init__(self, basket):
+        self.basket = basket
+        self.lock = threading.Lock()
+        self.started = False
+        self.cancelled = False
+        self.done = threading.Event()
+        self.outcome = None
+
+    def finish(self, outcome):
+        self.outcome = outcome
+        self.done.set()
+
+
+class CheckoutQueue:
+    """Group commit of baskets through one committer thread."""
+
+    def __init__(self, batch_max=CHECKOUT_BATCH_MAX, batch_wait=CHECKOUT_BATCH_WAIT):
+        self.batch_max = batch_max
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'baskets': 0, 'rejected': 0, 'batches': 0, 'largest_batch': 0,
+                      'deadlock_retries': 0, 'batch_fallbacks': 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='checkout', daemon=True)
+                self._thread.start()
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, queued=self._queue.qsize())
+
+    def submit(self, basket, timeout=CHECKOUT_TIMEOUT):
+        """
+        Write a parsed basket and wait for the result
+
+        Returns:
+            dict: invoiceid, totalamount and the priced lines
+
+        Raises:
+            CheckoutError: The basket was rejected and nothing was written
+        """
+        self.start()
+        pending = _Pending(basket)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            with pending.lock:
+                if not pending.started:
+                    pending.cancelled = True
+                    raise CheckoutError('Checkout is overloaded, nothing was written; try again', 503)
+            # Already being written: its outcome is being decided, so wait for it
+            pending.done.wait()
+        if isinstance(pending.outcome, CheckoutError):
+            raise pending.outcome
+        return pending.outcome
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_max:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        started = []
+        for pending in batch:
+            with pending.lock:
+                if not pending.cancelled:
+                    pending.started = True
+                    started.append(pending)
+        return started
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                outcomes = self._process([pending.basket for pending in batch])
+            except Exception as e:
+                print("❌ Checkout error:", e)
+                outcomes = [CheckoutError(f'Checkout failed: {e}', 500)] * len(batch)
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+                self.stats['baskets'] += len(batch)
+                self.stats['rejected'] += sum(isinstance(outcome, CheckoutError) for outcome in outcomes)
+            for pending, outcome in zip(batch, outcomes):
+                pending.finish(outcome)
+
+    def _process(self, baskets):
+        pool = get_pool()
+        conn = pool.get()
+        try:
+            try:
+                return self._commit(conn, baskets)
+            except psycopg2.Error as e:
+                if len(baskets) == 1:
+                    return [database_error(e)]
+            # Something in the batch is bad: write each basket on its own
+            with self._lock:
+                self.stats['batch_fallbacks'] += 1
+            outcomes = []
+            for basket in baskets:
+                try:
+                    outcomes.extend(self._commit(conn, [basket]))
+                except psycopg2.Error as e:
+                    outcomes.append(database_error(e))
+            return outcomes
+        finally:
+            pool.put(conn)
+
+    def _commit(self, conn, baskets):
+        """Write baskets in one transaction, retrying deadlocks; returns one outcome per basket."""
+        for attempt in range(CHECKOUT_RETRIES):
+            try:
+                outcomes = write_baskets(conn, baskets)
+                conn.commit()
+                return outcomes
+            except (psycopg2.errors.DeadlockDetected, psycopg2.errors.SerializationFailure):
+                conn.rollback()
+                if attempt == CHECKOUT_RETRIES - 1:
+                    raise
+                with self._lock:
+                    self.stats['deadlock_retries'] += 1
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+
+
+def database_error(e):
+    if isinstance(e, psycopg2.IntegrityError):
+        # A customer or employee that does not exist, usually
+        return CheckoutError(f'Basket rejected: {e.diag.message_primary or e}', 400)
+    print("❌ Checkout database error:", e)
+    return CheckoutError(f'Checkout failed: {e}', 500)
+
+
+def write_baskets(conn, baskets):
+    """
+    Lock, check and write baskets in the connection's open transaction
+
+    Returns:
+        list: Per basket, the written invoice as a dict or a CheckoutError
+    """
+    productids = sorted({productid for basket in baskets for productid in basket['lines']})
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT productid, price, stockquantity FROM product
+            WHERE productid = ANY(%s)
+            ORDER BY productid
+            FOR UPDATE
+        """, (productids,))
+        products = {productid: [price, stock or 0] for productid, price, stock in cur.fetchall()}
+
+        outcomes = []
+        accepted = []
+        for basket in baskets:
+            outcome = price_basket(basket, products)
+            outcomes.append(outcome)
+            if not isinstance(outcome, CheckoutError):
+                for productid, quantity in basket['lines'].items():
+                    products[productid][1] -= quantity
+                accepted.append((basket, outcome))
+        if not accepted:
+            return outcomes
+
+        cur.execute("SELECT nextval(pg_get_serial_sequence('salesinvoice', 'invoiceid')) FROM generate_series(1, %s)",
+                    (len(accepted),))
+        for (basket, invoice), (invoiceid,) in zip(accepted, cur.fetchall()):
+            invoice['invoiceid'] = invoiceid
+
+        # Fixed insert order for the rows whose triggers update the daily rollups
+        invoices = sorted(accepted, key=lambda item: (item[0]['employeeid'], item[0]['customerid'],
+                                                      item[1]['invoiceid']))
+        execute_values(cur, """
+            INSERT INTO salesinvoice
+                (invoiceid, customerid, employeeid, invoicedate, totalamount, discountapplied, taxamount, paymentmode)
+            VALUES %s
+        """, [(invoice['invoiceid'], basket['customerid'], basket['employeeid'], invoice['invoicedate'],
+               invoice['totalamount'], basket['discountapplied'], basket['taxamount'], basket['paymentmode'])
+              for basket, invoice in invoices], template='(%s, %s, %s, %s, %s, %s, %s, %s)')
+        details = sorted((line['productid'], invoice['invoiceid'], line['quantity'], line['unitprice'],
+                          line['linetotal']) for _, invoice in accepted for line in invoice['lines'])
+        execute_values(cur, """
+            INSERT INTO salesdetail (productid, invoiceid, quantity, unitprice, linetotal) VALUES %s
+        """, details)
+        taken = {}
+        for basket, _ in accepted:
+            for productid, quantity in basket['lines'].items():
+                taken[productid] = taken.get(productid, 0) + quantity
+        execute_values(cur, """
+            UPDATE product SET stockquantity = stockquantity - taken.quantity
+            FROM (VALUES %s) AS taken (productid, quantity)
+            WHERE product.productid = taken.productid
+        """, sorted(taken.items()), template='(%s::integer, %s::integer)')
+    return outcomes
+
+
+def price_basket(basket, products):
+    """Invoice for a basket at the locked prices, or a CheckoutError if it cannot be filled."""
+    lines = []
+    subtotal = Decimal(0)
+    for productid, quantity in basket['lines'].items():
+        if productid not in products:
+            return CheckoutError(f'Product {productid} does not exist', 400, productid=productid)
+        price, stock = products[productid]
+        if price is None:
+            return CheckoutError(f'Product {productid} has no price', 409, productid=productid)
+        if stock < quantity:
+            return CheckoutError(f'Not enough stock of product {productid}', 409,
+                                 productid=productid, requested=quantity, available=max(stock, 0))
+        linetotal = price * quantity
+        subtotal += linetotal
+        lines.append({'productid': productid, 'quantity': quantity, 'unitprice': price, 'linetotal': linetotal})
+    if basket['discountapplied'] > subtotal:
+        return CheckoutError('discountamount is larger than the basket total', 400)
+    return {
+        'invoiceid': None,
+        'invoicedate': date.today(),
+        'totalamount': subtotal - basket['discountapplied'] + basket['taxamount'],
+        'lines': lines,
+    }
+
+
+checkout_queue = CheckoutQueue()
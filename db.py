@@ -0,0 +1,421 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from flask import g
+
+# PostgreSQL connection settings, overridable from the environment
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'store_inventory'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'ghost2020'),
+}
+
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN', 1))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX', 10))
+# Seconds a request waits for a free connection before giving up
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+# Idle connections older than this (seconds) are pinged before being handed out
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 30))
+
+# Streaming replicas for report queries: comma separated host or host:port,
+# same database and credentials as the primary. Empty sends everything to DB_HOST.
+REPLICA_HOSTS = [host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+# Replicas further behind than this many seconds are skipped, and reads stay
+# on the primary for this long after a write from this process
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+# Seconds a replica's lag measurement is reused before it is taken again
+REPLICA_LAG_CHECK = float(os.environ.get('DB_REPLICA_LAG_CHECK', 1))
+# Seconds an unreachable replica is left out of the rotation
+REPLICA_RETRY_AFTER = float(os.environ.get('DB_REPLICA_RETRY_AFTER', 10))
+
+# Seconds a replica is behind; 0 when it has replayed everything it received
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection that remembers its pool and which statements it has PREPAREd."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.prepared = set()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections
+
+    Connections are checked out with get() and handed back with put().
+    Broken connections are dropped and replaced on the next checkout, so a
+    database restart only costs the requests that were in flight.
+
+    Args:
+        minconn (int): Connections opened up front and kept idle
+        maxconn (int): Upper bound on open connections
+        timeout (float): Seconds get() blocks when the pool is exhausted
+        ping_after (float): Idle seconds after which a connection is health checked
+        **dsn: Keyword arguments passed to psycopg2.connect
+    """
+
+    def __init__(self, minconn, maxconn, timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER, **dsn):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError('Pool size must satisfy 0 <= minconn <= maxconn and maxconn >= 1')
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.dsn = dsn
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (connection, time it was returned)
+        self._opened = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'returns': 0,
+            'connects': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'wait_seconds_total': 0.0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._opened += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.dsn)
+        conn.pool = self
+        with self._lock:
+            self._stats['connects'] += 1
+        return conn
+
+    def _discard(self, conn):
+        # Caller holds the lock
+        self._opened -= 1
+        self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def get(self, timeout=None):
+        """Check out a healthy connection, opening or waiting up to timeout (default the pool's) for one."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            conn = None
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise psycopg2.InterfaceError('connection pool is closed')
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._opened < self.maxconn:
+                        # Reserve the slot now, connect outside the lock
+                        self._opened += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f'No database connection free after {timeout}s')
+                    self._lock.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_since):
+                # Broken connection (e.g. database restarted): drop it and retry
+                with self._lock:
+                    self._discard(conn)
+                    self._lock.notify()
+                continue
+
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._stats['wait_seconds_total'] += time.monotonic() - started
+            return conn
+
+    def put(self, conn):
+        """Return a connection, dropping it if it is broken or the pool is full."""
+        try:
+            if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                # Never hand the next request someone else's open transaction
+                conn.rollback()
+        except psycopg2.Error:
+            pass
+
+        with self._lock:
+            self._stats['returns'] += 1
+            if self._closed or conn.closed or len(self._idle) >= self.maxconn:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def close(self):
+        """Close every idle connection; checked-out ones are closed as they come back."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._lock.notify_all()
+
+    def metrics(self):
+        """Snapshot of pool size and usage counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'open': self._opened,
+                'idle': len(self._idle),
+                'in_use': self._opened - len(self._idle),
+            })
+            return stats
+
+
+def replica_dsn(host):
+    """DB_CONFIG pointed at a DB_REPLICA_HOSTS entry (host or host:port)."""
+    dsn = dict(DB_CONFIG, host=host)
+    if ':' in host:
+        dsn['host'], dsn['port'] = host.rsplit(':', 1)
+    return dsn
+
+
+class Replica:
+    """A read replica's pool and its last measured replication lag."""
+
+    def __init__(self, host):
+        self.name = host
+        # minconn 0: an unreachable replica must not stop the app from starting
+        self.pool = ConnectionPool(0, POOL_MAX_SIZE, **replica_dsn(host))
+        self.lag = None
+        self.checked_at = float('-inf')
+        self.down_until = 0.0
+        self.reads = 0
+
+
+class ReadRouter:
+    """
+    Picks the connection a read-only query runs on
+
+    Replicas are tried round-robin. A replica is skipped while it is
+    unreachable (for REPLICA_RETRY_AFTER seconds) or more than
+    REPLICA_MAX_LAG seconds behind, and reads fall back to the primary when
+    no replica qualifies or a write was made from this process within the
+    last REPLICA_MAX_LAG seconds.
+    """
+
+    def __init__(self, hosts, max_lag=REPLICA_MAX_LAG, lag_check=REPLICA_LAG_CHECK,
+                 retry_after=REPLICA_RETRY_AFTER):
+        self.replicas = [Replica(host) for host in hosts]
+        self.max_lag = max_lag
+        self.lag_check = lag_check
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._next = 0
+        self._primary_until = 0.0
+        self.stats = {'primary_reads': 0, 'lag_fallbacks': 0, 'down_fallbacks': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def mark_write(self):
+        """Keep reads on the primary until replicas have had time to catch up."""
+        with self._lock:
+            self._primary_until = time.monotonic() + self.max_lag
+
+    def _lag(self, replica, conn):
+        now = time.monotonic()
+        if now - replica.checked_at >= self.lag_check:
+            with conn.cursor() as cur:
+                cur.execute(REPLICA_LAG_QUERY)
+                lag = cur.fetchone()[0]
+            conn.rollback()
+            replica.lag = float(lag) if lag is not None else None
+            replica.checked_at = now
+        return replica.lag
+
+    def get(self):
+        """A checked-out replica connection, or None to use the primary."""
+        with self._lock:
+            if time.monotonic() < self._primary_until or not self.replicas:
+                self.stats['primary_reads'] += 1
+                return None
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if time.monotonic() < replica.down_until:
+                continue
+            conn = None
+            try:
+                conn = replica.pool.get()
+                lag = self._lag(replica, conn)
+            except (psycopg2.Error, PoolTimeout) as e:
+                print(f"❌ Replica {replica.name} unavailable:", e)
+                if conn is not None:
+                    replica.pool.put(conn)
+                replica.down_until = time.monotonic() + self.retry_after
+                self._count('down_fallbacks')
+                continue
+            if lag is None or lag > self.max_lag:
+                replica.pool.put(conn)
+                self._count('lag_fallbacks')
+                continue
+            with self._lock:
+                replica.reads += 1
+            return conn
+
+        self._count('primary_reads')
+        return None
+
+    def metrics(self):
+        """Counters plus per-replica lag and reads, keyed by replica host."""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['replicas'] = {
+            replica.name: {
+                'lag_seconds': replica.lag,
+                'reads': replica.reads,
+                'up': time.monotonic() >= replica.down_until,
+                'pool': replica.pool.metrics(),
+            }
+            for replica in self.replicas
+        }
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_router = None
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(POOL_MIN_SIZE, POOL_MAX_SIZE, **DB_CONFIG)
+    return _pool
+
+
+def get_router():
+    """Return the process-wide read router, creating it on first use."""
+    global _router
+    if _router is None:
+        with _pool_lock:
+            if _router is None:
+                _router = ReadRouter(REPLICA_HOSTS)
+    return _router
+
+
+def close_pool():
+    """Close the process-wide pools, if they were created."""
+    global _pool, _router
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _router is not None:
+            for replica in _router.replicas:
+                replica.pool.close()
+            _router = None
+
+
+def get_db():
+    """
+    Connection for the current request
+
+    The first call in a request checks a connection out of the pool; later
+    calls in the same request reuse it. It goes back to the pool when the
+    app context is torn down.
+    """
+    if 'db_conn' not in g:
+        g.db_conn = get_pool().get()
+    return g.db_conn
+
+
+def get_read_db():
+    """
+    Connection for the current request's read-only report queries
+
+    A replica chosen by the read router when DB_REPLICA_HOSTS is set and
+    one is fresh enough, otherwise the request's primary connection.
+    """
+    if 'db_read_conn' not in g:
+        conn = get_router().get() if REPLICA_HOSTS else None
+        g.db_read_conn = conn if conn is not None else get_db()
+    return g.db_read_conn
+
+
+def mark_write():
+    """Record that this process just wrote, so its next reads see the write."""
+    if REPLICA_HOSTS:
+        get_router().mark_write()
+
+
+def detach_db(read=False):
+    """
+    Take the request's connection away from the request teardown
+
+    For responses that keep using the connection after the view returns,
+    such as streams. The caller must hand it back with conn.pool.put(conn).
+    """
+    conn = get_read_db() if read else get_db()
+    for key in ('db_read_conn', 'db_conn'):
+        if g.get(key) is conn:
+            g.pop(key)
+    return conn
+
+
+def release_db(exception=None):
+    read_conn = g.pop('db_read_conn', None)
+    conn = g.pop('db_conn', None)
+    if read_conn is not None and read_conn is not conn:
+        read_conn.pool.put(read_conn)
+    if conn is not None:
+        get_pool().put(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db)
@@ -0,0 +1,278 @@
+"""
+Incremental Parquet/Arrow export of the sales tables for offline analytics
+
+Each table is read with COPY ... TO STDOUT, parsed by pyarrow as it
+arrives and written as compressed Parquet (or Arrow IPC) files partitioned
+by month of its date column:
+
+    exports/salesinvoice/month=2024-05/part-000000120001-0.parquet
+
+Only rows with an id above the last one exported are read. Every table
+is read in one REPEATABLE READ transaction, so a run sees a single
+snapshot and salesdetail lines match the invoices exported with them.
+The high-water marks are kept in exports/_state.json and advance only
+once every table's files are completely written, so an interrupted run
+is simply repeated. Rows are keyed by their serial id, so rows inserted with an
+older id after an export has passed it are not picked up; run with --full
+to rebuild a table from scratch.
+
+Usage:
+    python export.py                              export new rows of every table
+    python export.py --tables salesinvoice transactionlog --format arrow
+    python export.py --full --output /srv/exports
+    python export.py --replica                    read from the first DB_REPLICA_HOSTS entry
+
+pyarrow is required for this module only.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+
+from db import DB_CONFIG, REPLICA_HOSTS, replica_dsn
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports'))
+EXPORT_COMPRESSION = os.environ.get('EXPORT_COMPRESSION', 'zstd')
+# Bytes of CSV pyarrow parses per record batch
+EXPORT_BLOCK_SIZE = int(os.environ.get('EXPORT_BLOCK_SIZE', 16 * 2 ** 20))
+STATE_FILE = '_state.json'
+PARTITION_COLUMN = 'month'
+
+# Table -> id column the export is incremental on, and the query whose date column partitions it
+EXPORTS = {
+    'salesinvoice': {
+        'id': 'invoiceid',
+        'date': 'invoicedate',
+        'query': 'SELECT * FROM salesinvoice',
+    },
+    'salesdetail': {
+        'id': 'salesdetailid',
+        'date': 'invoicedate',
+        # Lines carry their invoice date so they can be partitioned like the invoices
+        'query': 'SELECT sd.*, si.invoicedate FROM salesdetail sd JOIN salesinvoice si ON si.invoiceid = sd.invoiceid',
+    },
+    'purchaseorder': {
+        'id': 'orderid',
+        'date': 'orderdate',
+        'query': 'SELECT * FROM purchaseorder',
+    },
+    'transactionlog': {
+        'id': 'logid',
+        'date': 'timestamp',
+        'query': 'SELECT * FROM transactionlog',
+    },
+}
+
+
+def arrow_type(column):
+    """Arrow type for a psycopg2 cursor.description column."""
+    import pyarrow as pa
+
+    types = {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1082: pa.date32(),
+        1114: pa.timestamp('us'),
+        1184: pa.timestamp('us', tz='UTC'),
+    }
+    if column.type_code == 1700:
+        # numeric(p, s) maps to an exact decimal; unconstrained numeric stays text
+        if column.precision and 0 < column.precision <= 38:
+            return pa.decimal128(column.precision, column.scale or 0)
+        return pa.string()
+    return types.get(column.type_code, pa.string())
+
+
+# Date and timestamp type OIDs; PostgreSQL allows 'infinity' and '-infinity' in them, Arrow does not
+DATE_TYPES = {1082, 1114, 1184}
+
+
+def copy_select_list(description):
+    """
+    Columns for the COPY of a query, with infinite dates exported as NULL
+
+    Arrow cannot parse '-infinity', which transactionlog timestamps that were
+    NULL hold since migration 008, nor any other infinite date or timestamp.
+    """
+    columns = []
+    for column in description:
+        name = '"' + column.name.replace('"', '""') + '"'
+        if column.type_code in DATE_TYPES:
+            columns.append(f'CASE WHEN isfinite({name}) THEN {name} END AS {name}')
+        else:
+            columns.append(name)
+    return ', '.join(columns)
+
+
+def load_state(output):
+    try:
+        with open(os.path.join(output, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(output, state):
+    path = os.path.join(output, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def export_table(conn, table, output, after_id=0, file_format='parquet'):
+    """
+    Write rows of one table with an id above after_id
+
+    Args:
+        conn: psycopg2 connection
+        table (str): Key of EXPORTS
+        output (str): Export root directory
+        after_id (int): Last id already exported
+        file_format (str): 'parquet' or 'arrow'
+
+    Returns:
+        tuple: (rows written, highest id written or None)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+
+    spec = EXPORTS[table]
+    query = f"SELECT * FROM ({spec['query']}) export WHERE {spec['id']} > %s"
+    with conn.cursor() as cur:
+        cur.execute(f'{query} LIMIT 1', (after_id,))
+        if cur.rowcount == 0:
+            return 0, None
+        schema = pa.schema([(column.name, arrow_type(column)) for column in cur.description])
+        select_list = copy_select_list(cur.description)
+        copy = cur.mogrify(f"COPY (SELECT {select_list} FROM ({query}) export_rows ORDER BY {spec['id']}) "
+                           f"TO STDOUT WITH (FORMAT csv)", (after_id,)).decode()
+
+    # COPY writes into a pipe on a helper thread while pyarrow parses the other end
+    read_fd, write_fd = os.pipe()
+    copy_error = []
+
+    def run_copy():
+        try:
+            with os.fdopen(write_fd, 'wb') as sink, conn.cursor() as cur:
+                cur.copy_expert(copy, sink)
+        except (psycopg2.Error, OSError) as e:
+            copy_error.append(e)
+
+    copier = threading.Thread(target=run_copy, daemon=True)
+    copier.start()
+
+    stats = {'rows': 0, 'max_id': None}
+
+    def batches(reader):
+        for batch in reader:
+            if batch.num_rows == 0:
+                continue
+            stats['rows'] += batch.num_rows
+            stats['max_id'] = pc.max(batch.column(spec['id'])).as_py()
+            month = pc.strftime(batch.column(spec['date']), format='%Y-%m')
+            yield pa.RecordBatch.from_arrays(batch.columns + [month], names=batch.schema.names + [PARTITION_COLUMN])
+
+    source = os.fdopen(read_fd, 'rb')
+    try:
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(column_names=schema.names, block_size=EXPORT_BLOCK_SIZE),
+            # COPY writes NULL as an empty unquoted field and '' as a quoted one
+            convert_options=pa_csv.ConvertOptions(column_types=schema, strings_can_be_null=True,
+                                                  quoted_strings_can_be_null=False),
+        )
+        out_schema = schema.append(pa.field(PARTITION_COLUMN, pa.string()))
+        if file_format == 'parquet':
+            file_options = ds.ParquetFileFormat().make_write_options(compression=EXPORT_COMPRESSION)
+        else:
+            file_options = ds.IpcFileFormat().make_write_options(compression=EXPORT_COMPRESSION)
+        ds.write_dataset(
+            pa.RecordBatchReader.from_batches(out_schema, batches(reader)),
+            os.path.join(output, table),
+            format='parquet' if file_format == 'parquet' else 'ipc',
+            partitioning=ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor='hive'),
+            # Named after the first id, so re-running an interrupted export overwrites its own files
+            basename_template=f'part-{after_id + 1:012d}-{{i}}.{"parquet" if file_format == "parquet" else "arrow"}',
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=file_options,
+        )
+    finally:
+        source.close()
+        copier.join()
+    if copy_error:
+        raise copy_error[0]
+    return stats['rows'], stats['max_id']
+
+
+def export(conn, tables, output=EXPORT_DIR, file_format='parquet', full=False):
+    """
+    Export new rows of each table and advance their high-water marks
+
+    All tables are read in the connection's current transaction, which is
+    committed once the last one is written; only then are the marks saved.
+
+    Returns:
+        dict: Rows written per table
+    """
+    os.makedirs(output, exist_ok=True)
+    state = load_state(output)
+    if full:
+        for table in tables:
+            shutil.rmtree(os.path.join(output, table), ignore_errors=True)
+            state.pop(table, None)
+        # The files are gone, so the old marks must not outlive an interrupted run
+        save_state(output, state)
+
+    written = {}
+    marks = {}
+    for table in tables:
+        after_id = state.get(table, {}).get('last_id', 0)
+        started = time.perf_counter()
+        rows, max_id = export_table(conn, table, output, after_id, file_format)
+        if max_id is not None:
+            marks[table] = {'last_id': max_id, 'exported_at': datetime.now().isoformat(timespec='seconds')}
+        written[table] = rows
+        print(f"{table}: {rows} rows after id {after_id} in {time.perf_counter() - started:.1f}s")
+    conn.commit()
+
+    if marks:
+        state.update(marks)
+        save_state(output, state)
+    return written
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', nargs='+', choices=list(EXPORTS), default=list(EXPORTS))
+    parser.add_argument('--output', default=EXPORT_DIR)
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--full', action='store_true', help='Discard earlier exports of these tables and start over')
+    parser.add_argument('--replica', action='store_true', help='Read from the first DB_REPLICA_HOSTS entry')
+    args = parser.parse_args(argv)
+
+    if args.replica and not REPLICA_HOSTS:
+        parser.error('--replica needs DB_REPLICA_HOSTS')
+    conn = psycopg2.connect(**(replica_dsn(REPLICA_HOSTS[0]) if args.replica else DB_CONFIG))
+    try:
+        # One snapshot for every table, without blocking writers
+        conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        export(conn, args.tables, args.output, args.format, args.full)
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
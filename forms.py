@@ -0,0 +1,95 @@
+"""Form field mappings and validation shared by the Flask and ASGI apps."""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+
+# Error returned by both apps for a body that is not JSON
+INVALID_JSON_ERROR = 'Request body must be valid JSON'
+
+
+class FieldError(ValueError):
+    """Raised when submitted data does not satisfy its field mappings."""
+
+
+def process_fields(data, field_mappings):
+    """
+    Validate and convert submitted data according to its field mappings
+
+    Args:
+        data (dict): The data received from the request
+        field_mappings (dict): A dictionary mapping form fields to database fields with their types
+
+    Returns:
+        dict: Converted values keyed by database field
+    """
+    processed_data = {}
+
+    for form_field, db_info in field_mappings.items():
+        db_field = db_info.get('db_field', form_field)  # Use form field name as DB field if not specified
+
+        # Check if it's a required field; null counts as missing, like a short CSV row's cells
+        if db_info.get('required', False) and data.get(form_field) in (None, ''):
+            raise FieldError(f'{form_field} is required')
+
+        # Get the value, use default if not present
+        value = data.get(form_field, db_info.get('default'))
+
+        # Convert the value based on its type
+        if value is not None:
+            try:
+                if db_info['type'] == 'int':
+                    value = int(value)
+                elif db_info['type'] == 'float':
+                    value = float(value)
+                elif db_info['type'] == 'date' and not isinstance(value, date):
+                    value = date.fromisoformat(value)
+                elif db_info['type'] == 'decimal':
+                    value = Decimal(str(value))
+                    if not value.is_finite():
+                        raise ValueError(value)
+                # Add more type conversions as needed
+            except (ValueError, TypeError, InvalidOperation):
+                raise FieldError(f'Invalid value for {form_field}')
+
+        processed_data[db_field] = value
+
+    return processed_data
+
+
+# Define how form fields map to database fields with their types
+PRODUCT_FIELDS = {
+    'productName': {'db_field': 'Name', 'type': 'str', 'required': True},
+    'description': {'db_field': 'Description', 'type': 'str', 'default': ''},
+    'price': {'db_field': 'Price', 'type': 'float', 'required': True},
+    'quantity': {'db_field': 'StockQuantity', 'type': 'int', 'required': True},
+    'expiryDate': {'db_field': 'ExpiryDate', 'type': 'date', 'default': None},
+    'reorder': {'db_field': 'ReOrderLevel', 'type': 'int', 'default': 0},
+    'CategoryID': {'db_field': 'CategoryID', 'type': 'int', 'default': None},
+    'SupplierID': {'db_field': 'SupplierID', 'type': 'int', 'default': None}
+}
+
+VENDOR_FIELDS = {
+    'vendorName': {'db_field': 'Name', 'type': 'str', 'required': True},
+    'vendorEmail': {'db_field': 'Email', 'type': 'str', 'default': ''},
+    'vendorNumber': {'db_field': 'contactnumber', 'type': 'int', 'default': ''},
+    'vendorAddress': {'db_field': 'Address', 'type': 'str', 'default': ''}
+}
+
+CATEGORY_FIELDS = {
+    'categoryName': {'db_field': 'Name', 'type': 'str', 'required': True},
+    'description': {'db_field': 'Description', 'type': 'str', 'default': ''}
+}
+
+# A basket submitted to /checkout, and each of its 'items'
+CHECKOUT_FIELDS = {
+    'customerID': {'db_field': 'customerid', 'type': 'int', 'required': True},
+    'employeeid': {'db_field': 'employeeid', 'type': 'int', 'required': True},
+    'paymentMode': {'db_field': 'paymentmode', 'type': 'str', 'required': True},
+    'discountamount': {'db_field': 'discountapplied', 'type': 'decimal', 'default': 0},
+    'taxamount': {'db_field': 'taxamount', 'type': 'decimal', 'default': 0}
+}
+
+CHECKOUT_LINE_FIELDS = {
+    'productid': {'db_field': 'productid', 'type': 'int', 'required': True},
+    'quantity': {'db_field': 'quantity', 'type': 'int', 'required': True}
+}
@@ -0,0 +1,81 @@
+"""
+Production server settings for gunicorn
+
+Runs app2.py on a preforking pool of worker processes, each serving
+requests from several threads:
+
+    gunicorn -c gunicorn.conf.py
+
+Every worker imports the app after it is forked, so it builds its own
+connection pool and listeners and nothing opened by the master is shared
+across processes. Signals to the master:
+
+    HUP    graceful reload: new workers load the current code and config,
+           old ones finish their in-flight requests first
+    TERM   graceful shutdown, waiting up to WEB_GRACEFUL_TIMEOUT
+    TTIN / TTOU   add / remove one worker
+
+Load balancers should poll /healthz (process is up) and /readyz (database
+reachable). Settings come from the environment:
+
+    WEB_BIND              address to listen on (default 0.0.0.0:5000)
+    WEB_WORKERS           worker processes (default one per CPU core)
+    WEB_THREADS           threads per worker (default 4)
+    SSE_MAX_SUBSCRIBERS   /stock/events streams per worker; each holds a thread for
+                          as long as it is open, further ones get a 503
+                          (default half of WEB_THREADS, at least 1)
+    WEB_TIMEOUT           seconds before a stuck worker is restarted (default 60)
+    WEB_GRACEFUL_TIMEOUT  seconds workers get to finish on reload/shutdown (default 30)
+    WEB_MAX_REQUESTS      recycle a worker after this many requests, 0 = never (default 0)
+    WEB_APP               WSGI app to serve (default app2:app)
+
+With CACHE_BACKEND=memory each worker caches responses on its own and
+learns about writes made by the others from the cache_invalidate channel
+(migrations/011_cache_invalidate_notify.sql). Setting CACHE_LISTEN=0 with
+more than one worker lets workers serve stale responses; use
+CACHE_BACKEND=redis instead.
+"""
+import multiprocessing
+import os
+
+wsgi_app = os.environ.get('WEB_APP', 'app2:app')
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# The app is imported in each worker after fork, never in the master; this
+# is also what lets HUP pick up new code.
+preload_app = False
+
+# Every thread of a worker can hold a connection at once
+os.environ.setdefault('DB_POOL_MAX', str(threads))
+# Open event streams never leave fewer than half the threads for other requests
+os.environ.setdefault('SSE_MAX_SUBSCRIBERS', str(max(threads // 2, 1)))
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    if (workers > 1 and os.environ.get('CACHE_BACKEND', 'memory') == 'memory'
+            and os.environ.get('CACHE_LISTEN', '1') != '1'):
+        server.log.warning(
+            "⚠️ %d workers share CACHE_BACKEND=memory with CACHE_LISTEN=0: a write only "
+            "invalidates the cache of the worker that made it, others serve stale "
+            "responses. Use CACHE_BACKEND=redis or CACHE_LISTEN=1.", workers)
+
+
+def worker_exit(server, worker):
+    # Close pooled connections so PostgreSQL does not wait for them to time out
+    from db import close_pool
+    close_pool()
+    # Jobs this worker had not started stay queued and are run again when resubmitted
+    from jobs import job_queue
+    job_queue.shutdown()
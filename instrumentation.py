@@ -0,0 +1,147 @@
+"""
+Per-route timing and slow-query capture
+
+Every request records its total latency; the report code adds the time
+spent executing SQL, fetching rows and serializing JSON, plus the row
+count. Totals are rendered in Prometheus text format by /metrics.
+
+Queries slower than SLOW_QUERY_MS are logged to the 'slow_query' logger
+together with their EXPLAIN (ANALYZE, BUFFERS) plan and kept in memory for
+/slow_queries.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 500))
+# EXPLAIN ANALYZE runs the query a second time, so it can be switched off
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', '1') == '1'
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+SLOW_QUERY_KEEP = int(os.environ.get('SLOW_QUERY_KEEP', 50))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('db_execute', 'db_fetch', 'serialize')
+
+slow_query_logger = logging.getLogger('slow_query')
+if SLOW_QUERY_LOG:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG)
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_query_logger.addHandler(_handler)
+    slow_query_logger.setLevel(logging.WARNING)
+
+
+class RouteStats:
+    """Cumulative counters for one route."""
+
+    __slots__ = ('requests', 'errors', 'rows', 'phase_seconds', 'duration_sum', 'buckets')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.duration_sum = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+
+class Instrumentation:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.instrument_started = time.perf_counter()
+        g.instrument_phases = dict.fromkeys(PHASES, 0.0)
+        g.instrument_rows = 0
+
+    def _finish(self, response):
+        started = g.get('instrument_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats()
+            stats.requests += 1
+            if response.status_code >= 500:
+                stats.errors += 1
+            stats.rows += g.instrument_rows
+            for phase, seconds in g.instrument_phases.items():
+                stats.phase_seconds[phase] += seconds
+            stats.duration_sum += elapsed
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    stats.buckets[index] += 1
+
+        response.headers['Server-Timing'] = ', '.join(
+            [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in g.instrument_phases.items()]
+            + [f'total;dur={elapsed * 1000:.2f}']
+        )
+        return response
+
+    def add(self, phase, seconds, rows=0):
+        """Charge time (and rows) to the current request, if there is one."""
+        if has_request_context() and 'instrument_phases' in g:
+            g.instrument_phases[phase] += seconds
+            g.instrument_rows += rows
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def record_slow_query(self, query, params, elapsed, plan=None):
+        entry = {
+            'route': request.path if has_request_context() else None,
+            'duration_ms': round(elapsed * 1000, 2),
+            'query': ' '.join(query.split()),
+            'params': [str(param) for param in params],
+            'plan': plan,
+        }
+        self.slow_queries.append(entry)
+        slow_query_logger.warning('slow query %.1f ms on %s: %s params=%s\n%s', entry['duration_ms'],
+                                  entry['route'], entry['query'], entry['params'], plan or '')
+
+    def render_prometheus(self):
+        """Route metrics in Prometheus text exposition format."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                '# TYPE app_route_requests_total counter',
+                *(f'app_route_requests_total{{route="{route}"}} {s.requests}' for route, s in routes),
+                '# TYPE app_route_errors_total counter',
+                *(f'app_route_errors_total{{route="{route}"}} {s.errors}' for route, s in routes),
+                '# TYPE app_route_rows_total counter',
+                *(f'app_route_rows_total{{route="{route}"}} {s.rows}' for route, s in routes),
+            ]
+            for phase in PHASES:
+                lines.append(f'# TYPE app_route_{phase}_seconds_total counter')
+                lines.extend(f'app_route_{phase}_seconds_total{{route="{route}"}} {s.phase_seconds[phase]:.6f}'
+                             for route, s in routes)
+            lines.append('# TYPE app_route_duration_seconds histogram')
+            for route, s in routes:
+                for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                    lines.append(f'app_route_duration_seconds_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'app_route_duration_seconds_bucket{{route="{route}",le="+Inf"}} {s.requests}')
+                lines.append(f'app_route_duration_seconds_sum{{route="{route}"}} {s.duration_sum:.6f}')
+                lines.append(f'app_route_duration_seconds_count{{route="{route}"}} {s.requests}')
+        return lines
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,440 @@
+"""
+Background jobs for long-running reports
+
+A report submitted as a job runs in a pool of worker processes instead of
+the request thread, and its result is written to JOB_DIR where any web
+worker can serve it:
+
+    POST /jobs {"report": "transactionlog", "params": {...}}   -> 202 {"id": ..., "status": "queued"}
+    GET  /jobs/<id>                                            -> status, row count, timings
+    GET  /jobs/<id>/result?format=records|rows|columns|ndjson  -> the rows
+
+Jobs are keyed by report and parameters. Submitting a report that is
+already queued or running, from this or any other web worker, returns the
+existing job instead of starting another, and a result finished less than
+JOB_RESULT_TTL seconds ago is reused as is. Submissions take an flock on
+JOB_DIR/.lock, so the check and the new job are atomic across processes.
+
+Each job is two files: <id>.json holds its state and <id>.ndjson.gz its
+result, one JSON array per row after a first line of column names,
+gzip-compressed as it is read from a server-side cursor. The state file
+records the pid of the process responsible for the job, so a job whose
+web worker or pool process died is seen as lost and is run again on the
+next submission. Jobs are deleted JOB_RETENTION seconds after they finish.
+
+Pool processes are started with spawn, so they inherit no sockets,
+threads or pooled connections from the web worker; each keeps one
+read-only connection of its own across jobs. Only one host's web workers
+may share a JOB_DIR.
+"""
+import fcntl
+import glob
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import psycopg2
+
+from db import DB_CONFIG
+from registry import REPORTS_BY_NAME
+from reports import ReportArgsError
+from serialization import dumps, rows_payload
+
+JOB_DIR = os.environ.get('JOB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_results'))
+# Worker processes per web worker
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Seconds a finished result is handed to identical submissions instead of running them again
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 300))
+# Seconds finished jobs and their results are kept
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 3600))
+# Seconds a job's query may run before PostgreSQL cancels it
+JOB_STATEMENT_TIMEOUT = int(os.environ.get('JOB_STATEMENT_TIMEOUT', 900))
+JOB_FETCH_SIZE = 5000
+JOB_COMPRESSION = 6
+
+PENDING = ('queued', 'running')
+
+
+class JobError(Exception):
+    """A job request that cannot be answered, with its HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_job(data):
+    """
+    Validate a job submission
+
+    Args:
+        data (dict): {'report': report name, 'params': query string parameters}
+
+    Returns:
+        tuple: (report name, params as strings, query, query parameters)
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('report'), str):
+        raise JobError('Body must be a JSON object with a report name')
+    report = REPORTS_BY_NAME.get(data['report'])
+    if report is None:
+        raise JobError(f"Unknown report: {data['report']}", 404)
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        raise JobError('params must be an object')
+    # As they would arrive in a query string, so 30 and "30" are the same job
+    params = {str(name): str(value) for name, value in params.items()}
+    try:
+        # The whole result, without the route's pagination
+        query, query_params = report.base_query(params)
+    except ReportArgsError as e:
+        raise JobError(str(e))
+    return report.name, params, query, tuple(query_params)
+
+
+def job_key(report, params):
+    """Identity of a report run: the report name and its parameters, order-insensitive."""
+    raw = json.dumps([report, sorted(params.items())], separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+
+def _state_path(job_id, job_dir=JOB_DIR):
+    return os.path.join(job_dir, f'{job_id}.json')
+
+
+def result_path(job_id, job_dir=JOB_DIR):
+    return os.path.join(job_dir, f'{job_id}.ndjson.gz')
+
+
+def _valid_id(job_id):
+    # <key>-<random>, both hex; anything else would be a path outside JOB_DIR
+    key, _, suffix = job_id.partition('-')
+    return len(key) == 24 and len(suffix) == 8 and all(c in '0123456789abcdef' for c in key + suffix)
+
+
+def read_state(job_id, job_dir=JOB_DIR):
+    """State of a job, or None if it does not exist or has expired."""
+    if not _valid_id(job_id):
+        return None
+    try:
+        with open(_state_path(job_id, job_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_state(state, job_dir=JOB_DIR):
+    path = _state_path(state['id'], job_dir)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_lost(state):
+    """True for a queued or running job whose responsible process is gone."""
+    return state['status'] in PENDING and not _alive(state['pid'])
+
+
+# Runs in the pool processes
+
+_job_conn = None
+
+
+def _connection():
+    global _job_conn
+    if _job_conn is None or _job_conn.closed:
+        _job_conn = psycopg2.connect(**DB_CONFIG)
+        _job_conn.set_session(readonly=True)
+        with _job_conn.cursor() as cur:
+            cur.execute('SET statement_timeout = %s', (JOB_STATEMENT_TIMEOUT * 1000,))
+        _job_conn.commit()
+    return _job_conn
+
+
+def run_job(job_id, query, params, job_dir=JOB_DIR):
+    """
+    Run a job's query and write its result file; called in a pool process
+
+    The state file moves to 'running' and then to 'done' with the row
+    count, or to 'failed' with the error. The result only appears under its
+    final name once it is complete.
+    """
+    state = read_state(job_id, job_dir)
+    if state is None:
+        return
+    state.update(status='running', pid=os.getpid(), started_at=time.time())
+    write_state(state, job_dir)
+    path = result_path(job_id, job_dir)
+    rows = 0
+    try:
+        conn = _connection()
+        try:
+            with gzip.open(path + '.tmp', 'wb', compresslevel=JOB_COMPRESSION) as out, \
+                    conn.cursor(name='job_cursor') as cur:
+                cur.itersize = JOB_FETCH_SIZE
+                cur.execute(query, params)
+                columns = None
+                while True:
+                    batch = cur.fetchmany(JOB_FETCH_SIZE)
+                    if columns is None:
+                        columns = [desc[0] for desc in cur.description]
+                        out.write(dumps(columns) + b'\n')
+                    if not batch:
+                        break
+                    out.write(b'\n'.join(dumps(row) for row in batch) + b'\n')
+                    rows += len(batch)
+        finally:
+            conn.rollback()
+        os.replace(path + '.tmp', path)
+        state.update(status='done', rows=rows, bytes=os.path.getsize(path))
+    except (psycopg2.Error, OSError) as e:
+        print(f"❌ Job {job_id} ({state['report']}) failed:", e)
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        if isinstance(e, psycopg2.InterfaceError):
+            _job_conn.close()
+        state.update(status='failed', error=str(e).strip())
+    state['finished_at'] = time.time()
+    write_state(state, job_dir)
+
+
+class JobQueue:
+    """Submission, coalescing and the process pool of one web worker."""
+
+    def __init__(self, job_dir=JOB_DIR, workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL, retention=JOB_RETENTION):
+        self.job_dir = job_dir
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._executor = None
+        self._last_cleanup = 0.0
+        self.stats = {'submitted': 0, 'coalesced': 0, 'reused': 0, 'lost': 0, 'pool_restarts': 0}
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def shutdown(self):
+        """Stop the pool; jobs it had not started are left queued and run again on resubmission."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, report, params, query, query_params):
+        """
+        Start a report job, or return the one already answering the same request
+
+        Args:
+            report (str): Report name
+            params (dict): Request parameters, used to recognise identical requests
+            query (str): SQL with %s placeholders
+            query_params (tuple): Values for the placeholders
+
+        Returns:
+            tuple: (job state, True if an existing job was returned)
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        key = job_key(report, params)
+        with open(os.path.join(self.job_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            current = self._current(key)
+            if current is not None:
+                return current, True
+            state = {
+                'id': f'{key}-{secrets.token_hex(4)}',
+                'report': report,
+                'params': params,
+                'status': 'queued',
+                'pid': os.getpid(),
+                'submitted_at': time.time(),
+            }
+            write_state(state, self.job_dir)
+            with open(os.path.join(self.job_dir, f'{key}.current.tmp'), 'w') as f:
+                f.write(state['id'])
+            os.replace(os.path.join(self.job_dir, f'{key}.current.tmp'), os.path.join(self.job_dir, f'{key}.current'))
+        self._count('submitted')
+        self._start(state, query, query_params)
+        self._cleanup()
+        return state, False
+
+    def _current(self, key):
+        """The job for key that a new submission should share, if any; called under the lock."""
+        try:
+            with open(os.path.join(self.job_dir, f'{key}.current')) as f:
+                state = read_state(f.read().strip(), self.job_dir)
+        except FileNotFoundError:
+            return None
+        if state is None:
+            return None
+        if state['status'] in PENDING:
+            if not is_lost(state):
+                self._count('coalesced')
+                return state
+            self._count('lost')
+            state.update(status='failed', error='Lost when its worker process exited', finished_at=time.time())
+            write_state(state, self.job_dir)
+        elif state['status'] == 'done' and time.time() - state['finished_at'] < self.result_ttl:
+            self._count('reused')
+            return state
+        return None
+
+    def _start(self, state, query, query_params):
+        for attempt in range(2):
+            try:
+                future = self._pool().submit(run_job, state['id'], query, query_params, self.job_dir)
+                break
+            except BrokenProcessPool:
+                # A pool process was killed; the pool cannot be used again
+                with self._lock:
+                    self._executor = None
+                    self.stats['pool_restarts'] += 1
+                if attempt == 1:
+                    raise
+        future.add_done_callback(lambda done: self._finished(state['id'], done))
+
+    def _finished(self, job_id, future):
+        if future.cancelled() or future.exception() is None:
+            return
+        print(f"❌ Job {job_id} did not run:", future.exception())
+        state = read_state(job_id, self.job_dir)
+        if state is not None and state['status'] in PENDING:
+            state.update(status='failed', error=str(future.exception()), finished_at=time.time())
+            write_state(state, self.job_dir)
+
+    def _cleanup(self):
+        """Delete jobs that finished more than retention seconds ago, at most once a minute."""
+        now = time.time()
+        with self._lock:
+            if now - self._last_cleanup < 60:
+                return
+            self._last_cleanup = now
+        with open(os.path.join(self.job_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._remove_expired(now)
+
+    def _remove_expired(self, now):
+        for path in glob.glob(os.path.join(self.job_dir, '*.json')):
+            job_id = os.path.basename(path)[:-len('.json')]
+            state = read_state(job_id, self.job_dir)
+            if state is None or now - state.get('finished_at', now) < self.retention:
+                continue
+            for stale in (result_path(job_id, self.job_dir), path):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+        for path in glob.glob(os.path.join(self.job_dir, '*.current')):
+            with open(path) as f:
+                if read_state(f.read().strip(), self.job_dir) is None:
+                    os.remove(path)
+
+
+def public_state(state):
+    """A job's state as returned by the API."""
+    if is_lost(state):
+        state = dict(state, status='failed', error='Lost when its worker process exited; submit it again')
+    result = {name: state.get(name) for name in ('id', 'report', 'params', 'status', 'rows', 'bytes', 'error')}
+    for name in ('submitted_at', 'started_at', 'finished_at'):
+        result[name] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(state[name])) if state.get(name) else None
+    if state.get('started_at') and state.get('finished_at'):
+        result['run_seconds'] = round(state['finished_at'] - state['started_at'], 3)
+    return result
+
+
+def result_chunks(columns, rows, row_format, batch_size=JOB_FETCH_SIZE):
+    """
+    A stored result as JSON in one of the ROW_FORMATS layouts, in chunks
+
+    'records' and 'rows' are streamed batch_size rows at a time; 'columns'
+    needs every row before the first column can be written.
+    """
+    if row_format == 'columns':
+        yield dumps(rows_payload(columns, list(rows), 'columns'))
+        return
+    if row_format == 'records':
+        yield b'['
+        encode = lambda row: dumps(dict(zip(columns, row)))  # noqa: E731
+    else:
+        yield b'{"columns":' + dumps(columns) + b',"rows":['
+        encode = dumps
+    first = True
+    batch = []
+    for row in rows:
+        batch.append(encode(row))
+        if len(batch) == batch_size:
+            yield (b'' if first else b',') + b','.join(batch)
+            first, batch = False, []
+    if batch:
+        yield (b'' if first else b',') + b','.join(batch)
+    yield b']' if row_format == 'records' else b']}'
+
+
+def read_result(job_id, job_dir=JOB_DIR):
+    """
+    Columns and a row iterator over a finished job's result
+
+    Returns:
+        tuple: (column names, iterator of row lists); the file is closed when the iterator is exhausted
+    """
+    try:
+        from orjson import loads  # optional dependency
+    except ImportError:
+        loads = json.loads
+    f = gzip.open(result_path(job_id, job_dir), 'rb')
+    try:
+        columns = loads(f.readline())
+    except Exception:
+        f.close()
+        raise
+
+    def rows():
+        with f:
+            for line in f:
+                yield loads(line)
+    return columns, rows()
+
+
+def read_ndjson(job_id, job_dir=JOB_DIR, block_size=2 ** 16):
+    """Iterator over a finished job's result file, decompressed, in blocks."""
+    f = gzip.open(result_path(job_id, job_dir), 'rb')
+
+    def blocks():
+        with f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    return
+                yield block
+    return blocks()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,133 @@
+"""
+Apply the SQL files in migrations/ that have not been run yet
+
+Files run in name order, each in its own transaction, and are recorded in
+the schema_migrations table. A file whose first line is
+"-- migrate: no-transaction" runs statement by statement in autocommit
+mode instead, for commands such as CREATE INDEX CONCURRENTLY.
+
+A CREATE INDEX CONCURRENTLY that fails part way leaves an INVALID index
+behind, which IF NOT EXISTS would then skip on the next run. Before each
+CREATE INDEX CONCURRENTLY IF NOT EXISTS, an invalid index of that name is
+dropped so the statement builds it again.
+
+Usage:
+    python migrate.py           apply pending migrations
+    python migrate.py --list    show applied and pending migrations
+"""
+import os
+import re
+import sys
+
+import psycopg2
+
+from db import DB_CONFIG
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE)
+
+
+def migration_files():
+    return sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith('.sql'))
+
+
+def applied_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name       text PRIMARY KEY,
+                applied_at timestamptz NOT NULL DEFAULT now()
+            )
+        """)
+        cur.execute("SELECT name FROM schema_migrations")
+        applied = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return applied
+
+
+def split_statements(script):
+    """Split a plain DDL script on statement-terminating semicolons."""
+    statements = []
+    current = []
+    for line in script.splitlines():
+        if line.strip().startswith('--'):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(';'):
+            statements.append('\n'.join(current).strip())
+            current = []
+    if '\n'.join(current).strip():
+        statements.append('\n'.join(current).strip())
+    return statements
+
+
+def drop_invalid_index(cur, index_name):
+    """Drop index_name if an interrupted concurrent build left it INVALID; returns whether it did."""
+    cur.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace AND NOT i.indisvalid
+    """, (index_name,))
+    if cur.fetchone() is None:
+        return False
+    print(f"Dropping invalid index {index_name} left by an interrupted build")
+    cur.execute(f'DROP INDEX CONCURRENTLY {index_name}')
+    return True
+
+
+def apply_migration(conn, name):
+    with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+        script = f.read()
+
+    if script.startswith(NO_TRANSACTION_MARKER):
+        # Each statement must be idempotent, a failure part way leaves earlier ones applied
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                for statement in split_statements(script):
+                    index = CONCURRENT_INDEX.match(statement)
+                    if index:
+                        drop_invalid_index(cur, index.group(1))
+                    cur.execute(statement)
+                cur.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+        finally:
+            conn.autocommit = False
+        return
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(script)
+            cur.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate(conn):
+    """Apply every pending migration and return their names."""
+    applied = applied_migrations(conn)
+    pending = [name for name in migration_files() if name not in applied]
+    for name in pending:
+        print(f"Applying {name}")
+        apply_migration(conn, name)
+    return pending
+
+
+def main(argv):
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if '--list' in argv:
+            applied = applied_migrations(conn)
+            for name in migration_files():
+                print(f"{'applied' if name in applied else 'pending'}  {name}")
+            return 0
+        if not migrate(conn):
+            print("Database is up to date")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
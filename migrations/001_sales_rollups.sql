@@ -0,0 +1,181 @@
+-- Daily sales rollups for the leaderboard reports.
+--
+-- product_sales_daily, employee_sales_daily and customer_sales_daily hold one
+-- row per entity per invoice date and are kept current by triggers on
+-- salesinvoice and salesdetail, so the report routes aggregate a few rows
+-- per day instead of the whole sales history.
+-- Invoices without a date are filed under '-infinity'.
+
+CREATE TABLE IF NOT EXISTS product_sales_daily (
+    productid   integer NOT NULL,
+    salesdate   date    NOT NULL,
+    lines       bigint  NOT NULL DEFAULT 0,
+    quantity    bigint  NOT NULL DEFAULT 0,
+    linetotal   numeric NOT NULL DEFAULT 0,
+    PRIMARY KEY (productid, salesdate)
+);
+
+CREATE TABLE IF NOT EXISTS employee_sales_daily (
+    employeeid  integer NOT NULL,
+    salesdate   date    NOT NULL,
+    invoices    bigint  NOT NULL DEFAULT 0,
+    totalamount numeric NOT NULL DEFAULT 0,
+    PRIMARY KEY (employeeid, salesdate)
+);
+
+CREATE TABLE IF NOT EXISTS customer_sales_daily (
+    customerid  integer NOT NULL,
+    salesdate   date    NOT NULL,
+    invoices    bigint  NOT NULL DEFAULT 0,
+    totalamount numeric NOT NULL DEFAULT 0,
+    PRIMARY KEY (customerid, salesdate)
+);
+
+CREATE INDEX IF NOT EXISTS product_sales_daily_salesdate_idx ON product_sales_daily (salesdate);
+CREATE INDEX IF NOT EXISTS employee_sales_daily_salesdate_idx ON employee_sales_daily (salesdate);
+CREATE INDEX IF NOT EXISTS customer_sales_daily_salesdate_idx ON customer_sales_daily (salesdate);
+
+
+-- Delta helpers: add (or, with negative arguments, subtract) one sale
+
+CREATE OR REPLACE FUNCTION rollup_product_sale(p_productid integer, p_day date, p_lines bigint, p_quantity bigint, p_linetotal numeric)
+RETURNS void AS $$
+BEGIN
+    IF p_productid IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO product_sales_daily AS r (productid, salesdate, lines, quantity, linetotal)
+    VALUES (p_productid, p_day, p_lines, COALESCE(p_quantity, 0), COALESCE(p_linetotal, 0))
+    ON CONFLICT (productid, salesdate) DO UPDATE
+    SET lines = r.lines + EXCLUDED.lines,
+        quantity = r.quantity + EXCLUDED.quantity,
+        linetotal = r.linetotal + EXCLUDED.linetotal;
+    IF p_lines < 0 THEN
+        DELETE FROM product_sales_daily
+        WHERE productid = p_productid AND salesdate = p_day AND lines <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rollup_invoice_sale(p_employeeid integer, p_customerid integer, p_day date, p_invoices bigint, p_totalamount numeric)
+RETURNS void AS $$
+BEGIN
+    IF p_employeeid IS NOT NULL THEN
+        INSERT INTO employee_sales_daily AS r (employeeid, salesdate, invoices, totalamount)
+        VALUES (p_employeeid, p_day, p_invoices, COALESCE(p_totalamount, 0))
+        ON CONFLICT (employeeid, salesdate) DO UPDATE
+        SET invoices = r.invoices + EXCLUDED.invoices,
+            totalamount = r.totalamount + EXCLUDED.totalamount;
+        IF p_invoices < 0 THEN
+            DELETE FROM employee_sales_daily
+            WHERE employeeid = p_employeeid AND salesdate = p_day AND invoices <= 0;
+        END IF;
+    END IF;
+
+    IF p_customerid IS NOT NULL THEN
+        INSERT INTO customer_sales_daily AS r (customerid, salesdate, invoices, totalamount)
+        VALUES (p_customerid, p_day, p_invoices, COALESCE(p_totalamount, 0))
+        ON CONFLICT (customerid, salesdate) DO UPDATE
+        SET invoices = r.invoices + EXCLUDED.invoices,
+            totalamount = r.totalamount + EXCLUDED.totalamount;
+        IF p_invoices < 0 THEN
+            DELETE FROM customer_sales_daily
+            WHERE customerid = p_customerid AND salesdate = p_day AND invoices <= 0;
+        END IF;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Triggers
+
+CREATE OR REPLACE FUNCTION salesinvoice_rollup_trigger()
+RETURNS trigger AS $$
+DECLARE
+    detail record;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollup_invoice_sale(OLD.employeeid, OLD.customerid,
+                                    COALESCE(OLD.invoicedate, '-infinity'), -1, -OLD.totalamount);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollup_invoice_sale(NEW.employeeid, NEW.customerid,
+                                    COALESCE(NEW.invoicedate, '-infinity'), 1, NEW.totalamount);
+    END IF;
+
+    -- Product rollups are keyed by the invoice date, so move the lines along with it
+    IF TG_OP = 'UPDATE' AND OLD.invoicedate IS DISTINCT FROM NEW.invoicedate THEN
+        FOR detail IN SELECT productid, quantity, linetotal FROM salesdetail WHERE invoiceid = NEW.invoiceid LOOP
+            PERFORM rollup_product_sale(detail.productid, COALESCE(OLD.invoicedate, '-infinity'),
+                                        -1, -detail.quantity, -detail.linetotal);
+            PERFORM rollup_product_sale(detail.productid, COALESCE(NEW.invoicedate, '-infinity'),
+                                        1, detail.quantity, detail.linetotal);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION salesdetail_rollup_trigger()
+RETURNS trigger AS $$
+DECLARE
+    day date;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COALESCE(invoicedate, '-infinity') INTO day FROM salesinvoice WHERE invoiceid = OLD.invoiceid;
+        IF FOUND THEN
+            PERFORM rollup_product_sale(OLD.productid, day, -1, -OLD.quantity, -OLD.linetotal);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COALESCE(invoicedate, '-infinity') INTO day FROM salesinvoice WHERE invoiceid = NEW.invoiceid;
+        IF FOUND THEN
+            PERFORM rollup_product_sale(NEW.productid, day, 1, NEW.quantity, NEW.linetotal);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS salesinvoice_rollup ON salesinvoice;
+CREATE TRIGGER salesinvoice_rollup
+    AFTER INSERT OR UPDATE OF employeeid, customerid, invoicedate, totalamount OR DELETE ON salesinvoice
+    FOR EACH ROW EXECUTE FUNCTION salesinvoice_rollup_trigger();
+
+DROP TRIGGER IF EXISTS salesdetail_rollup ON salesdetail;
+CREATE TRIGGER salesdetail_rollup
+    AFTER INSERT OR UPDATE OF invoiceid, productid, quantity, linetotal OR DELETE ON salesdetail
+    FOR EACH ROW EXECUTE FUNCTION salesdetail_rollup_trigger();
+
+
+-- Full rebuild, used to backfill existing history and to repair drift
+
+CREATE OR REPLACE FUNCTION rebuild_sales_rollups()
+RETURNS void AS $$
+BEGIN
+    LOCK TABLE salesinvoice, salesdetail IN SHARE MODE;
+    TRUNCATE product_sales_daily, employee_sales_daily, customer_sales_daily;
+
+    INSERT INTO product_sales_daily (productid, salesdate, lines, quantity, linetotal)
+    SELECT sd.productid, COALESCE(si.invoicedate, '-infinity'), count(*),
+           COALESCE(sum(sd.quantity), 0), COALESCE(sum(sd.linetotal), 0)
+    FROM salesdetail sd
+    JOIN salesinvoice si ON si.invoiceid = sd.invoiceid
+    WHERE sd.productid IS NOT NULL
+    GROUP BY 1, 2;
+
+    INSERT INTO employee_sales_daily (employeeid, salesdate, invoices, totalamount)
+    SELECT employeeid, COALESCE(invoicedate, '-infinity'), count(*), COALESCE(sum(totalamount), 0)
+    FROM salesinvoice
+    WHERE employeeid IS NOT NULL
+    GROUP BY 1, 2;
+
+    INSERT INTO customer_sales_daily (customerid, salesdate, invoices, totalamount)
+    SELECT customerid, COALESCE(invoicedate, '-infinity'), count(*), COALESCE(sum(totalamount), 0)
+    FROM salesinvoice
+    WHERE customerid IS NOT NULL
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_sales_rollups();
@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- Range indexes for the date-filtered reports.
+--
+-- Built CONCURRENTLY so tills can keep writing while they build. The
+-- INCLUDE columns let revenue, spend and per-employee totals be answered
+-- with index-only scans.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS salesinvoice_invoicedate_idx
+    ON salesinvoice (invoicedate) INCLUDE (employeeid, totalamount);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS purchaseorder_orderdate_idx
+    ON purchaseorder (orderdate) INCLUDE (totalamount);
@@ -0,0 +1,53 @@
+-- Change feed for low stock.
+--
+-- A product is low on stock when stockquantity <= reorderlevel (a missing
+-- reorder level counts as 0). Whenever a write moves a product into or out
+-- of that state, or changes its stock while it stays low, the trigger
+-- sends a NOTIFY on the product_stock channel. stock_alerts.py listens on
+-- it, so nothing has to poll the product table. Notifications are only
+-- delivered when the writing transaction commits.
+
+CREATE OR REPLACE FUNCTION notify_product_stock() RETURNS trigger AS $$
+DECLARE
+    was_low boolean := false;
+    is_low  boolean := false;
+    target  product%ROWTYPE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        was_low := OLD.stockquantity <= coalesce(OLD.reorderlevel, 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        is_low := NEW.stockquantity <= coalesce(NEW.reorderlevel, 0);
+        target := NEW;
+    ELSE
+        target := OLD;
+    END IF;
+
+    IF coalesce(was_low, false) OR coalesce(is_low, false) THEN
+        IF TG_OP = 'UPDATE' AND was_low = is_low
+                AND OLD.stockquantity IS NOT DISTINCT FROM NEW.stockquantity
+                AND OLD.reorderlevel IS NOT DISTINCT FROM NEW.reorderlevel
+                AND OLD.name IS NOT DISTINCT FROM NEW.name THEN
+            RETURN NULL;
+        END IF;
+        PERFORM pg_notify('product_stock', json_build_object(
+            'productid', target.productid,
+            'name', left(target.name, 200),
+            'stockquantity', target.stockquantity,
+            'reorderlevel', target.reorderlevel,
+            'low', coalesce(is_low, false),
+            'op', lower(TG_OP)
+        )::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_stock_notify ON product;
+CREATE TRIGGER product_stock_notify
+    AFTER INSERT OR DELETE OR UPDATE OF stockquantity, reorderlevel, name ON product
+    FOR EACH ROW EXECUTE FUNCTION notify_product_stock();
+
+-- Lets the listener load its initial low-stock snapshot without a full scan
+CREATE INDEX IF NOT EXISTS product_low_stock_idx ON product (productid)
+    WHERE stockquantity <= coalesce(reorderlevel, 0);
@@ -0,0 +1,10 @@
+-- migrate: no-transaction
+-- Product lookups on sales lines.
+--
+-- Finding the invoices that sold a product (per-product rollup rebuilds,
+-- supplier sales checks) otherwise scans all of salesdetail. The
+-- invoicedate side of those joins is covered by salesinvoice_invoicedate_idx
+-- from 002.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS salesdetail_productid_idx
+    ON salesdetail (productid) INCLUDE (invoiceid);
@@ -0,0 +1,34 @@
+-- Change feed for the in-memory product catalogue.
+--
+-- Every insert, update or delete of a product sends its productid on the
+-- product_changed channel; catalog.py re-reads those rows and patches its
+-- index. The payload is only the id, so it stays far below the NOTIFY size
+-- limit whatever the description holds, and notifications for the same
+-- product within one transaction are collapsed by PostgreSQL. TRUNCATE
+-- sends '*', which makes listeners reload the whole catalogue.
+
+CREATE OR REPLACE FUNCTION notify_product_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('product_changed', '*');
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('product_changed', OLD.productid::text);
+    ELSE
+        IF TG_OP = 'UPDATE' AND OLD.productid <> NEW.productid THEN
+            PERFORM pg_notify('product_changed', OLD.productid::text);
+        END IF;
+        PERFORM pg_notify('product_changed', NEW.productid::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_changed_notify ON product;
+CREATE TRIGGER product_changed_notify
+    AFTER INSERT OR UPDATE OR DELETE ON product
+    FOR EACH ROW EXECUTE FUNCTION notify_product_changed();
+
+DROP TRIGGER IF EXISTS product_truncated_notify ON product;
+CREATE TRIGGER product_truncated_notify
+    AFTER TRUNCATE ON product
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_product_changed();
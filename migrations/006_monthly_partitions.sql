@@ -0,0 +1,212 @@
+-- Monthly range partitions for salesinvoice and transactionlog.
+--
+-- Both tables are rebuilt as tables partitioned by month of invoicedate /
+-- timestamp, named <table>_pYYYY_MM, plus a <table>_default partition for
+-- rows without a date or outside every month created so far. Queries with a
+-- half-open range on the date column only scan the months they touch, and
+-- old months can be detached and archived whole (partitions.py) instead of
+-- deleted row by row.
+--
+-- A partitioned table can only enforce uniqueness on columns that include
+-- its partition key, so the primary keys become UNIQUE (id, date) and ids
+-- stay unique through their sequences. For the same reason salesdetail and
+-- returns can no longer hold a foreign key to salesinvoice; triggers check
+-- that their invoice exists, and a deferred constraint trigger stops an
+-- invoice that still has lines or returns from being deleted. Lines and
+-- returns of archived invoices stay where they are.
+--
+-- The rollups from 001 keep counting archived months, so the leaderboards
+-- still cover the whole history; rebuild_sales_rollups() only sees the
+-- months that are still attached.
+--
+-- The data is copied inside this migration's transaction, with both tables
+-- locked for the duration; run it in a quiet period.
+
+-- One month of a partitioned table. Rows already sitting in the default
+-- partition for that month are moved into it. Returns false if it exists.
+CREATE OR REPLACE FUNCTION create_month_partition(p_table text, p_month date)
+RETURNS boolean AS $$
+DECLARE
+    month_start date := date_trunc('month', p_month);
+    month_end date := date_trunc('month', p_month) + interval '1 month';
+    partition_name text := format('%s_p%s', p_table, to_char(p_month, 'YYYY_MM'));
+    key_column text;
+    moved bigint := 0;
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    SELECT a.attname INTO STRICT key_column
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = p_table::regclass;
+
+    IF to_regclass(p_table || '_default') IS NOT NULL THEN
+        -- Take them out through the parent and put them back once the month
+        -- exists, so row triggers see a delete and an insert and rollups balance
+        EXECUTE format('CREATE TEMP TABLE partition_moving ON COMMIT DROP AS SELECT * FROM %I WHERE %I >= %L AND %I < %L',
+                       p_table || '_default', key_column, month_start, key_column, month_end);
+        GET DIAGNOSTICS moved = ROW_COUNT;
+        IF moved > 0 THEN
+            EXECUTE format('DELETE FROM %I WHERE %I >= %L AND %I < %L',
+                           p_table, key_column, month_start, key_column, month_end);
+        END IF;
+    END IF;
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                   partition_name, p_table, month_start, month_end);
+    IF to_regclass('pg_temp.partition_moving') IS NOT NULL THEN
+        IF moved > 0 THEN
+            EXECUTE format('INSERT INTO %I SELECT * FROM partition_moving', p_table);
+        END IF;
+        DROP TABLE partition_moving;
+    END IF;
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rebuild p_table as monthly partitions on p_key, unique on (p_id, p_key),
+-- with months from its oldest row (at most ten years back) to three months ahead
+CREATE OR REPLACE FUNCTION partition_table_by_month(p_table text, p_key text, p_id text)
+RETURNS void AS $$
+DECLARE
+    old_table text := p_table || '_unpartitioned';
+    first_month date;
+    each_month date;
+    fk record;
+    index_name text;
+BEGIN
+    EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', p_table);
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', p_table, old_table);
+    -- Index names are shared by the schema; free them for the new table
+    FOR index_name IN
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = old_table::regclass
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', index_name, 'unpartitioned_' || index_name);
+    END LOOP;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE '
+                   'INCLUDING COMMENTS) PARTITION BY RANGE (%I)', p_table, old_table, p_key);
+    EXECUTE format('ALTER TABLE %I ADD UNIQUE (%I, %I)', p_table, p_id, p_key);
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', p_table || '_default', p_table);
+
+    EXECUTE format('SELECT date_trunc(''month'', min(%I))::date FROM %I', p_key, old_table) INTO first_month;
+    first_month := greatest(coalesce(first_month, current_date), (date_trunc('month', current_date) - interval '10 years')::date);
+    each_month := date_trunc('month', first_month);
+    WHILE each_month <= date_trunc('month', current_date) + interval '3 months' LOOP
+        PERFORM create_month_partition(p_table, each_month);
+        each_month := each_month + interval '1 month';
+    END LOOP;
+
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I', p_table, old_table);
+
+    FOR fk IN
+        SELECT conname, pg_get_constraintdef(oid) AS definition FROM pg_constraint
+        WHERE conrelid = old_table::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', p_table, fk.conname, fk.definition);
+    END LOOP;
+    IF pg_get_serial_sequence(old_table, p_id) IS NOT NULL THEN
+        -- Or dropping the old table would drop the sequence the new one draws ids from
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I', pg_get_serial_sequence(old_table, p_id), p_table, p_id);
+    END IF;
+    EXECUTE format('DROP TABLE %I', old_table);
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- salesinvoice
+
+ALTER TABLE salesdetail DROP CONSTRAINT IF EXISTS salesdetail_invoiceid_fkey;
+ALTER TABLE returns DROP CONSTRAINT IF EXISTS returns_invoiceid_fkey;
+
+SELECT partition_table_by_month('salesinvoice', 'invoicedate', 'invoiceid');
+
+CREATE INDEX salesinvoice_invoicedate_idx ON salesinvoice (invoicedate) INCLUDE (employeeid, totalamount);
+-- Lines of one invoice, for the triggers below
+CREATE INDEX IF NOT EXISTS salesdetail_invoiceid_idx ON salesdetail (invoiceid);
+
+-- A partition move is a delete and an insert, so product rollups follow the
+-- lines of an invoice whenever it appears or disappears, not only on UPDATE
+CREATE OR REPLACE FUNCTION salesinvoice_rollup_trigger()
+RETURNS trigger AS $$
+DECLARE
+    detail record;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rollup_invoice_sale(OLD.employeeid, OLD.customerid,
+                                    COALESCE(OLD.invoicedate, '-infinity'), -1, -OLD.totalamount);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rollup_invoice_sale(NEW.employeeid, NEW.customerid,
+                                    COALESCE(NEW.invoicedate, '-infinity'), 1, NEW.totalamount);
+    END IF;
+
+    -- Product rollups are keyed by the invoice date and count lines whose invoice exists
+    IF TG_OP = 'DELETE' OR TG_OP = 'UPDATE' AND OLD.invoicedate IS DISTINCT FROM NEW.invoicedate THEN
+        FOR detail IN SELECT productid, quantity, linetotal FROM salesdetail WHERE invoiceid = OLD.invoiceid LOOP
+            PERFORM rollup_product_sale(detail.productid, COALESCE(OLD.invoicedate, '-infinity'),
+                                        -1, -detail.quantity, -detail.linetotal);
+        END LOOP;
+    END IF;
+    IF TG_OP = 'INSERT' OR TG_OP = 'UPDATE' AND OLD.invoicedate IS DISTINCT FROM NEW.invoicedate THEN
+        FOR detail IN SELECT productid, quantity, linetotal FROM salesdetail WHERE invoiceid = NEW.invoiceid LOOP
+            PERFORM rollup_product_sale(detail.productid, COALESCE(NEW.invoicedate, '-infinity'),
+                                        1, detail.quantity, detail.linetotal);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER salesinvoice_rollup
+    AFTER INSERT OR UPDATE OF employeeid, customerid, invoicedate, totalamount OR DELETE ON salesinvoice
+    FOR EACH ROW EXECUTE FUNCTION salesinvoice_rollup_trigger();
+
+-- In place of the foreign keys from salesdetail and returns
+CREATE OR REPLACE FUNCTION salesinvoice_reference_check()
+RETURNS trigger AS $$
+BEGIN
+    IF NEW.invoiceid IS NOT NULL THEN
+        PERFORM 1 FROM salesinvoice WHERE invoiceid = NEW.invoiceid FOR KEY SHARE;
+        IF NOT FOUND THEN
+            RAISE foreign_key_violation USING
+                MESSAGE = format('insert or update on table "%s" violates foreign key to salesinvoice', TG_TABLE_NAME),
+                DETAIL = format('Key (invoiceid)=(%s) is not present in table "salesinvoice".', NEW.invoiceid);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER salesdetail_invoice_check
+    AFTER INSERT OR UPDATE OF invoiceid ON salesdetail
+    FOR EACH ROW EXECUTE FUNCTION salesinvoice_reference_check();
+
+CREATE TRIGGER returns_invoice_check
+    AFTER INSERT OR UPDATE OF invoiceid ON returns
+    FOR EACH ROW EXECUTE FUNCTION salesinvoice_reference_check();
+
+-- Deferred, so an invoice moving between partitions (deleted and re-inserted) passes
+CREATE OR REPLACE FUNCTION salesinvoice_delete_check()
+RETURNS trigger AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM salesinvoice WHERE invoiceid = OLD.invoiceid)
+       AND (EXISTS (SELECT 1 FROM salesdetail WHERE invoiceid = OLD.invoiceid)
+            OR EXISTS (SELECT 1 FROM returns WHERE invoiceid = OLD.invoiceid)) THEN
+        RAISE foreign_key_violation USING
+            MESSAGE = 'delete on table "salesinvoice" violates foreign key from salesdetail or returns',
+            DETAIL = format('Key (invoiceid)=(%s) is still referenced.', OLD.invoiceid);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER salesinvoice_referenced_check
+    AFTER DELETE ON salesinvoice DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION salesinvoice_delete_check();
+
+
+-- transactionlog
+
+SELECT partition_table_by_month('transactionlog', 'timestamp', 'logid');
@@ -0,0 +1,112 @@
+-- invoice_keys: one narrow, unpartitioned row per invoice id.
+--
+-- Since 006 salesinvoice is partitioned by invoicedate, and a lookup by
+-- invoiceid alone has to probe the invoiceid index of every partition. The
+-- row triggers on salesdetail and returns do exactly that on every write: the
+-- reference check, the deferred delete check and the product rollup trigger
+-- from 001, which needs the invoice date. They now read invoice_keys, a plain
+-- table keyed on invoiceid that salesinvoice keeps current through a BEFORE
+-- row trigger, so each is a single primary key probe.
+--
+-- Its primary key also makes invoiceid unique across the whole of
+-- salesinvoice again, which UNIQUE (invoiceid, invoicedate) on the partitioned
+-- table cannot: that allows the same id in two months, or twice with a NULL
+-- date. Changing the invoiceid of an existing invoice is refused.
+--
+-- Keys of archived months are kept (partitions.py drops the partition, not
+-- the keys), so lines and returns of archived invoices keep passing the
+-- reference check, and editing them still moves the rollups, which count the
+-- archived months as well. A restored month finds its keys in place.
+--
+-- Fails if salesinvoice already holds a duplicate invoiceid; remove it and
+-- run again.
+
+LOCK TABLE salesinvoice IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE invoice_keys (
+    invoiceid   int PRIMARY KEY,
+    invoicedate date
+);
+
+INSERT INTO invoice_keys (invoiceid, invoicedate)
+SELECT invoiceid, invoicedate FROM salesinvoice;
+
+-- BEFORE, so that for an update moving an invoice to another partition
+-- (fired as update, then delete and insert) the key ends up present
+CREATE OR REPLACE FUNCTION invoice_keys_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO invoice_keys (invoiceid, invoicedate) VALUES (NEW.invoiceid, NEW.invoicedate);
+        RETURN NEW;
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF NEW.invoiceid IS DISTINCT FROM OLD.invoiceid THEN
+            RAISE feature_not_supported USING
+                MESSAGE = 'invoiceid of a salesinvoice row cannot be changed',
+                DETAIL = format('Key (invoiceid)=(%s).', OLD.invoiceid);
+        END IF;
+        UPDATE invoice_keys SET invoicedate = NEW.invoicedate WHERE invoiceid = OLD.invoiceid;
+        RETURN NEW;
+    END IF;
+    DELETE FROM invoice_keys WHERE invoiceid = OLD.invoiceid;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER salesinvoice_keys
+    BEFORE INSERT OR UPDATE OF invoiceid, invoicedate OR DELETE ON salesinvoice
+    FOR EACH ROW EXECUTE FUNCTION invoice_keys_trigger();
+
+
+-- The lookups by invoiceid, from 001 and 006, against invoice_keys
+
+CREATE OR REPLACE FUNCTION salesdetail_rollup_trigger()
+RETURNS trigger AS $$
+DECLARE
+    day date;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COALESCE(invoicedate, '-infinity') INTO day FROM invoice_keys WHERE invoiceid = OLD.invoiceid;
+        IF FOUND THEN
+            PERFORM rollup_product_sale(OLD.productid, day, -1, -OLD.quantity, -OLD.linetotal);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COALESCE(invoicedate, '-infinity') INTO day FROM invoice_keys WHERE invoiceid = NEW.invoiceid;
+        IF FOUND THEN
+            PERFORM rollup_product_sale(NEW.productid, day, 1, NEW.quantity, NEW.linetotal);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION salesinvoice_reference_check()
+RETURNS trigger AS $$
+BEGIN
+    IF NEW.invoiceid IS NOT NULL THEN
+        -- Locks the key as a foreign key would, so the invoice cannot be deleted under us
+        PERFORM 1 FROM invoice_keys WHERE invoiceid = NEW.invoiceid FOR KEY SHARE;
+        IF NOT FOUND THEN
+            RAISE foreign_key_violation USING
+                MESSAGE = format('insert or update on table "%s" violates foreign key to salesinvoice', TG_TABLE_NAME),
+                DETAIL = format('Key (invoiceid)=(%s) is not present in table "salesinvoice".', NEW.invoiceid);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION salesinvoice_delete_check()
+RETURNS trigger AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM invoice_keys WHERE invoiceid = OLD.invoiceid)
+       AND (EXISTS (SELECT 1 FROM salesdetail WHERE invoiceid = OLD.invoiceid)
+            OR EXISTS (SELECT 1 FROM returns WHERE invoiceid = OLD.invoiceid)) THEN
+        RAISE foreign_key_violation USING
+            MESSAGE = 'delete on table "salesinvoice" violates foreign key from salesdetail or returns',
+            DETAIL = format('Key (invoiceid)=(%s) is still referenced.', OLD.invoiceid);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,21 @@
+-- Unique ids on the monthly partitioned tables when the date is NULL.
+--
+-- The UNIQUE (id, date) constraints that 006 puts in place of the primary
+-- keys treat NULLs as distinct, so two rows with the same id and no date
+-- both go into the default partition. The two tables are closed off in
+-- different ways:
+--
+-- salesinvoice: uniqueness is checked in the insert path. Every insert goes
+-- through invoice_keys (007), whose primary key on invoiceid rejects a
+-- duplicate whatever the invoice date, NULL included. invoicedate stays
+-- nullable, as invoices without a date are valid rows today.
+--
+-- transactionlog: the partition key becomes NOT NULL, defaulting to now().
+-- Nothing in the application writes log rows without a time; any existing
+-- ones get '-infinity', which keeps them in the default partition and out
+-- of every ?from=&to= window, as NULL did. Beyond UNIQUE (logid,
+-- "timestamp"), logids rely on their sequence, as they did since 006.
+
+UPDATE transactionlog SET "timestamp" = '-infinity' WHERE "timestamp" IS NULL;
+ALTER TABLE transactionlog ALTER COLUMN "timestamp" SET DEFAULT now();
+ALTER TABLE transactionlog ALTER COLUMN "timestamp" SET NOT NULL;
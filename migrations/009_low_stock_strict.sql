@@ -0,0 +1,47 @@
+-- Low stock means stockquantity < reorderlevel, strictly below, the rule
+-- the UI uses to highlight a product (a missing reorder level still counts
+-- as 0). 003 used <=, so a product sitting exactly at its reorder level was
+-- reported low by /stock/events and /stock/low but not on the dashboard.
+-- This replaces the trigger function and the partial index from 003 with
+-- the strict comparison; stock_alerts.py's snapshot query matches it.
+
+CREATE OR REPLACE FUNCTION notify_product_stock() RETURNS trigger AS $$
+DECLARE
+    was_low boolean := false;
+    is_low  boolean := false;
+    target  product%ROWTYPE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        was_low := OLD.stockquantity < coalesce(OLD.reorderlevel, 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        is_low := NEW.stockquantity < coalesce(NEW.reorderlevel, 0);
+        target := NEW;
+    ELSE
+        target := OLD;
+    END IF;
+
+    IF coalesce(was_low, false) OR coalesce(is_low, false) THEN
+        IF TG_OP = 'UPDATE' AND was_low = is_low
+                AND OLD.stockquantity IS NOT DISTINCT FROM NEW.stockquantity
+                AND OLD.reorderlevel IS NOT DISTINCT FROM NEW.reorderlevel
+                AND OLD.name IS NOT DISTINCT FROM NEW.name THEN
+            RETURN NULL;
+        END IF;
+        PERFORM pg_notify('product_stock', json_build_object(
+            'productid', target.productid,
+            'name', left(target.name, 200),
+            'stockquantity', target.stockquantity,
+            'reorderlevel', target.reorderlevel,
+            'low', coalesce(is_low, false),
+            'op', lower(TG_OP)
+        )::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP INDEX IF EXISTS product_low_stock_idx;
+-- Lets the listener load its initial low-stock snapshot without a full scan
+CREATE INDEX product_low_stock_idx ON product (productid)
+    WHERE stockquantity < coalesce(reorderlevel, 0);
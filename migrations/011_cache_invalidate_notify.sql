@@ -0,0 +1,33 @@
+-- Change feed for the response cache.
+--
+-- With CACHE_BACKEND=memory every worker process keeps its own cache, and
+-- the invalidation a write makes only reaches the process that served it.
+-- Any statement that writes to a table a cached route reads now sends the
+-- table name on the cache_invalidate channel; cache.py listens in each
+-- process and drops the responses that read it. Writes from outside the
+-- app (checkout, imports, psql) are covered the same way. PostgreSQL
+-- collapses repeated notifications within one transaction, so a bulk write
+-- sends one per table.
+--
+-- A route that caches another table needs it added here, in a new
+-- migration.
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidate() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('cache_invalidate', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    cached_table text;
+BEGIN
+    FOREACH cached_table IN ARRAY ARRAY['product', 'employee', 'feedback', 'complaints', 'supplier'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', cached_table || '_cache_invalidate', cached_table);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate()',
+                       cached_table || '_cache_invalidate', cached_table);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,252 @@
+"""
+Keyset pagination and streaming for the list routes
+
+A route given ?limit= returns one page ordered by its key columns, and the
+X-Next-Cursor and Link headers carry an opaque cursor for the last row;
+the next page is fetched with ?after=<cursor>. Pages are found with a
+keyset WHERE on the sort key rather than OFFSET, so every page costs the
+same, and rows with NULL sort keys are paged where PostgreSQL sorts them.
+?stream=ndjson or json instead streams the whole result from a
+server-side cursor. Without any of these a route returns its full result
+as before.
+"""
+import base64
+import json
+import os
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request, stream_with_context
+
+from serialization import ROW_FORMATS, dumps as dump_rows, rows_payload
+
+# Rows pulled from a server-side cursor per round trip when streaming
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 1000))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 10000))
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+class PageArgsError(ValueError):
+    """Raised when limit/after/stream query parameters are malformed."""
+
+
+def encode_cursor(values):
+    """Opaque token for the sort key of the last row on a page."""
+    raw = json.dumps(list(values), default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, key_count):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PageArgsError('Invalid after cursor')
+    if not isinstance(values, list) or len(values) != key_count:
+        raise PageArgsError('Invalid after cursor')
+    return values
+
+
+def parse_page_args(key_count):
+    """
+    Read the pagination parameters of the current request
+
+    Query args:
+        limit: Page size; without it the whole result is returned as before
+        after: Cursor from the X-Next-Cursor header of the previous page
+        stream: 'ndjson' or 'json' to stream the result in batches
+
+    Returns:
+        tuple: (limit or None, decoded after values or None, stream format or None)
+    """
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise PageArgsError('limit must be an integer')
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise PageArgsError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    after = request.args.get('after')
+    if after:
+        after = decode_cursor(after, key_count)
+    else:
+        after = None
+
+    stream = request.args.get('stream')
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise PageArgsError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+
+    return limit, after, stream
+
+
+def keyset_filter(key_columns, after, descending=False, nullable_keys=()):
+    """
+    WHERE condition for the rows sorting after a cursor
+
+    A row comparison such as (a, b) > (%s, %s) is never true for a row with a
+    NULL key, so nullable key columns are compared one at a time, following
+    PostgreSQL's ordering of NULLs: after every value ascending, before every
+    value descending. A NULL in the cursor changes the shape of the condition
+    rather than being passed as a parameter. Runs of NOT NULL columns keep the
+    row comparison, which an index on the key can serve.
+
+    Args:
+        key_columns (list): Sort key columns
+        after (list): Key values of the last row already returned, None for NULL
+        descending (bool): Whether the key is sorted descending
+        nullable_keys (list): Key columns that may hold NULL
+
+    Returns:
+        tuple: (condition with %s placeholders, parameters)
+    """
+    op = '<' if descending else '>'
+    column, value = key_columns[0], after[0]
+    if column not in nullable_keys and value is not None:
+        # Leading NOT NULL columns compare as one row
+        run = 1
+        while run < len(key_columns) and key_columns[run] not in nullable_keys and after[run] is not None:
+            run += 1
+        keys = ', '.join(key_columns[:run])
+        placeholders = ', '.join(['%s'] * run)
+        if run == len(key_columns):
+            return f'({keys}) {op} ({placeholders})', list(after)
+        rest, rest_params = keyset_filter(key_columns[run:], after[run:], descending, nullable_keys)
+        return (f'(({keys}) {op} ({placeholders}) OR (({keys}) = ({placeholders}) AND {rest}))',
+                list(after[:run]) * 2 + rest_params)
+
+    if value is None:
+        # Ascending nothing but another NULL follows a NULL; descending every value does
+        beyond, beyond_params = (f'{column} IS NOT NULL' if descending else 'FALSE'), []
+        same, same_params = f'{column} IS NULL', []
+    else:
+        beyond = f'{column} {op} %s' if descending else f'({column} {op} %s OR {column} IS NULL)'
+        beyond_params = [value]
+        same, same_params = f'{column} = %s', [value]
+    if len(key_columns) == 1:
+        return beyond, beyond_params
+    rest, rest_params = keyset_filter(key_columns[1:], after[1:], descending, nullable_keys)
+    return f'({beyond} OR ({same} AND {rest}))', beyond_params + same_params + rest_params
+
+
+def build_keyset_query(table_name, key_columns, columns=None, where=None, descending=False, after=None, limit=None,
+                       where_params=(), nullable_keys=()):
+    """
+    SELECT for one keyset page of a table
+
+    Table, column and filter names come from the report registry, never from
+    the request, so they are interpolated directly.
+
+    Args:
+        table_name (str): Table to read
+        key_columns (list): Columns the result is ordered by; together they must be unique
+        columns (list): Columns to return, all of them if None
+        where (str): Fixed SQL filter, never built from user input
+        descending (bool): Order by the key columns descending
+        after (list): Key values of the last row already returned
+        limit (int): Page size
+        where_params (tuple): Values for %s placeholders in where
+        nullable_keys (list): Key columns that may hold NULL, see keyset_filter
+
+    Returns:
+        tuple: (query with %s placeholders, parameters)
+    """
+    select_list = '*' if columns is None else ', '.join(columns)
+    direction = ' DESC' if descending else ''
+
+    filters = []
+    params = []
+    if where:
+        filters.append(f'({where})')
+        params.extend(where_params)
+    if after is not None:
+        condition, condition_params = keyset_filter(key_columns, after, descending, nullable_keys)
+        filters.append(f'({condition})')
+        params.extend(condition_params)
+
+    query = f'SELECT {select_list} FROM {table_name}'
+    if filters:
+        query += ' WHERE ' + ' AND '.join(filters)
+    query += ' ORDER BY ' + ', '.join(f'{col}{direction}' for col in key_columns)
+    if limit is not None:
+        query += ' LIMIT %s'
+        params.append(limit)
+    return query, params
+
+
+def page_response(rows, columns, key_columns, limit, row_format='records'):
+    """JSON response for one page, with the next cursor in the headers."""
+    if row_format == 'records':
+        response = current_app.json.response([dict(zip(columns, row)) for row in rows])
+    else:
+        response = Response(dump_rows(rows_payload(columns, rows, row_format)), mimetype=ROW_FORMATS[row_format])
+    if limit is not None and len(rows) == limit:
+        last = rows[-1]
+        token = encode_cursor(last[columns.index(col)] for col in key_columns)
+        args = request.args.to_dict()
+        args['after'] = token
+        response.headers['X-Next-Cursor'] = token
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
+
+
+def stream_response(conn, query, params, stream_format, batch_size=STREAM_BATCH_SIZE, row_format='records'):
+    """
+    Stream a query result from a server-side cursor
+
+    Rows are pulled batch_size at a time with fetchmany, so memory use stays
+    flat regardless of table size. 'ndjson' writes one object per line,
+    'json' writes a single array in chunks. With the 'rows' layout each row
+    is an array instead of an object: ndjson starts with a line holding the
+    column names and json is wrapped as {"columns": [...], "rows": [...]}.
+
+    conn must come from detach_db(): Flask tears the request down as soon as
+    the view returns, so the connection is returned to the pool only when
+    the response is closed.
+    """
+    compact = row_format != 'records'
+    if compact:
+        def dumps(row):
+            return dump_rows(row).decode()
+    else:
+        dumps = current_app.json.dumps
+
+    def generate():
+        # A named cursor keeps the result set on the server
+        with conn.cursor(name='stream_cursor') as cur:
+            cur.itersize = batch_size
+            cur.execute(query, params)
+            first = True
+            columns = None
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if columns is None:
+                    columns = [desc[0] for desc in cur.description]
+                    if stream_format == 'ndjson' and compact:
+                        yield dumps(columns) + '\n'
+                    elif stream_format == 'json':
+                        yield '{"columns":' + dumps(columns) + ',"rows":[' if compact else '['
+                if not rows:
+                    break
+                if not compact:
+                    rows = [dict(zip(columns, row)) for row in rows]
+                if stream_format == 'ndjson':
+                    yield ''.join(dumps(row) + '\n' for row in rows)
+                else:
+                    chunk = ','.join(dumps(row) for row in rows)
+                    yield chunk if first else ',' + chunk
+                first = False
+            if stream_format == 'json':
+                yield ']}' if compact else ']'
+        conn.rollback()
+
+    mimetype = STREAM_FORMATS[stream_format]
+    if compact and stream_format == 'json':
+        mimetype = ROW_FORMATS[row_format]
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.call_on_close(lambda: conn.pool.put(conn))
+    return response
@@ -0,0 +1,241 @@
+"""
+Upkeep of the monthly partitions of salesinvoice and transactionlog
+
+migrations/006_monthly_partitions.sql splits both tables into one
+partition per month. This script, run daily from cron, keeps them in
+shape:
+
+- creates the partitions for the next PARTITION_AHEAD months, so new rows
+  never land in the default partition (any that did are moved in);
+- detaches months older than the table's retention, writes each one to
+  ARCHIVE_DIR/<table>/<partition>.csv.gz and drops it once the file holds
+  every row.
+
+Reports therefore only scan the months still attached, and vacuum and
+index upkeep stay proportional to the retention window. An archived month
+can be put back with --restore; its rows were never taken out of the
+sales rollups, nor its invoice ids out of invoice_keys (007), so restoring
+does not touch either. A restored month
+older than the retention is archived again on the next run.
+
+Usage:
+    python partitions.py                          create upcoming months, archive expired ones
+    python partitions.py --dry-run                only show what would be done
+    python partitions.py --list                   show the partitions and their row counts
+    python partitions.py --restore salesinvoice 2023-04
+"""
+import argparse
+import gzip
+import os
+import re
+import sys
+from datetime import date
+
+import psycopg2
+
+from db import DB_CONFIG
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+# Months created ahead of the current one
+PARTITION_AHEAD = int(os.environ.get('PARTITION_AHEAD', 3))
+# Seconds to wait for the lock a detach needs before giving up until the next run
+PARTITION_LOCK_TIMEOUT = int(os.environ.get('PARTITION_LOCK_TIMEOUT', 10))
+
+# Table -> months kept attached, the current one included
+RETENTION_MONTHS = {
+    'salesinvoice': int(os.environ.get('SALESINVOICE_RETENTION_MONTHS', 36)),
+    'transactionlog': int(os.environ.get('TRANSACTIONLOG_RETENTION_MONTHS', 12)),
+}
+
+
+def add_months(day, months):
+    """First day of the month months after day's month."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def partition_month(table, name):
+    """Month of a partition name, or None for the default partition and other tables."""
+    match = re.fullmatch(re.escape(table) + r'_p(\d{4})_(\d{2})', name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def list_partitions(conn, table):
+    """
+    Monthly partitions of a table, oldest first
+
+    Tables named like a partition but no longer attached (a month whose
+    archival was interrupted) are included with attached=False.
+
+    Returns:
+        list: (name, month, attached) tuples
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, i.inhparent IS NOT NULL
+            FROM pg_class c
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = %s::regclass
+            WHERE c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace AND c.relname LIKE %s
+        """, (table, table + r'\_p%'))
+        partitions = [(name, partition_month(table, name), attached) for name, attached in cur.fetchall()]
+    conn.rollback()
+    return sorted((p for p in partitions if p[1] is not None), key=lambda p: p[1])
+
+
+def create_upcoming(conn, table, ahead=PARTITION_AHEAD, today=None, dry_run=False):
+    """Create the partitions from this month to ahead months out; returns the names created."""
+    month = add_months(today or date.today(), 0)
+    existing = {name for name, _, _ in list_partitions(conn, table)}
+    created = []
+    for offset in range(ahead + 1):
+        name = partition_name(table, add_months(month, offset))
+        if name in existing:
+            continue
+        if not dry_run:
+            with conn.cursor() as cur:
+                cur.execute('SELECT create_month_partition(%s, %s)', (table, add_months(month, offset)))
+            conn.commit()
+        created.append(name)
+    return created
+
+
+def archive_file(table, name, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, table, f'{name}.csv.gz')
+
+
+def archive_partition(conn, table, name, attached, archive_dir=ARCHIVE_DIR):
+    """
+    Detach one partition, write it to a gzip CSV file and drop it
+
+    Each step commits on its own, so an interrupted run leaves either an
+    attached partition or a detached table that the next run archives.
+
+    Returns:
+        int: Rows archived
+    """
+    if attached:
+        with conn.cursor() as cur:
+            # Detaching waits for every query on the parent; don't queue the tills up behind it
+            cur.execute('SET LOCAL lock_timeout = %s', (f'{PARTITION_LOCK_TIMEOUT}s',))
+            cur.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+        conn.commit()
+
+    path = archive_file(table, name, archive_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT count(*) FROM {name}')
+        expected = cur.fetchone()[0]
+        with gzip.open(path + '.tmp', 'wb') as out:
+            cur.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', out)
+            written = cur.rowcount
+        if written != expected:
+            raise RuntimeError(f'{name}: wrote {written} of {expected} rows to the archive, keeping the table')
+        with open(path + '.tmp', 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        cur.execute(f'DROP TABLE {name}')
+    conn.commit()
+    return written
+
+
+def archive_expired(conn, table, retention=None, today=None, archive_dir=ARCHIVE_DIR, dry_run=False):
+    """Archive every partition of table older than its retention; returns {name: rows}."""
+    retention = RETENTION_MONTHS[table] if retention is None else retention
+    oldest_kept = add_months(today or date.today(), 1 - retention)
+    archived = {}
+    for name, month, attached in list_partitions(conn, table):
+        if month >= oldest_kept:
+            continue
+        archived[name] = None if dry_run else archive_partition(conn, table, name, attached, archive_dir)
+    return archived
+
+
+def restore_partition(conn, table, month, archive_dir=ARCHIVE_DIR):
+    """
+    Load an archived month back and attach it
+
+    The rows are copied into a standalone table that is then attached, so
+    no row triggers fire and the rollups, which still count them, stay right.
+
+    Returns:
+        int: Rows restored
+    """
+    name = partition_name(table, month)
+    path = archive_file(table, name, archive_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No archive of {name} at {path}')
+    with conn.cursor() as cur:
+        cur.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        with gzip.open(path, 'rb') as source:
+            cur.copy_expert(f'COPY {name} FROM STDIN WITH (FORMAT csv, HEADER)', source)
+            restored = cur.rowcount
+        cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                    (month, add_months(month, 1)))
+    conn.commit()
+    return restored
+
+
+def show(conn):
+    for table in RETENTION_MONTHS:
+        print(f'{table} (keeps {RETENTION_MONTHS[table]} months):')
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT tableoid::regclass::text, count(*) FROM {table} GROUP BY 1
+            """)
+            counts = dict(cur.fetchall())
+        conn.rollback()
+        for name, month, attached in list_partitions(conn, table):
+            print(f"  {name}  {counts.get(name, 0) if attached else 'detached, not yet archived'}")
+        print(f"  {table}_default  {counts.get(table + '_default', 0)}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', nargs='+', choices=list(RETENTION_MONTHS), default=list(RETENTION_MONTHS))
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--list', action='store_true', help='Show partitions and row counts')
+    parser.add_argument('--restore', nargs=2, metavar=('TABLE', 'YYYY-MM'), help='Attach an archived month again')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.list:
+            show(conn)
+            return 0
+        if args.restore:
+            table, month = args.restore
+            if table not in RETENTION_MONTHS:
+                parser.error(f'--restore table must be one of: {", ".join(RETENTION_MONTHS)}')
+            try:
+                month = date.fromisoformat(month + '-01')
+            except ValueError:
+                parser.error('--restore month must be YYYY-MM')
+            rows = restore_partition(conn, table, month, args.archive_dir)
+            print(f'{partition_name(table, month)}: restored {rows} rows')
+            return 0
+
+        status = 0
+        for table in args.tables:
+            for name in create_upcoming(conn, table, dry_run=args.dry_run):
+                print(f'{name}: {"would be " if args.dry_run else ""}created')
+            try:
+                archived = archive_expired(conn, table, archive_dir=args.archive_dir, dry_run=args.dry_run)
+            except (psycopg2.Error, RuntimeError, OSError) as e:
+                conn.rollback()
+                print(f"❌ Archiving {table} stopped:", e)
+                status = 1
+                continue
+            for name, rows in archived.items():
+                print(f'{name}: would be archived' if args.dry_run else f'{name}: archived {rows} rows')
+        return status
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,598 @@
+"""
+Declarative registry of the read-only report routes
+
+Each report is declared once in REPORTS with its SQL, the parameters it
+takes from the query string and its cache policy. register_reports()
+generates the Flask routes from it and asgi_app.py generates the async
+ones, so the two serving modes cannot drift apart.
+
+On the Flask side every query runs as a server-side prepared statement:
+the first call on a pooled connection PREPAREs it, later calls only
+EXECUTE, so the plan is reused for the life of the connection. Cursors
+are always closed. Reports read through get_read_db(), so they run on a
+read replica when DB_REPLICA_HOSTS is set.
+
+/reports/batch runs several reports in one request, concurrently on
+separate pooled connections, so a dashboard waits for its slowest report
+rather than the sum of them.
+"""
+import hashlib
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import psycopg2
+from flask import Response, jsonify, request
+
+from cache import cached
+from db import REPLICA_HOSTS, PoolTimeout, detach_db, get_pool, get_read_db, get_router
+from instrumentation import SLOW_QUERY_EXPLAIN, SLOW_QUERY_MS, instrumentation
+from pagination import (MAX_PAGE_SIZE, PageArgsError, build_keyset_query, encode_cursor, page_response,
+                        parse_page_args, stream_response)
+from reports import ReportArgsError, month_bounds, parse_date, parse_int, parse_range
+from serialization import ROW_FORMATS, RowFormatError, dumps, parse_row_format, rows_payload
+
+# Reports accepted per /reports/batch request, and connections one request runs them on at once
+BATCH_MAX_REPORTS = int(os.environ.get('BATCH_MAX_REPORTS', 20))
+BATCH_PARALLELISM = int(os.environ.get('BATCH_PARALLELISM', 4))
+# Rows a list report returns inside a batch unless the request gives its own limit
+BATCH_LIST_LIMIT = int(os.environ.get('BATCH_LIST_LIMIT', 1000))
+
+
+def to_numbered(query):
+    """Rewrite %s placeholders as $1, $2, ... for PREPARE and asyncpg."""
+    parts = query.replace('%%', '\0').split('%s')
+    numbered = parts[0]
+    for index, part in enumerate(parts[1:], start=1):
+        numbered += f'${index}' + part
+    return numbered.replace('\0', '%')
+
+
+def explain(conn, statement, params):
+    """EXPLAIN (ANALYZE, BUFFERS) plan of a statement, for the slow query log."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute('EXPLAIN (ANALYZE, BUFFERS) ' + statement, params)
+            return '\n'.join(row[0] for row in cur.fetchall())
+    except psycopg2.Error as e:
+        conn.rollback()
+        return f'EXPLAIN failed: {e}'
+
+
+def execute_prepared(conn, query, params=()):
+    """
+    Run a query as a prepared statement on this connection
+
+    Execute and fetch time and the row count are charged to the current
+    request; queries over SLOW_QUERY_MS are logged with their plan.
+
+    Returns:
+        tuple: (column names, rows)
+    """
+    name = 'report_' + hashlib.md5(query.encode()).hexdigest()[:16]
+    if params:
+        statement = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+    else:
+        statement = f'EXECUTE {name}'
+    try:
+        with conn.cursor() as cur:
+            if name not in conn.prepared:
+                cur.execute(f'PREPARE {name} AS {to_numbered(query)}')
+                conn.prepared.add(name)
+            started = time.perf_counter()
+            cur.execute(statement, params)
+            executed = time.perf_counter()
+            columns = [desc[0] for desc in cur.description]
+            rows = cur.fetchall()
+            fetched = time.perf_counter()
+    except psycopg2.Error:
+        # A schema change can invalidate a cached plan; start over on this connection
+        try:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute('DEALLOCATE ALL')
+        except psycopg2.Error:
+            pass
+        conn.prepared.clear()
+        raise
+
+    instrumentation.add('db_execute', executed - started)
+    instrumentation.add('db_fetch', fetched - executed, rows=len(rows))
+    if (fetched - started) * 1000 >= SLOW_QUERY_MS:
+        plan = explain(conn, statement, params) if SLOW_QUERY_EXPLAIN else None
+        instrumentation.record_slow_query(query, params, fetched - started, plan)
+    return columns, rows
+
+
+# Query string parameters. Each returns the values for the report's %s placeholders.
+
+def day_param(params):
+    """?date=YYYY-MM-DD, default today, as a half-open [day, day + 1) range."""
+    day = parse_date(params['date'], 'date') if params.get('date') else date.today()
+    return day, day + timedelta(days=1)
+
+
+def range_param(default_range):
+    """?from=&to= as a half-open range; default_range(today) gives the default (first, last) days."""
+    def param(params):
+        start, end = parse_range(params, *default_range(date.today()))
+        return start, end + timedelta(days=1)
+    return param
+
+
+def date_window(column, params):
+    """
+    Optional ?from=&to= days as half-open conditions on column
+
+    Compared with the bare column, so on a table partitioned by it only the
+    months in range are scanned.
+
+    Returns:
+        tuple: (list of SQL conditions, their values)
+    """
+    conditions, values = [], []
+    start = parse_date(params['from'], 'from') if params.get('from') else None
+    end = parse_date(params['to'], 'to') if params.get('to') else None
+    if start and end and start > end:
+        raise ReportArgsError('from must not be after to')
+    if start:
+        conditions.append(f'{column} >= %s')
+        values.append(start)
+    if end:
+        conditions.append(f'{column} < %s')
+        values.append(end + timedelta(days=1))
+    return conditions, tuple(values)
+
+
+def window_top_param(default_days, default_top, max_days=3660, max_top=100):
+    """?days= window ending today (first day included) and ?top= row limit."""
+    def param(params):
+        days = parse_int(params, 'days', default_days, 1, max_days)
+        top = parse_int(params, 'top', default_top, 1, max_top)
+        return date.today() - timedelta(days=days), top
+    return param
+
+
+class Report:
+    """
+    A read-only route
+
+    Args:
+        path (str): URL rule, also used as the endpoint name
+        params (callable): Maps request args to query parameters; may raise ReportArgsError
+        cache_tables (list): Tables whose writes invalidate the cached response; None disables caching
+        cache_ttl (int): Seconds a cached response is served for
+    """
+
+    def __init__(self, path, params=None, cache_tables=None, cache_ttl=60):
+        self.path = path
+        self.name = path.strip('/').replace('/', '_')
+        self.params = params
+        self.cache_tables = cache_tables
+        self.cache_ttl = cache_ttl
+
+    def query_args(self, args):
+        return tuple(self.params(args)) if self.params else ()
+
+    def base_query(self, args):
+        """(query, parameters) without pagination, as served by the async app."""
+        raise NotImplementedError
+
+    def batch_query(self, args):
+        """(query, parameters, limit or None) when run inside /reports/batch."""
+        query, params = self.base_query(args)
+        return query, params, None
+
+    def respond(self):
+        raise NotImplementedError
+
+
+class ListReport(Report):
+    """
+    Rows of one table, served with keyset pagination and streaming
+
+    Args:
+        table (str): Table to read
+        key_columns (list): Unique sort key, also used as the pagination cursor
+        columns (list): Columns to return, all of them if None
+        where (str): Fixed SQL filter with %s placeholders filled by params
+        descending (bool): Sort newest/largest first
+        date_column (str): Column that optional ?from=&to= days filter on
+        nullable_keys (list): Key columns that may hold NULL; paging then handles their NULL rows
+    """
+
+    def __init__(self, path, table, key_columns, columns=None, where=None, descending=False, date_column=None,
+                 nullable_keys=(), **kwargs):
+        super().__init__(path, **kwargs)
+        self.table = table
+        self.key_columns = key_columns
+        self.columns = columns
+        self.where = where
+        self.descending = descending
+        self.date_column = date_column
+        self.nullable_keys = nullable_keys
+
+    def build(self, args, after=None, limit=None):
+        where, where_params = self.where, self.query_args(args)
+        if self.date_column:
+            window, window_params = date_window(self.date_column, args)
+            if window:
+                where = ' AND '.join(([f'({where})'] if where else []) + window)
+                where_params += window_params
+        return build_keyset_query(self.table, self.key_columns, self.columns, where, self.descending,
+                                  after, limit, where_params, self.nullable_keys)
+
+    def base_query(self, args):
+        return self.build(args)
+
+    def batch_query(self, args):
+        # Whole tables are too much for a dashboard; the next page comes from the report's own route
+        limit = parse_int(args, 'limit', BATCH_LIST_LIMIT, 1, MAX_PAGE_SIZE)
+        query, params = self.build(args, limit=limit)
+        return query, params, limit
+
+    def respond(self):
+        try:
+            limit, after, stream = parse_page_args(len(self.key_columns))
+            row_format = parse_row_format(request.args, request.headers.get('Accept'))
+            if stream and row_format == 'columns':
+                raise RowFormatError("The columns format cannot be streamed; use format=rows")
+            query, params = self.build(request.args, after, limit)
+        except (PageArgsError, ReportArgsError, RowFormatError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            if stream:
+                return stream_response(detach_db(read=True), query, params, stream, row_format=row_format)
+            columns, rows = execute_prepared(get_read_db(), query, params)
+            with instrumentation.phase('serialize'):
+                return page_response(rows, columns, self.key_columns, limit, row_format)
+        except Exception as e:
+            print(f"❌ DB fetch error in {self.table}:", e)
+            return jsonify({"error": str(e)}), 500
+
+
+class QueryReport(Report):
+    """
+    A fixed report query returned as one JSON array
+
+    Args:
+        sql (str): Query with %s placeholders filled by params
+    """
+
+    def __init__(self, path, sql, **kwargs):
+        super().__init__(path, **kwargs)
+        self.sql = sql
+
+    def base_query(self, args):
+        return self.sql, self.query_args(args)
+
+    def respond(self):
+        try:
+            query, params = self.base_query(request.args)
+            row_format = parse_row_format(request.args, request.headers.get('Accept'))
+        except (ReportArgsError, RowFormatError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            columns, rows = execute_prepared(get_read_db(), query, params)
+            with instrumentation.phase('serialize'):
+                if row_format != 'records':
+                    return Response(dumps(rows_payload(columns, rows, row_format)), mimetype=ROW_FORMATS[row_format])
+                return jsonify([dict(zip(columns, row)) for row in rows])
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+
+REPORTS = [
+    ListReport('/get_products', 'product', ['productid'],
+               columns=["productid", "name", "description", "price", "stockquantity", "expirydate",
+                        "reorderlevel", "categoryid", "supplierid"],
+               cache_tables=['product'], cache_ttl=60),
+    ListReport('/get_instock_products', 'product', ['productid'], where='stockquantity > 0'),
+    ListReport('/get_products_by_category', 'product', ['categoryid', 'productid'], nullable_keys=['categoryid'],
+               cache_tables=['product'], cache_ttl=60),
+    ListReport('/get_all_sales', 'salesinvoice', ['customerid', 'invoiceid'], date_column='invoicedate',
+               nullable_keys=['customerid']),
+    ListReport('/get_all_sales_today', 'salesinvoice', ['invoiceid'],
+               where='invoicedate >= %s AND invoicedate < %s', params=day_param),
+    QueryReport('/product_highest_sales_week', """
+        SELECT product.productid, product.name, sum(r.linetotal) FROM product
+        JOIN product_sales_daily r ON r.productid = product.productid
+        GROUP BY product.productid
+        ORDER BY sum(r.linetotal) DESC
+    """),
+    QueryReport('/product_highest_sales_5', """
+        SELECT product.productid as id, product.name, product.categoryid as category, supplierid as sid,
+               sum(r.quantity)::bigint as sum
+        FROM product
+        JOIN product_sales_daily r ON product.productid = r.productid
+        GROUP BY product.productid
+        ORDER BY sum(r.quantity) DESC
+        LIMIT 5
+    """),
+    ListReport('/sales_return', 'returns', ['returnid']),
+    ListReport('/list_employees', 'employee', ['employeeid'], cache_tables=['employee'], cache_ttl=300),
+    QueryReport('/best_employees', """
+        select employee.employeeid, employee.name, sum(r.invoices)::bigint as sales_made, sum(r.totalamount)
+        from employee_sales_daily r
+        join employee on employee.employeeid = r.employeeid
+        group by employee.employeeid
+        order by sum(r.totalamount) desc
+    """),
+    QueryReport('/best_employee_today', """
+        select employeeid, count(invoiceid) from salesinvoice
+        where invoicedate >= %s and invoicedate < %s
+        group by employeeid order by count(invoiceid) desc
+    """, params=day_param),
+    ListReport('/list_customers', 'customer', ['customerid']),
+    QueryReport('/list_customers_expenditure', """
+        select customer.customerid, customer.name, sum(r.invoices)::bigint as totalpurchases,
+               sum(r.totalamount) as totalspent
+        from customer
+        join customer_sales_daily r on customer.customerid = r.customerid
+        group by customer.customerid
+        order by sum(r.totalamount) desc
+    """),
+    QueryReport('/list_customers_expenditure_6', """
+        select customer.customerid, customer.name, sum(r.invoices)::bigint as totalpurchases,
+               sum(r.totalamount) as totalspent
+        from customer
+        join customer_sales_daily r on customer.customerid = r.customerid
+        where r.salesdate >= %s and r.salesdate < %s
+        group by customer.customerid
+        order by sum(r.totalamount) desc limit 5
+    """, params=range_param(lambda today: (month_bounds(today, 5)[0], today))),
+    QueryReport('/inventory_spend_month', """
+        select sum(totalamount) from purchaseorder
+        where orderdate >= %s and orderdate < %s
+    """, params=range_param(lambda today: month_bounds(today))),
+    QueryReport('/revenue_last_month', """
+        select sum(totalamount) as totalrevenue from salesinvoice
+        where invoicedate >= %s and invoicedate < %s
+    """, params=range_param(lambda today: month_bounds(today, 1))),
+    ListReport('/highest_purchase', 'purchaseorder', ['totalamount', 'orderid'], descending=True,
+               nullable_keys=['totalamount']),
+    ListReport('/transactionlog', 'transactionlog', ['logid'], date_column='"timestamp"'),
+    ListReport('/feedback', 'feedback', ['feedbackid'], cache_tables=['feedback'], cache_ttl=120),
+    ListReport('/complaints', 'complaints', ['complaintid'], cache_tables=['complaints'], cache_ttl=120),
+    ListReport('/list_vendors', 'supplier', ['supplierid'], cache_tables=['supplier'], cache_ttl=300),
+    # Distinct products each supplier sold in the last ?days= (default a year), top ?top= suppliers
+    QueryReport('/list_unique_vendors', """
+        SELECT s.supplierid, s.name, count(DISTINCT r.productid) AS uniqueproductssold
+        FROM product_sales_daily r
+        JOIN product p ON p.productid = r.productid
+        JOIN supplier s ON s.supplierid = p.supplierid
+        WHERE r.salesdate >= %s
+        GROUP BY s.supplierid, s.name
+        ORDER BY uniqueproductssold DESC, s.supplierid
+        LIMIT %s
+    """, params=window_top_param(365, 3), cache_tables=['supplier', 'product'], cache_ttl=300),
+]
+
+REPORTS_BY_NAME = {report.name: report for report in REPORTS}
+
+
+class BatchError(ValueError):
+    """Raised when a /reports/batch request is malformed."""
+
+
+_batch_executor = ThreadPoolExecutor(max_workers=max(BATCH_PARALLELISM - 1, 1) * 8, thread_name_prefix='report-batch')
+
+
+def parse_batch(entries):
+    """
+    Validate the reports of a batch request
+
+    Args:
+        entries (list): {'name': report name, 'key': result key (default the name), 'params': query args}
+
+    Returns:
+        tuple: (list of (key, report, query, params, limit), {key: error} for reports with bad parameters)
+    """
+    if not isinstance(entries, list) or not entries:
+        raise BatchError('reports must be a non-empty list')
+    if len(entries) > BATCH_MAX_REPORTS:
+        raise BatchError(f'At most {BATCH_MAX_REPORTS} reports can be run per batch')
+    tasks, errors, keys = [], {}, set()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'name': entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get('name'), str):
+            raise BatchError('Each report must be a name or an object with a name')
+        report = REPORTS_BY_NAME.get(entry['name'])
+        if report is None:
+            raise BatchError(f"Unknown report: {entry['name']}")
+        key = str(entry.get('key', entry['name']))
+        if key in keys:
+            raise BatchError(f'Duplicate report key: {key}; give repeated reports distinct keys')
+        keys.add(key)
+        params = entry.get('params') or {}
+        if not isinstance(params, dict):
+            raise BatchError(f'params of {key} must be an object')
+        try:
+            # Query strings arrive as text; JSON numbers are accepted the same way
+            query, query_params, limit = report.batch_query({name: str(value) for name, value in params.items()})
+        except ReportArgsError as e:
+            errors[key] = {'error': str(e), 'status': 400}
+            continue
+        tasks.append((key, report, query, query_params, limit))
+    return tasks, errors
+
+
+def _begin_snapshot(conn, snapshot=None):
+    """Open a read-only REPEATABLE READ transaction, sharing snapshot if given; returns its snapshot id."""
+    with conn.cursor() as cur:
+        cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        if snapshot is None:
+            cur.execute('SELECT pg_export_snapshot()')
+            return cur.fetchone()[0]
+        cur.execute('SET TRANSACTION SNAPSHOT %s', (snapshot,))
+        return snapshot
+
+
+def _batch_connections(count, consistent):
+    """
+    Up to count connections for a batch, at least one
+
+    Only the first waits for the pool; the rest are taken if free right now,
+    so a busy process runs the batch on fewer connections instead of
+    queueing behind other requests. Consistent batches use the primary,
+    where the first connection's snapshot is imported by the others.
+    """
+    conns = []
+    try:
+        if consistent:
+            pool = get_pool()
+            conns.append(pool.get())
+            snapshot = _begin_snapshot(conns[0])
+            for _ in range(count - 1):
+                try:
+                    conn = pool.get(timeout=0)
+                except PoolTimeout:
+                    break
+                conns.append(conn)
+                _begin_snapshot(conn, snapshot)
+            return conns, snapshot
+        for index in range(count):
+            conn = get_router().get() if REPLICA_HOSTS else None
+            if conn is None:
+                try:
+                    conn = get_pool().get(timeout=None if index == 0 else 0)
+                except PoolTimeout:
+                    if index == 0:
+                        raise
+                    break
+            conns.append(conn)
+        return conns, None
+    except Exception:
+        for conn in conns:
+            conn.pool.put(conn)
+        raise
+
+
+def run_batch(tasks, consistent=False):
+    """
+    Run batch tasks concurrently, one lane per connection
+
+    Returns:
+        dict: key -> (columns, rows) or {'error': ..., 'status': ...}
+    """
+    results = {}
+    if not tasks:
+        return results
+    conns, snapshot = _batch_connections(min(len(tasks), BATCH_PARALLELISM), consistent)
+    pending = queue.SimpleQueue()
+    for task in tasks:
+        pending.put(task)
+
+    def lane(conn):
+        while True:
+            try:
+                key, report, query, params, _ = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[key] = execute_prepared(conn, query, params)
+            except psycopg2.Error as e:
+                print(f"❌ DB fetch error in batch report {report.name}:", e)
+                results[key] = {'error': str(e), 'status': 500}
+                if snapshot is not None:
+                    # Rejoin the batch's snapshot; it is gone if this was the connection that exported it
+                    conn.rollback()
+                    try:
+                        _begin_snapshot(conn, snapshot)
+                    except psycopg2.Error:
+                        conn.rollback()
+                        return
+
+    try:
+        # The request thread works one lane itself, its queries charged by execute_prepared
+        futures = [_batch_executor.submit(lane, conn) for conn in conns[1:]]
+        lane(conns[0])
+        with instrumentation.phase('db_execute'):
+            for future in futures:
+                future.result()
+    finally:
+        for conn in reversed(conns):
+            conn.rollback()
+            conn.pool.put(conn)
+    while True:
+        try:
+            key, *_ = pending.get_nowait()
+        except queue.Empty:
+            return results
+        results[key] = {'error': 'Not run: the batch snapshot was lost to an earlier error', 'status': 503}
+
+
+def batch_respond():
+    """
+    Several reports in one response
+
+    GET /reports/batch?reports=best_employees,revenue_last_month&days=30
+        runs the named reports, each with the remaining query args
+    POST /reports/batch {"reports": [{"name": ..., "key": ..., "params": {...}}, ...],
+                         "consistent": false, "format": "records"}
+
+    Reports run concurrently on up to BATCH_PARALLELISM pooled connections
+    (replicas when configured). With consistent, they run on the primary
+    in one shared REPEATABLE READ snapshot, so every result reflects the
+    same moment. List reports return their first page; 'cursors' holds the
+    after= cursor for the rest on the report's own route.
+    """
+    try:
+        if request.method == 'POST':
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                raise BatchError('Body must be a JSON object with a reports list')
+            entries = body.get('reports')
+            consistent = bool(body.get('consistent'))
+            row_format = parse_row_format({'format': body['format']} if body.get('format') else {},
+                                          request.headers.get('Accept'))
+        else:
+            shared = {name: value for name, value in request.args.items()
+                      if name not in ('reports', 'consistent', 'format')}
+            entries = [{'name': name.strip(), 'params': shared}
+                       for name in request.args.get('reports', '').split(',') if name.strip()]
+            consistent = request.args.get('consistent') in ('1', 'true')
+            row_format = parse_row_format(request.args, request.headers.get('Accept'))
+        tasks, errors = parse_batch(entries)
+    except (BatchError, RowFormatError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        outcomes = run_batch(tasks, consistent)
+    except Exception as e:
+        print("❌ Batch report error:", e)
+        return jsonify({"error": str(e)}), 500
+
+    with instrumentation.phase('serialize'):
+        results, cursors = {}, {}
+        for key, report, _, _, limit in tasks:
+            outcome = outcomes[key]
+            if isinstance(outcome, dict):
+                errors[key] = outcome
+                continue
+            columns, rows = outcome
+            if row_format == 'records':
+                results[key] = [dict(zip(columns, row)) for row in rows]
+            else:
+                results[key] = rows_payload(columns, rows, row_format)
+            if limit is not None and len(rows) == limit:
+                cursors[key] = encode_cursor(rows[-1][columns.index(col)] for col in report.key_columns)
+        payload = {'results': results, 'errors': errors, 'cursors': cursors, 'consistent': consistent}
+        if row_format == 'records':
+            return jsonify(payload)
+        return Response(dumps(payload), mimetype='application/json')
+
+
+def register_reports(app, reports=REPORTS):
+    """Add a GET route to the Flask app for every declared report, and /reports/batch."""
+    for report in reports:
+        view = report.respond
+        if report.cache_tables:
+            view = cached(tables=report.cache_tables, ttl=report.cache_ttl)(view)
+        app.add_url_rule(report.path, report.name, view, methods=['GET'])
+    app.add_url_rule('/reports/batch', 'reports_batch', batch_respond, methods=['GET', 'POST'])
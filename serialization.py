@@ -0,0 +1,88 @@
+"""
+Compact JSON layouts for report rows
+
+The default 'records' layout is the array of objects the UI has always
+received. Two compact layouts are built straight from the cursor tuples,
+without a dict per row:
+
+    rows:     {"columns": ["productid", "name"], "rows": [[1, "Milk"], [2, "Bread"]]}
+    columns:  {"productid": [1, 2], "name": ["Milk", "Bread"]}
+
+They are selected with ?format=rows|columns or by asking for their media
+type in the Accept header, and are encoded with orjson when it is
+installed. Dates come out as ISO 8601 strings and Decimals as strings, so
+no precision is lost.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+ROW_FORMATS = {
+    'records': 'application/json',
+    'rows': 'application/vnd.store.rows+json',
+    'columns': 'application/vnd.store.columns+json',
+}
+
+
+class RowFormatError(ValueError):
+    """Raised when ?format= names an unknown layout."""
+
+
+def parse_row_format(args, accept=None):
+    """
+    Layout requested by the client
+
+    Args:
+        args: Query parameters; 'format' wins over the Accept header
+        accept (str): Raw Accept header
+
+    Returns:
+        str: Key of ROW_FORMATS
+    """
+    row_format = args.get('format')
+    if row_format:
+        if row_format not in ROW_FORMATS:
+            raise RowFormatError(f"format must be one of: {', '.join(ROW_FORMATS)}")
+        return row_format
+    if accept:
+        # application/json is listed first, so */* keeps the records layout
+        match = parse_accept_header(accept, MIMEAccept).best_match(list(ROW_FORMATS.values()))
+        for name, mimetype in ROW_FORMATS.items():
+            if mimetype == match:
+                return name
+    return 'records'
+
+
+def _default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, UUID):
+        return str(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """Encode to JSON bytes with orjson, or the standard library without it."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+
+def rows_payload(columns, rows, row_format):
+    """Compact layout of a result set; rows are the cursor tuples as fetched."""
+    if row_format == 'columns':
+        if not rows:
+            return {column: [] for column in columns}
+        return dict(zip(columns, map(list, zip(*rows))))
+    return {'columns': columns, 'rows': rows}
@@ -0,0 +1,217 @@
+"""
+Low-stock alerts pushed from PostgreSQL
+
+The product_stock_notify trigger (migrations/003_low_stock_notify.sql)
+sends a NOTIFY whenever a product's stock crosses its reorder level. One
+background thread per process LISTENs on that channel with its own
+connection, keeps an in-memory index of the products that are currently
+low, and fans each change out to the subscribed Server-Sent Events
+streams. Reading the low-stock list or following the stream never
+touches the database.
+
+The listener starts on first use, so it runs in whichever process serves
+the requests rather than in a parent that forks them.
+
+Each open event stream occupies a server thread for as long as the browser
+keeps it, so a process accepts at most SSE_MAX_SUBSCRIBERS streams and
+turns further ones away, leaving threads for the other routes.
+"""
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+
+from db import DB_CONFIG
+
+STOCK_CHANNEL = 'product_stock'
+# Seconds between keep-alive comments on idle event streams
+SSE_KEEPALIVE = float(os.environ.get('SSE_KEEPALIVE', 15))
+# Events buffered per subscriber; a browser that falls this far behind is disconnected
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 1000))
+# Event streams open at once in one process; gunicorn.conf.py sizes it from WEB_THREADS
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', 2))
+# Seconds a turned-away browser is told to wait before reconnecting
+SSE_RETRY_AFTER = int(os.environ.get('SSE_RETRY_AFTER', 30))
+LISTEN_RECONNECT_MAX = 30
+
+LOW_STOCK_QUERY = """
+    SELECT productid, name, stockquantity, reorderlevel FROM product
+    WHERE stockquantity < coalesce(reorderlevel, 0)
+    ORDER BY productid
+"""
+
+
+class SubscriberLimitError(RuntimeError):
+    """Raised when SSE_MAX_SUBSCRIBERS event streams are already open."""
+
+
+def format_event(event, data, event_id=None):
+    """One Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class StockAlerts:
+    """
+    LISTEN loop, low-stock index and subscriber fan-out
+
+    Events passed to subscribers are dicts with a 'type' of 'snapshot'
+    (the full low-stock list, sent on subscribe and after a reconnect) or
+    'stock' (one product changed), and a sequence number 'id'.
+    """
+
+    def __init__(self, dsn=None):
+        self.dsn = dsn or DB_CONFIG
+        self._lock = threading.Lock()
+        self._low = {}  # productid -> product dict
+        self._subscribers = set()
+        self._thread = None
+        self._ready = threading.Event()
+        self._sequence = 0
+        self.stats = {'notifications': 0, 'reconnects': 0, 'dropped_subscribers': 0, 'rejected_subscribers': 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stock-alerts', daemon=True)
+                self._thread.start()
+
+    def wait_ready(self, timeout=5):
+        """Start the listener if needed and wait for the first snapshot."""
+        self.start()
+        return self._ready.wait(timeout)
+
+    def low_stock(self):
+        with self._lock:
+            return [self._low[productid] for productid in sorted(self._low)]
+
+    def subscribe(self, limit=None):
+        """
+        Queue receiving every event from now on, starting with a snapshot
+
+        Raises:
+            SubscriberLimitError: limit (default SSE_MAX_SUBSCRIBERS) subscribers are already attached
+        """
+        limit = SSE_MAX_SUBSCRIBERS if limit is None else limit
+        subscriber = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= limit:
+                self.stats['rejected_subscribers'] += 1
+                raise SubscriberLimitError(f'{limit} stock event streams are already open on this server, '
+                                           'try again later')
+            self._sequence += 1
+            subscriber.put({'type': 'snapshot', 'id': self._sequence,
+                            'products': [self._low[productid] for productid in sorted(self._low)]})
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, subscribers=len(self._subscribers), low_stock_products=len(self._low))
+
+    def _publish(self, event):
+        # Called with the lock held
+        self._sequence += 1
+        event['id'] = self._sequence
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A None tells the stream to end; the browser reconnects and gets a fresh snapshot
+                self._subscribers.discard(subscriber)
+                self.stats['dropped_subscribers'] += 1
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _load_snapshot(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(LOW_STOCK_QUERY)
+            columns = [desc[0] for desc in cur.description]
+            low = {row[0]: dict(zip(columns, row)) for row in cur.fetchall()}
+        with self._lock:
+            self._low = low
+            self._publish({'type': 'snapshot', 'products': [low[productid] for productid in sorted(low)]})
+        self._ready.set()
+
+    def _handle(self, payload):
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            print("❌ Malformed stock notification:", payload)
+            return
+        product = {key: change.get(key) for key in ('productid', 'name', 'stockquantity', 'reorderlevel')}
+        with self._lock:
+            self.stats['notifications'] += 1
+            if change.get('low') and change.get('op') != 'delete':
+                self._low[product['productid']] = product
+            else:
+                self._low.pop(product['productid'], None)
+            self._publish({'type': 'stock', 'low': bool(change.get('low')), 'op': change.get('op'),
+                           'product': product})
+
+    def _listen(self):
+        conn = psycopg2.connect(**self.dsn)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN {STOCK_CHANNEL}')
+            # Snapshot after LISTEN, so no change can fall between the two
+            self._load_snapshot(conn)
+            while True:
+                if select.select([conn], [], [], SSE_KEEPALIVE) == ([], [], []):
+                    # Idle: make sure the connection is still alive
+                    with conn.cursor() as cur:
+                        cur.execute('SELECT 1')
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._handle(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def _run(self):
+        delay = 1
+        while True:
+            started = time.monotonic()
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError) as e:
+                print("❌ Stock alert listener error:", e)
+            with self._lock:
+                self.stats['reconnects'] += 1
+            # Back off while the database stays unreachable, reset after a healthy run
+            delay = 1 if time.monotonic() - started > LISTEN_RECONNECT_MAX else min(delay * 2, LISTEN_RECONNECT_MAX)
+            time.sleep(delay)
+
+    def event_stream(self, subscriber):
+        """Server-Sent Events body for a subscribe() queue: a snapshot, then one message per change."""
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    return
+                yield format_event(event['type'], event, event['id'])
+        finally:
+            self.unsubscribe(subscriber)
+
+
+stock_alerts = StockAlerts()
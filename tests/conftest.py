@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    """Connection to the DB_* database, rolled back afterwards; skips the test without one."""
+    psycopg2 = pytest.importorskip('psycopg2')
+    from db import DB_CONFIG
+    try:
+        conn = psycopg2.connect(connect_timeout=3, **DB_CONFIG)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f'No database: {e}')
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip('asyncpg')
+from starlette.testclient import TestClient
+
+from asgi_app import app
+from assets import page_path
+
+
+def test_home_serves_dashboard():
+    # Outside a with block the lifespan, and so the database pool, is not started
+    response = TestClient(app).get('/')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/html')
+    assert response.headers['cache-control'] == 'no-cache'
+    with open(page_path('dashboard_ui.html'), 'rb') as f:
+        assert response.content == f.read()
@@ -0,0 +1,24 @@
+import pytest
+
+import assets
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    # No build in the build directory: pages come from the sources
+    monkeypatch.setattr(assets, 'ASSET_BUILD_DIR', str(tmp_path))
+    monkeypatch.setattr(assets, '_manifest', None)
+    app2 = pytest.importorskip('app2')
+    return app2.app.test_client()
+
+
+def test_home_serves_source_dashboard_before_build(client):
+    response = client.get('/')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    with open(assets.page_path('dashboard_ui.html'), 'rb') as f:
+        assert response.data == f.read()
+
+
+def test_page_path_before_build(client):
+    assert assets.page_path('dashboard_ui.html') == f'{assets.ASSET_SOURCE_DIR}/dashboard_ui.html'
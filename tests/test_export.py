@@ -0,0 +1,40 @@
+from collections import namedtuple
+
+import pytest
+
+from export import copy_select_list, export_table
+
+Column = namedtuple('Column', 'name type_code')
+
+
+def test_copy_select_list_nulls_infinite_dates():
+    description = [Column('logid', 23), Column('timestamp', 1114), Column('day', 1082), Column('actiontype', 25)]
+    assert copy_select_list(description) == (
+        '"logid", '
+        'CASE WHEN isfinite("timestamp") THEN "timestamp" END AS "timestamp", '
+        'CASE WHEN isfinite("day") THEN "day" END AS "day", '
+        '"actiontype"'
+    )
+
+
+def test_export_infinite_timestamp(db, tmp_path):
+    """transactionlog rows whose NULL timestamp migration 008 set to '-infinity' export as null."""
+    pq = pytest.importorskip('pyarrow.parquet')
+    with db.cursor() as cur:
+        cur.execute("SELECT to_regclass('transactionlog') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            pytest.skip('Database has no transactionlog')
+        cur.execute('SELECT coalesce(max(logid), 0) FROM transactionlog')
+        last_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO transactionlog (logid, actiontype, "timestamp")
+            VALUES (%s, 'export-test', '-infinity'), (%s, 'export-test', '2024-05-06 07:08:09')
+        """, (last_id + 1, last_id + 2))
+
+    rows, max_id = export_table(db, 'transactionlog', str(tmp_path), after_id=last_id)
+
+    assert (rows, max_id) == (2, last_id + 2)
+    exported = pq.read_table(tmp_path / 'transactionlog').to_pydict()
+    stamps = dict(zip(exported['logid'], exported['timestamp']))
+    assert stamps[last_id + 1] is None
+    assert str(stamps[last_id + 2]) == '2024-05-06 07:08:09'
@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+from forms import CATEGORY_FIELDS, PRODUCT_FIELDS, FieldError, process_fields
+
+
+def test_process_fields_converts_and_fills_defaults():
+    assert process_fields({'productName': 'Tea', 'price': '2.5', 'quantity': '3', 'expiryDate': '2025-01-31'},
+                          PRODUCT_FIELDS) == {
+        'Name': 'Tea', 'Description': '', 'Price': 2.5, 'StockQuantity': 3, 'ExpiryDate': date(2025, 1, 31),
+        'ReOrderLevel': 0, 'CategoryID': None, 'SupplierID': None,
+    }
+
+
+@pytest.mark.parametrize('data', [{}, {'categoryName': ''}, {'categoryName': None}])
+def test_required_field_missing_empty_or_null(data):
+    with pytest.raises(FieldError, match='categoryName is required'):
+        process_fields(data, CATEGORY_FIELDS)
+
+
+def test_invalid_value():
+    with pytest.raises(FieldError, match='Invalid value for quantity'):
+        process_fields({'productName': 'Tea', 'price': '2.5', 'quantity': 'many'}, PRODUCT_FIELDS)
+
+
+@pytest.fixture
+def app():
+    app2 = pytest.importorskip('app2')
+    return app2.app
+
+
+def submitted_rows(app, body, content_type='text/csv'):
+    from app2 import read_submitted_rows
+    with app.test_request_context('/add_product', method='POST', data=body, content_type=content_type):
+        return read_submitted_rows()
+
+
+def test_csv_short_row_leaves_cells_out(app):
+    rows = submitted_rows(app, 'productName,price,quantity\nWidget,2.5\nTea,,4\n')
+    assert rows == [{'productName': 'Widget', 'price': '2.5'}, {'productName': 'Tea', 'quantity': '4'}]
+    with pytest.raises(FieldError, match='quantity is required'):
+        process_fields(rows[0], PRODUCT_FIELDS)
+
+
+def test_csv_long_row_keeps_extra_cells_apart(app):
+    rows = submitted_rows(app, 'productName,price,quantity\nGadget,1,2,3\n')
+    assert rows[0][None] == ['3']
+
+
+def test_csv_long_row_is_reported(app):
+    from app2 import handle_db_bulk_insert
+    with app.test_request_context('/add_product', method='POST'):
+        response, status = handle_db_bulk_insert('Product', [{'productName': 'Gadget', None: ['3']}], PRODUCT_FIELDS)
+    assert status == 400
+    assert response.get_json()['errors'] == [{'row': 0, 'error': 'Row has more cells than the header'}]
+
+
+def test_upload_that_is_not_utf8_is_a_400(app):
+    import io
+    response = app.test_client().post('/add_product', content_type='multipart/form-data',
+                                      data={'file': (io.BytesIO(b'productName\n\xff\xfe'), 'products.csv')})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'CSV upload must be UTF-8 text'}
+
+
+def test_unreadable_csv_is_a_400(app):
+    response = app.test_client().post('/add_product', content_type='text/csv',
+                                      data='productName,price\n"' + 'x' * 200000 + '",1\n')
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Invalid CSV')
+
+
+def test_rows_the_database_refuses_are_reported(app, db):
+    with db.cursor() as cur:
+        cur.execute("SELECT to_regclass('product') IS NOT NULL, (SELECT min(categoryid) FROM category)")
+        has_table, categoryid = cur.fetchone()
+    if not has_table or categoryid is None:
+        pytest.skip('Database has no categories')
+    body = (f'productName,price,quantity,CategoryID\n'
+            f'bulk-test-a,1,1,{categoryid}\nbulk-test-b,1,1,-1\nbulk-test-c,1,1,\n')
+    try:
+        response = app.test_client().post('/add_product', data=body, content_type='text/csv')
+        result = response.get_json()
+        assert response.status_code == 200
+        assert result['inserted'] == 2
+        assert [error['row'] for error in result['errors']] == [1]
+        assert 'categoryid' in result['errors'][0]['error']
+    finally:
+        with db.cursor() as cur:
+            cur.execute("DELETE FROM product WHERE name LIKE 'bulk-test-%'")
+        db.commit()
@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+pytest.importorskip('app2')
+load_test = pytest.importorskip('load_test')
+
+
+def test_every_route_is_load_tested():
+    assert load_test.untargeted_routes(load_test.all_targets()) == []
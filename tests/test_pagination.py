@@ -0,0 +1,92 @@
+import pytest
+
+from pagination import PageArgsError, build_keyset_query, decode_cursor, encode_cursor, keyset_filter
+
+
+def page_through(conn, key_columns, descending, nullable_keys, limit=2):
+    """Every row of keyset_test, fetched limit rows at a time the way a client follows X-Next-Cursor."""
+    rows, after = [], None
+    with conn.cursor() as cur:
+        while True:
+            query, params = build_keyset_query('keyset_test', key_columns, key_columns, descending=descending,
+                                               after=after, limit=limit, nullable_keys=nullable_keys)
+            cur.execute(query, params)
+            page = cur.fetchall()
+            rows.extend(page)
+            if len(page) < limit:
+                return rows
+            after = decode_cursor(encode_cursor(page[-1]), len(key_columns))
+
+
+def expected_order(conn, key_columns, descending):
+    direction = ' DESC' if descending else ''
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(key_columns)} FROM keyset_test "
+                    f"ORDER BY {', '.join(col + direction for col in key_columns)}")
+        return cur.fetchall()
+
+
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_paging_keeps_rows_with_null_keys(db, descending, limit):
+    with db.cursor() as cur:
+        cur.execute('CREATE TEMP TABLE keyset_test (grp int, id int PRIMARY KEY)')
+        cur.execute("""
+            INSERT INTO keyset_test VALUES
+                (1, 1), (NULL, 2), (2, 3), (1, 4), (NULL, 5), (NULL, 6), (3, 7), (2, 8), (NULL, 9)
+        """)
+    expected = expected_order(db, ['grp', 'id'], descending)
+    assert len(expected) == 9
+    assert page_through(db, ['grp', 'id'], descending, ['grp'], limit) == expected
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_paging_nullable_key_after_not_null_key(db, descending):
+    with db.cursor() as cur:
+        cur.execute('CREATE TEMP TABLE keyset_test (id int NOT NULL, grp int)')
+        cur.execute('INSERT INTO keyset_test VALUES (1, NULL), (1, 1), (1, 2), (2, NULL), (3, 5), (4, NULL)')
+    expected = expected_order(db, ['id', 'grp'], descending)
+    assert page_through(db, ['id', 'grp'], descending, ['grp']) == expected
+
+
+def test_not_null_keys_keep_row_comparison():
+    query, params = build_keyset_query('product', ['categoryid', 'productid'], after=[3, 10], limit=50)
+    assert query == ('SELECT * FROM product WHERE ((categoryid, productid) > (%s, %s)) '
+                     'ORDER BY categoryid, productid LIMIT %s')
+    assert params == [3, 10, 50]
+
+
+def test_null_cursor_value_is_not_a_parameter():
+    condition, params = keyset_filter(['categoryid', 'productid'], [None, 10], nullable_keys=['categoryid'])
+    assert condition == '(FALSE OR (categoryid IS NULL AND (productid) > (%s)))'
+    assert params == [10]
+
+    condition, params = keyset_filter(['totalamount', 'orderid'], [None, 7], descending=True,
+                                      nullable_keys=['totalamount'])
+    assert condition == '(totalamount IS NOT NULL OR (totalamount IS NULL AND (orderid) < (%s)))'
+    assert params == [7]
+
+
+def test_nullable_key_with_value_includes_null_rows_ascending():
+    condition, params = keyset_filter(['customerid', 'invoiceid'], [4, 9], nullable_keys=['customerid'])
+    assert condition == ('((customerid > %s OR customerid IS NULL) OR '
+                         '(customerid = %s AND (invoiceid) > (%s)))')
+    assert params == [4, 4, 9]
+
+
+def test_where_and_cursor_params_in_order():
+    query, params = build_keyset_query('salesinvoice', ['invoiceid'], where='invoicedate >= %s',
+                                       where_params=('2024-01-01',), after=[5], limit=10, descending=True)
+    assert query == ('SELECT * FROM salesinvoice WHERE (invoicedate >= %s) AND ((invoiceid) < (%s)) '
+                     'ORDER BY invoiceid DESC LIMIT %s')
+    assert params == ['2024-01-01', 5, 10]
+
+
+def test_cursor_round_trip_keeps_nulls():
+    assert decode_cursor(encode_cursor([None, 12]), 2) == [None, 12]
+
+
+@pytest.mark.parametrize('token', ['not base64!', encode_cursor([1]), encode_cursor({'a': 1})])
+def test_decode_cursor_rejects_bad_tokens(token):
+    with pytest.raises(PageArgsError):
+        decode_cursor(token, 2)
@@ -0,0 +1,55 @@
+from datetime import date
+
+import pytest
+
+from partitions import add_months, archive_expired, partition_month, partition_name
+
+
+@pytest.mark.parametrize('day, months, expected', [
+    (date(2024, 5, 17), 0, date(2024, 5, 1)),
+    (date(2024, 12, 31), 1, date(2025, 1, 1)),
+    (date(2024, 1, 1), -1, date(2023, 12, 1)),
+    (date(2024, 3, 31), -35, date(2021, 4, 1)),
+    (date(2024, 11, 30), 26, date(2027, 1, 1)),
+])
+def test_add_months(day, months, expected):
+    assert add_months(day, months) == expected
+
+
+def test_partition_name_round_trip():
+    name = partition_name('salesinvoice', date(2024, 3, 1))
+    assert name == 'salesinvoice_p2024_03'
+    assert partition_month('salesinvoice', name) == date(2024, 3, 1)
+
+
+@pytest.mark.parametrize('table, name', [
+    ('salesinvoice', 'salesinvoice_default'),
+    ('salesinvoice', 'transactionlog_p2024_03'),
+    ('salesinvoice', 'salesinvoice_p2024_03_old'),
+    ('salesinvoice', 'salesinvoice_p2024_3'),
+])
+def test_partition_month_ignores_other_tables(table, name):
+    assert partition_month(table, name) is None
+
+
+def test_archive_expired_keeps_the_retention_window(monkeypatch):
+    months = [date(2023, 10, 1), date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)]
+    monkeypatch.setattr('partitions.list_partitions',
+                        lambda conn, table: [(partition_name(table, month), month, True) for month in months])
+    archived = archive_expired(None, 'transactionlog', retention=3, today=date(2024, 2, 10), dry_run=True)
+    assert list(archived) == ['transactionlog_p2023_10', 'transactionlog_p2023_11']
+
+
+def test_invoice_id_unique_without_a_date(db):
+    """A NULL invoicedate must not let an invoiceid in twice (migrations 007/008)."""
+    import psycopg2
+
+    with db.cursor() as cur:
+        cur.execute("SELECT to_regclass('invoice_keys') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            pytest.skip('Database is not migrated')
+        cur.execute('SELECT coalesce(max(invoiceid), 0) + 1000 FROM invoice_keys')
+        invoiceid = cur.fetchone()[0]
+        cur.execute('INSERT INTO salesinvoice (invoiceid, invoicedate) VALUES (%s, NULL)', (invoiceid,))
+        with pytest.raises(psycopg2.errors.UniqueViolation):
+            cur.execute('INSERT INTO salesinvoice (invoiceid, invoicedate) VALUES (%s, NULL)', (invoiceid,))
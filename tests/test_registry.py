@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+import pytest
+
+from registry import (BATCH_LIST_LIMIT, BATCH_MAX_REPORTS, REPORTS, REPORTS_BY_NAME, BatchError, ListReport, day_param,
+                      date_window, parse_batch, to_numbered)
+from reports import ReportArgsError
+
+
+def test_to_numbered():
+    assert to_numbered('SELECT %s, %s') == 'SELECT $1, $2'
+    assert to_numbered("SELECT to_char(x, '99%%') WHERE a = %s") == "SELECT to_char(x, '99%') WHERE a = $1"
+    assert to_numbered('SELECT 1') == 'SELECT 1'
+
+
+def test_report_names_are_unique():
+    assert len(REPORTS_BY_NAME) == len(REPORTS)
+    assert REPORTS_BY_NAME['get_all_sales_today'].path == '/get_all_sales_today'
+
+
+def test_day_param():
+    assert day_param({'date': '2024-02-29'}) == (date(2024, 2, 29), date(2024, 3, 1))
+    today = date.today()
+    assert day_param({}) == (today, today + timedelta(days=1))
+    with pytest.raises(ReportArgsError):
+        day_param({'date': '29/02/2024'})
+
+
+def test_list_report_build():
+    report = ListReport('/things', 'thing', ['thingid'], columns=['thingid', 'name'], where='active')
+    assert report.build({}, after=[4], limit=10) == (
+        'SELECT thingid, name FROM thing WHERE (active) AND ((thingid) > (%s)) ORDER BY thingid LIMIT %s',
+        [4, 10],
+    )
+    assert report.base_query({}) == ('SELECT thingid, name FROM thing WHERE (active) ORDER BY thingid', [])
+
+
+def test_parse_batch_names_and_objects():
+    tasks, errors = parse_batch(['list_vendors', {'name': 'transactionlog', 'key': 'log', 'params': {'limit': 5}}])
+    assert errors == {}
+    assert [(key, report.name, limit) for key, report, _, _, limit in tasks] == [
+        ('list_vendors', 'list_vendors', BATCH_LIST_LIMIT),
+        ('log', 'transactionlog', 5),
+    ]
+    # JSON numbers reach the report as text, like query string values
+    assert tasks[1][3][-1] == 5
+
+
+def test_parse_batch_reports_bad_params_per_key():
+    tasks, errors = parse_batch([
+        {'name': 'revenue_last_month', 'params': {'from': 'yesterday'}},
+        'list_vendors',
+    ])
+    assert [task[0] for task in tasks] == ['list_vendors']
+    assert errors['revenue_last_month']['status'] == 400
+
+
+@pytest.mark.parametrize('entries', [
+    None,
+    [],
+    'list_vendors',
+    ['no_such_report'],
+    [42],
+    ['list_vendors', 'list_vendors'],
+    [{'name': 'list_vendors', 'params': ['limit', 5]}],
+    ['list_vendors'] * (BATCH_MAX_REPORTS + 1),
+])
+def test_parse_batch_rejects(entries):
+    with pytest.raises(BatchError):
+        parse_batch(entries)
+
+
+def test_parse_batch_repeated_report_with_distinct_keys():
+    tasks, _ = parse_batch([{'name': 'list_vendors', 'key': 'a'}, {'name': 'list_vendors', 'key': 'b'}])
+    assert [task[0] for task in tasks] == ['a', 'b']
+
+
+def test_date_window():
+    assert date_window('invoicedate', {}) == ([], ())
+    assert date_window('invoicedate', {'from': '2024-01-31', 'to': '2024-02-29'}) == (
+        ['invoicedate >= %s', 'invoicedate < %s'], (date(2024, 1, 31), date(2024, 3, 1)))
+    assert date_window('"timestamp"', {'to': '2024-12-31'}) == (['"timestamp" < %s'], (date(2025, 1, 1),))
+    assert date_window('invoicedate', {'from': '2024-05-01', 'to': ''}) == (['invoicedate >= %s'], (date(2024, 5, 1),))
+
+
+@pytest.mark.parametrize('params', [{'from': '2024-02-02', 'to': '2024-02-01'}, {'from': 'May'}, {'to': '2024-13-01'}])
+def test_date_window_rejects(params):
+    with pytest.raises(ReportArgsError):
+        date_window('invoicedate', params)
+
+
+def test_list_report_date_window_joins_where():
+    report = ListReport('/things', 'thing', ['thingid'], where='kind = %s', params=lambda args: ('a',),
+                        date_column='day')
+    query, params = report.build({'from': '2024-01-01'}, limit=5)
+    assert query == 'SELECT * FROM thing WHERE ((kind = %s) AND day >= %s) ORDER BY thingid LIMIT %s'
+    assert params == ['a', date(2024, 1, 1), 5]
@@ -0,0 +1,36 @@
+from datetime import date
+
+import pytest
+
+from reports import RANGE_MAX_BUCKETS, ReportArgsError, bucket_count, range_report
+
+
+def test_bucket_count_day():
+    assert bucket_count(date(2024, 1, 1), date(2024, 1, 1), 'day') == 1
+    assert bucket_count(date(2024, 1, 1), date(2024, 12, 31), 'day') == 366
+
+
+def test_bucket_count_week_follows_iso_weeks():
+    # Sunday to Monday spans two date_trunc('week') periods
+    assert bucket_count(date(2024, 1, 7), date(2024, 1, 8), 'week') == 2
+    assert bucket_count(date(2024, 1, 8), date(2024, 1, 14), 'week') == 1
+
+
+def test_bucket_count_month():
+    assert bucket_count(date(2024, 1, 31), date(2024, 2, 1), 'month') == 2
+    assert bucket_count(date(2023, 12, 1), date(2024, 12, 31), 'month') == 13
+
+
+def test_range_report_rejects_too_many_buckets():
+    start = date(1900, 1, 1)
+    with pytest.raises(ReportArgsError, match=str(RANGE_MAX_BUCKETS)):
+        range_report(None, start, date(2024, 1, 1), 'day', ['revenue'])
+
+
+def test_bucket_count_matches_date_trunc(db):
+    start, end = date(2023, 11, 29), date(2024, 3, 4)
+    with db.cursor() as cur:
+        for granularity in ('day', 'week', 'month'):
+            cur.execute("SELECT count(DISTINCT date_trunc(%s, d)) FROM generate_series(%s::date, %s::date, '1 day') d",
+                        (granularity, start, end))
+            assert cur.fetchone()[0] == bucket_count(start, end, granularity)
@@ -0,0 +1,90 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+
+import serialization
+from serialization import ROW_FORMATS, RowFormatError, dumps, parse_row_format, rows_payload
+
+COLUMNS = ['productid', 'name', 'price']
+ROWS = [(1, 'Tea', Decimal('2.50')), (2, 'Milk', None)]
+
+
+def test_rows_layout_keeps_rows_as_fetched():
+    assert rows_payload(COLUMNS, ROWS, 'rows') == {'columns': COLUMNS, 'rows': ROWS}
+
+
+def test_columns_layout_transposes():
+    assert rows_payload(COLUMNS, ROWS, 'columns') == {
+        'productid': [1, 2],
+        'name': ['Tea', 'Milk'],
+        'price': [Decimal('2.50'), None],
+    }
+
+
+def test_columns_layout_of_empty_result_keeps_every_column():
+    assert rows_payload(COLUMNS, [], 'columns') == {'productid': [], 'name': [], 'price': []}
+
+
+@pytest.mark.parametrize('row_format', ['records', 'rows', 'columns'])
+def test_format_parameter(row_format):
+    assert parse_row_format({'format': row_format}) == row_format
+
+
+def test_unknown_format_parameter():
+    with pytest.raises(RowFormatError):
+        parse_row_format({'format': 'xml'})
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, 'records'),
+    ('*/*', 'records'),
+    ('application/json', 'records'),
+    (ROW_FORMATS['rows'], 'rows'),
+    (f"{ROW_FORMATS['columns']}, application/json;q=0.5", 'columns'),
+    ('text/html', 'records'),
+])
+def test_accept_header(accept, expected):
+    assert parse_row_format({}, accept) == expected
+
+
+def test_format_parameter_wins_over_accept():
+    assert parse_row_format({'format': 'rows'}, ROW_FORMATS['columns']) == 'rows'
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def encoder(request, monkeypatch):
+    """dumps() with orjson when installed, and with the standard library fallback."""
+    if request.param == 'orjson' and serialization.orjson is None:
+        pytest.skip('orjson is not installed')
+    if request.param == 'json':
+        monkeypatch.setattr(serialization, 'orjson', None)
+    return dumps
+
+
+def test_dumps_encodes_database_types(encoder):
+    data = {
+        'price': Decimal('2.50'),
+        'day': date(2024, 5, 1),
+        'at': datetime(2024, 5, 1, 9, 30),
+        'id': UUID('12345678-1234-5678-1234-567812345678'),
+        'rows': ROWS,
+    }
+    assert json.loads(encoder(data)) == {
+        'price': '2.50',
+        'day': '2024-05-01',
+        'at': '2024-05-01T09:30:00',
+        'id': '12345678-1234-5678-1234-567812345678',
+        'rows': [[1, 'Tea', '2.50'], [2, 'Milk', None]],
+    }
+
+
+def test_dumps_returns_compact_bytes(encoder):
+    assert encoder({'a': [1, 2]}) == b'{"a":[1,2]}'
+
+
+def test_dumps_rejects_unknown_types(encoder):
+    with pytest.raises(TypeError):
+        encoder({'a': object()})